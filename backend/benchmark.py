@@ -0,0 +1,242 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import database
+import json_generator
+import loader
+from wrapped_summary import refresh_user_wrapped_summaries, refresh_wrapped_summary
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# The benchmark drops and recreates every table, so it only runs against a
+# database named explicitly for it.
+BENCHMARK_DATABASE_URL = os.getenv("BENCHMARK_DATABASE_URL")
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SCHEMA_PATH = ROOT_DIR / "schema.sql"
+BASELINE_PATH = ROOT_DIR / "benchmarks" / "baseline.json"
+DEFAULT_SIZES = (10000, 100000)
+DEFAULT_REPEAT = 3
+RECORDS_PER_FILE = 50000
+DATA_SEED = 2025
+PHASES = ("ingest", "process", "refresh", "refresh_users")
+# A metric regresses when it exceeds the baseline by this fraction and by at
+# least the absolute slack, so millisecond phases do not flap on noise.
+DEFAULT_TOLERANCE = 0.25
+MIN_REGRESSION_SECONDS = 0.05
+MIN_REGRESSION_MB = 32
+
+
+def _peak_rss_mb():
+    # Peak resident memory of this process or its largest child (parser workers).
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in bytes on macOS and KiB elsewhere.
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _server_version(conn):
+    with conn.cursor() as cur:
+        cur.execute("SHOW server_version")
+        return cur.fetchone()[0]
+
+
+def _timed(timings, phase, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - started
+    return result
+
+
+def _run_once(json_files, mode, workers):
+    timings = {}
+    conn = database.get_db_connection()
+    try:
+        loader.clear_loaded_data(conn)
+        _timed(timings, "ingest", loader.load_raw_files, conn, json_files, mode, workers)
+        years = _timed(timings, "process", loader.process_data, conn)
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM PRS.SPOTIFY_EVENTS")
+            events = cur.fetchone()[0]
+    finally:
+        conn.close()
+
+    for year in years:
+        _timed(timings, "refresh", refresh_wrapped_summary, year)
+        _timed(timings, "refresh_users", refresh_user_wrapped_summaries, year)
+    return timings, events
+
+
+def run_size(database_url, json_files, records, mode=loader.DEFAULT_LOAD_MODE, workers=1, repeat=DEFAULT_REPEAT, verbose=False):
+    # Runs in its own process so peak memory is measured per dataset size.
+    database.DATABASE_URL = database_url
+    conn = database.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+        conn.commit()
+        server_version = _server_version(conn)
+    finally:
+        conn.close()
+
+    runs = []
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        for _ in range(repeat):
+            runs.append(_run_once(json_files, mode, workers))
+
+    # Best of the repeats per phase: the least disturbed measurement of each.
+    phases = {phase: round(min(timings.get(phase, 0.0) for timings, _events in runs), 4) for phase in PHASES}
+    wall_seconds = round(min(sum(timings.values()) for timings, _events in runs), 4)
+    return {
+        "records": records,
+        "files": len(json_files),
+        "events": runs[0][1],
+        "wall_seconds": wall_seconds,
+        "rows_per_second": round(records / wall_seconds) if wall_seconds else None,
+        "ingest_rows_per_second": round(records / phases["ingest"]) if phases["ingest"] else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "phases": phases,
+        "server_version": server_version,
+    }
+
+
+def run_benchmarks(database_url, sizes=DEFAULT_SIZES, mode=loader.DEFAULT_LOAD_MODE, workers=1, repeat=DEFAULT_REPEAT, verbose=False):
+    results = []
+    options = json_generator.build_options()
+    for records in sizes:
+        with tempfile.TemporaryDirectory(prefix="wrapped-benchmark-") as data_dir:
+            json_files = json_generator.generate_files(
+                DATA_SEED,
+                records,
+                options,
+                output_dir=data_dir,
+                records_per_file=RECORDS_PER_FILE,
+            )
+            print(f"Benchmarking {records} records in {len(json_files)} files ({repeat} runs)...")
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(run_size, database_url, json_files, records, mode, workers, repeat, verbose).result()
+        print(
+            f"  {result['wall_seconds']:.2f}s, {result['rows_per_second']} rows/s, peak {result['peak_rss_mb']} MB; "
+            + ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in result["phases"].items())
+        )
+        results.append(result)
+
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "postgres": results[0]["server_version"] if results else None,
+        },
+        "settings": {"mode": mode, "workers": workers, "repeat": repeat, "seed": DATA_SEED},
+        "results": results,
+    }
+
+
+def compare_results(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    # Returns one message per metric that got slower (or bigger) than the
+    # baseline run of the same dataset size.
+    previous_by_size = {result["records"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        previous = previous_by_size.get(result["records"])
+        if previous is None:
+            continue
+
+        metrics = [("wall_seconds", result["wall_seconds"], previous["wall_seconds"], MIN_REGRESSION_SECONDS, "s")]
+        metrics += [
+            (f"phases.{phase}", seconds, previous["phases"][phase], MIN_REGRESSION_SECONDS, "s")
+            for phase, seconds in result["phases"].items()
+            if phase in previous.get("phases", {})
+        ]
+        if result.get("peak_rss_mb") is not None and previous.get("peak_rss_mb") is not None:
+            metrics.append(("peak_rss_mb", result["peak_rss_mb"], previous["peak_rss_mb"], MIN_REGRESSION_MB, " MB"))
+
+        for name, current, reference, slack, unit in metrics:
+            if current > reference * (1 + tolerance) and current - reference > slack:
+                change = (current - reference) / reference if reference else float("inf")
+                regressions.append(
+                    f"{result['records']} records: {name} {current}{unit} vs baseline {reference}{unit} (+{change:.0%})"
+                )
+    return regressions
+
+
+def _parse_sizes(value):
+    return tuple(int(size) for size in value.split(","))
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark loading and summary refresh on generated data against a throwaway PostgreSQL database."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=_parse_sizes,
+        default=DEFAULT_SIZES,
+        help="Comma-separated dataset sizes in records (default: 10000,100000).",
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per size; the fastest of each phase is kept.")
+    parser.add_argument("--mode", choices=loader.LOAD_MODES, default=loader.DEFAULT_LOAD_MODE, help="Loader ingest mode.")
+    parser.add_argument("--workers", type=int, default=1, help="Loader parser processes.")
+    parser.add_argument("--output", default=None, help="Also write the JSON report to this file.")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline report to compare against.")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Write this run's report as the new baseline instead of comparing against it.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Allowed slowdown as a fraction of the baseline before failing (default: 0.25).",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Show the loader's own output.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    if not BENCHMARK_DATABASE_URL:
+        print("Set BENCHMARK_DATABASE_URL to a throwaway database; the benchmark drops and recreates every table.")
+        sys.exit(2)
+
+    report = run_benchmarks(BENCHMARK_DATABASE_URL, args.sizes, args.mode, args.workers, args.repeat, args.verbose)
+    serialized = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(serialized + "\n", encoding="utf-8")
+
+    if args.save_baseline:
+        Path(args.baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.baseline).write_text(serialized + "\n", encoding="utf-8")
+        print(f"Saved baseline to {args.baseline}.")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        sys.exit(0)
+
+    with open(args.baseline, "r", encoding="utf-8") as file_obj:
+        regressions = compare_results(report, json.load(file_obj), args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    print(f"{len(regressions)} regressions against {args.baseline}.")
+    sys.exit(1 if regressions else 0)
@@ -1,15 +1,34 @@
 import os
-from contextlib import contextmanager
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
 
+import psycopg
 import psycopg2
 from dotenv import load_dotenv
+from psycopg import sql
+from psycopg.rows import dict_row
 from psycopg2.extras import RealDictCursor
-from psycopg2.pool import ThreadedConnectionPool
+from psycopg_pool import AsyncConnectionPool
+
+from metrics import DB_POOL_WAIT_SECONDS, DB_QUERY_SECONDS, set_pool_stats, timed
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-_db_pool = None
+DB_POOL_OPEN_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_OPEN_TIMEOUT_SECONDS", "5"))
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# How long a checkout waits for a free connection before giving up.
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+DB_POOL_MAX_LIFETIME_SECONDS = float(os.getenv("DB_POOL_MAX_LIFETIME_SECONDS", "3600"))
+DB_POOL_MAX_IDLE_SECONDS = float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "600"))
+# Connections idle for longer than this are pinged before reuse; busier ones
+# are handed out without a round trip.
+DB_POOL_CHECK_IDLE_SECONDS = float(os.getenv("DB_POOL_CHECK_IDLE_SECONDS", "1"))
+TRY_ADVISORY_LOCK_SQL = "SELECT pg_try_advisory_xact_lock(%s::integer, %s::integer) AS acquired"
+ADVISORY_LOCK_SQL = "SELECT pg_advisory_xact_lock(%s::integer, %s::integer)"
+_async_db_pool = None
 
 
 def get_db_connection():
@@ -18,47 +37,228 @@ def get_db_connection():
     return psycopg2.connect(DATABASE_URL)
 
 
-def init_db_pool(minconn=1, maxconn=10):
-    global _db_pool
-    if _db_pool is None:
-        if not DATABASE_URL:
-            raise ValueError("DATABASE_URL environment variable is not set")
-        _db_pool = ThreadedConnectionPool(minconn=minconn, maxconn=maxconn, dsn=DATABASE_URL)
-    return _db_pool
-
-
-def close_db_pool():
-    global _db_pool
-    if _db_pool is not None:
-        _db_pool.closeall()
-        _db_pool = None
-
-
 @contextmanager
 def _managed_connection():
-    using_pool = _db_pool is not None
-    conn = _db_pool.getconn() if using_pool else get_db_connection()
+    # The loader and scripts open a connection per call; only the API pools them.
+    with timed(DB_POOL_WAIT_SECONDS, "sync"):
+        conn = get_db_connection()
     try:
         yield conn
     finally:
-        if using_pool:
-            _db_pool.putconn(conn)
-        else:
-            conn.close()
+        conn.close()
+
 
+def _fetch(cur, fetch):
+    if fetch == "one":
+        return cur.fetchone()
+    if fetch:
+        return cur.fetchall()
+    return None
 
-def execute_query(query, params=None, fetch=False):
-    with _managed_connection() as conn:
+
+def execute_query(query, params=None, fetch=False, name="query"):
+    with timed(DB_QUERY_SECONDS, name), _managed_connection() as conn:
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, params)
-                result = None
-                if fetch == "one":
-                    result = cur.fetchone()
-                elif fetch:
-                    result = cur.fetchall()
+                result = _fetch(cur, fetch)
                 conn.commit()
                 return result
         except Exception:
-            conn.rollback()
+            if not conn.closed:
+                conn.rollback()
+            raise
+
+
+def stream_query(query, params=None, fetch_rows=1000, name="query"):
+    # Yields lists of up to fetch_rows row tuples from a server-side cursor, so
+    # memory stays flat however many rows the query returns.
+    with timed(DB_QUERY_SECONDS, name), _managed_connection() as conn:
+        try:
+            with conn.cursor(name=name) as cur:
+                cur.execute(query, params)
+                while True:
+                    rows = cur.fetchmany(fetch_rows)
+                    if not rows:
+                        break
+                    yield rows
+        finally:
+            # Read-only; also ends the transaction when the consumer stops early.
+            if not conn.closed:
+                conn.rollback()
+
+
+# Single flight: query runs while holding the transaction-level advisory lock
+# lock_key (two ints), so at most one process runs it at a time. A caller that
+# finds the lock taken waits for the holder to commit. With reuse, it then
+# compares version_query's rows with those read before waiting. If the holder
+# produced a new result, reuse_query's rows are returned instead of running
+# query again. Without reuse, the caller runs query itself once the lock is free.
+def execute_single_flight(
+    lock_key, query, params, version_query, reuse_query, key_params, fetch=False, name="query", reuse=True
+):
+    with timed(DB_QUERY_SECONDS, name), _managed_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(TRY_ADVISORY_LOCK_SQL, lock_key)
+                if not cur.fetchone()["acquired"]:
+                    if reuse:
+                        cur.execute(version_query, key_params)
+                        before = cur.fetchall()
+                    cur.execute(ADVISORY_LOCK_SQL, lock_key)
+                    if reuse:
+                        cur.execute(version_query, key_params)
+                        if cur.fetchall() != before:
+                            query, params = reuse_query, key_params
+                cur.execute(query, params)
+                result = _fetch(cur, fetch)
+                conn.commit()
+                return result
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+
+
+# The API serves requests from the event loop through this pool, sized and
+# timed out by the DB_POOL_* settings; the loader and other scripts keep using
+# the psycopg2 functions above.
+_async_returned_at = weakref.WeakKeyDictionary()
+
+
+async def _mark_async_returned(conn):
+    _async_returned_at[conn] = time.monotonic()
+
+
+async def _check_async_connection(conn):
+    # Only connections idle for a while are pinged; busier ones skip the round trip.
+    returned_at = _async_returned_at.get(conn)
+    if returned_at is None or time.monotonic() - returned_at >= DB_POOL_CHECK_IDLE_SECONDS:
+        await AsyncConnectionPool.check_connection(conn)
+
+
+async def init_async_db_pool(min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE):
+    global _async_db_pool
+    if _async_db_pool is None:
+        if not DATABASE_URL:
+            raise ValueError("DATABASE_URL environment variable is not set")
+        pool = AsyncConnectionPool(
+            DATABASE_URL,
+            min_size=min_size,
+            max_size=max_size,
+            kwargs={"row_factory": dict_row},
+            timeout=DB_POOL_TIMEOUT_SECONDS,
+            max_lifetime=DB_POOL_MAX_LIFETIME_SECONDS,
+            max_idle=DB_POOL_MAX_IDLE_SECONDS,
+            check=_check_async_connection,
+            reset=_mark_async_returned,
+            open=False,
+        )
+        try:
+            await pool.open(wait=True, timeout=DB_POOL_OPEN_TIMEOUT_SECONDS)
+        except Exception:
+            await pool.close()
             raise
+        _async_db_pool = pool
+    return _async_db_pool
+
+
+async def close_async_db_pool():
+    global _async_db_pool
+    if _async_db_pool is not None:
+        pool, _async_db_pool = _async_db_pool, None
+        await pool.close()
+
+
+@asynccontextmanager
+async def _managed_async_connection():
+    started = time.perf_counter()
+    if _async_db_pool is not None:
+        async with _async_db_pool.connection() as conn:
+            DB_POOL_WAIT_SECONDS.labels("async").observe(time.perf_counter() - started)
+            yield conn
+    else:
+        if not DATABASE_URL:
+            raise ValueError("DATABASE_URL environment variable is not set")
+        async with await psycopg.AsyncConnection.connect(DATABASE_URL, row_factory=dict_row) as conn:
+            DB_POOL_WAIT_SECONDS.labels("async").observe(time.perf_counter() - started)
+            yield conn
+
+
+async def execute_query_async(query, params=None, fetch=False, name="query"):
+    # Both connection context managers commit on success and roll back on error.
+    with timed(DB_QUERY_SECONDS, name):
+        async with _managed_async_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                if fetch == "one":
+                    return await cur.fetchone()
+                if fetch:
+                    return await cur.fetchall()
+                return None
+
+
+async def execute_single_flight_async(
+    lock_key, query, params, version_query, reuse_query, key_params, fetch=False, name="query", reuse=True
+):
+    with timed(DB_QUERY_SECONDS, name):
+        async with _managed_async_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(TRY_ADVISORY_LOCK_SQL, lock_key)
+                if not (await cur.fetchone())["acquired"]:
+                    if reuse:
+                        await cur.execute(version_query, key_params)
+                        before = await cur.fetchall()
+                    await cur.execute(ADVISORY_LOCK_SQL, lock_key)
+                    if reuse:
+                        await cur.execute(version_query, key_params)
+                        if await cur.fetchall() != before:
+                            query, params = reuse_query, key_params
+                await cur.execute(query, params)
+                if fetch == "one":
+                    return await cur.fetchone()
+                if fetch:
+                    return await cur.fetchall()
+                return None
+
+
+async def listen_async(channel, on_listen=None):
+    # Yields NOTIFY payloads on a dedicated connection; a pooled one cannot be
+    # held for as long as the listener runs. on_listen runs once LISTEN is
+    # active, so nothing sent after it can be missed.
+    if not DATABASE_URL:
+        raise ValueError("DATABASE_URL environment variable is not set")
+    async with await psycopg.AsyncConnection.connect(DATABASE_URL, autocommit=True) as conn:
+        await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+        if on_listen is not None:
+            await on_listen()
+        async for notify in conn.notifies():
+            yield notify.payload
+
+
+async def stream_query_async(query, params=None, fetch_rows=1000, name="query"):
+    # stream_query on a dedicated connection: a long export must not hold a
+    # pooled one away from API requests.
+    if not DATABASE_URL:
+        raise ValueError("DATABASE_URL environment variable is not set")
+    with timed(DB_QUERY_SECONDS, name):
+        async with await psycopg.AsyncConnection.connect(DATABASE_URL) as conn:
+            async with conn.cursor(name=name) as cur:
+                await cur.execute(query, params)
+                while True:
+                    rows = await cur.fetchmany(fetch_rows)
+                    if not rows:
+                        break
+                    yield rows
+
+
+def update_pool_metrics():
+    # Sampled when /metrics is scraped.
+    if _async_db_pool is not None:
+        stats = _async_db_pool.get_stats()
+        set_pool_stats(
+            "async",
+            stats["pool_size"],
+            stats["pool_size"] - stats["pool_available"],
+            stats.get("requests_waiting", 0),
+        )
@@ -0,0 +1,110 @@
+import argparse
+import os
+import sys
+import zlib
+from datetime import datetime
+
+from database import stream_query, stream_query_async
+from metrics import EXPORT_ROWS
+
+# Exportable tables and their columns; surrogate ids and loader bookkeeping
+# (file_id, event_key) are left out.
+EXPORT_SOURCES = {
+    "raw": (
+        "RAW.SPOTIFY_EVENTS",
+        (
+            "end_time", "artist_name", "track_name", "ms_played", "album_name",
+            "context", "platform", "user_id", "conn_country", "ip_addr",
+            "spotify_track_uri", "episode_name", "episode_show_name", "spotify_episode_uri",
+            "audiobook_title", "audiobook_uri", "audiobook_chapter_uri", "audiobook_chapter_title",
+            "reason_start", "reason_end", "shuffle", "skipped", "offline", "offline_timestamp", "incognito_mode",
+        ),
+    ),
+    "processed": (
+        "PRS.SPOTIFY_EVENTS",
+        ("end_time", "artist_name", "track_name", "ms_played", "episode_name", "episode_show_name", "user_id"),
+    ),
+}
+DEFAULT_EXPORT_SOURCE = "processed"
+# Rows per server-side cursor fetch; one fetch becomes one streamed chunk.
+EXPORT_FETCH_ROWS = int(os.getenv("EXPORT_FETCH_ROWS", "5000"))
+GZIP_LEVEL = 6
+
+
+def build_export_query(source, start=None, end=None, user_id=None):
+    # PostgreSQL serializes each row (row_to_json), so Python only joins lines.
+    # start is inclusive and end exclusive, as in year_bounds().
+    table, columns = EXPORT_SOURCES[source]
+    filters = []
+    params = []
+    for condition, value in (("end_time >= %s", start), ("end_time < %s", end), ("user_id = %s", user_id)):
+        if value is not None:
+            filters.append(condition)
+            params.append(value)
+    where = f" WHERE {' AND '.join(filters)}" if filters else ""
+    query = f"SELECT row_to_json(e)::text FROM (SELECT {', '.join(columns)} FROM {table}{where}) e"
+    return query, tuple(params)
+
+
+def _gzip_compressor():
+    # wbits=31 writes the gzip container, so the stream is a valid .gz file.
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+def _encode_rows(rows, compressor):
+    data = "".join(row[0] + "\n" for row in rows).encode("utf-8")
+    return compressor.compress(data) if compressor is not None else data
+
+
+def export_events(source=DEFAULT_EXPORT_SOURCE, start=None, end=None, user_id=None, compress=False):
+    # Yields NDJSON (gzip-compressed with compress) bytes, one chunk per fetch.
+    query, params = build_export_query(source, start, end, user_id)
+    compressor = _gzip_compressor() if compress else None
+    for rows in stream_query(query, params, EXPORT_FETCH_ROWS, name="export_events"):
+        EXPORT_ROWS.labels(source).inc(len(rows))
+        chunk = _encode_rows(rows, compressor)
+        if chunk:
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+
+async def export_events_async(source=DEFAULT_EXPORT_SOURCE, start=None, end=None, user_id=None, compress=False):
+    query, params = build_export_query(source, start, end, user_id)
+    compressor = _gzip_compressor() if compress else None
+    async for rows in stream_query_async(query, params, EXPORT_FETCH_ROWS, name="export_events"):
+        EXPORT_ROWS.labels(source).inc(len(rows))
+        chunk = _encode_rows(rows, compressor)
+        if chunk:
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export loaded Spotify events as NDJSON.")
+    parser.add_argument(
+        "--source",
+        choices=sorted(EXPORT_SOURCES),
+        default=DEFAULT_EXPORT_SOURCE,
+        help="Export RAW.SPOTIFY_EVENTS or PRS.SPOTIFY_EVENTS (default: processed).",
+    )
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None, help="Only events ending at or after this time.")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="Only events ending before this time.")
+    parser.add_argument("--user", default=None, help="Only this user's events.")
+    parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip.")
+    parser.add_argument("--output", default=None, help="Write to this file instead of stdout.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    chunks = export_events(args.source, args.start, args.end, args.user, args.gzip)
+    if args.output:
+        with open(args.output, "wb") as file_obj:
+            for chunk in chunks:
+                file_obj.write(chunk)
+    else:
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
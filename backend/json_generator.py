@@ -1,11 +1,24 @@
+import argparse
 import json
+import os
 import random
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-import uuid
+from itertools import accumulate
 
-# Configuración
+# Configuración por defecto
 NUM_RECORDS = 500
-OUTPUT_FILE = "../data/spotify_events.json"
+NUM_USERS = 6
+START_YEAR = 2025
+OUTPUT_DIR = "../data"
+OUTPUT_PREFIX = "spotify_events"
+CONTENT_TYPES = ("music", "podcast", "audiobook")
+CONTENT_MIX = (85, 10, 5)
+# Registros serializados que se acumulan antes de cada escritura
+WRITE_BATCH = 10000
+EPOCH = datetime(1970, 1, 1)
+_ENCODER = json.JSONEncoder(separators=(",", ":"))
 
 # Datos de muestra para aleatoriedad
 ARTISTS = [
@@ -42,36 +55,45 @@ COUNTRIES = ["ES", "MX", "US", "AR", "CO", "GB"]
 REASONS_START = ["trackdone", "clickrow", "appload", "playbtn", "remote"]
 REASONS_END = ["trackdone", "fwdbtn", "backbtn", "endplay", "logout", "unexpected-exit"]
 
-def generate_record(index):
-    # Decidir si es canción (85%), podcast (10%) o audiobook (5%)
-    content_type = random.choices(["music", "podcast", "audiobook"], weights=[85, 10, 5])[0]
-    
-    end_time = datetime.now() - timedelta(minutes=random.randint(0, 10000))
-    ms_played = random.randint(1000, 300000)
-    user_id = "user_" + str(random.randint(100, 105)) # Simular pocos usuarios
-    platform = random.choice(PLATFORMS)
-    country = random.choice(COUNTRIES)
-    shuffle = random.choice([True, False])
-    skipped = ms_played < 30000 and random.choice([True, False])
-    offline = random.choice([True, False])
-    
+
+def _spotify_id(rng):
+    # 22 caracteres hex del generador del shard (uuid4 no es reproducible)
+    return f"{rng.getrandbits(88):022x}"
+
+
+def _pick(rng, items):
+    # random() es mucho más barato que choice()/randint() en el bucle caliente
+    return items[int(rng.random() * len(items))]
+
+
+def generate_record(rng, options):
+    random_value = rng.random
+    # Decidir si es canción, podcast o audiobook según la mezcla configurada
+    content_type = rng.choices(CONTENT_TYPES, cum_weights=options["cum_weights"])[0]
+
+    # Instante dentro del rango de años, sin depender de la hora actual
+    end_seconds = options["start_seconds"] + int(random_value() * options["span_seconds"])
+    end_time = EPOCH + timedelta(seconds=end_seconds)
+    ms_played = 1000 + int(random_value() * 299001)
+    offline = random_value() < 0.5
+
     record = {
-        "end_time": end_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "end_time": end_time.isoformat() + "Z",
         "ms_played": ms_played,
-        "user_id": user_id,
-        "platform": platform,
-        "conn_country": country,
-        "ip_addr": f"192.168.1.{random.randint(1, 255)}",
-        "reason_start": random.choice(REASONS_START),
-        "reason_end": random.choice(REASONS_END),
-        "shuffle": shuffle,
-        "skipped": skipped,
+        "user_id": "user_" + str(100 + int(random_value() * options["users"])),
+        "platform": _pick(rng, PLATFORMS),
+        "conn_country": _pick(rng, COUNTRIES),
+        "ip_addr": "192.168.1." + str(1 + int(random_value() * 255)),
+        "reason_start": _pick(rng, REASONS_START),
+        "reason_end": _pick(rng, REASONS_END),
+        "shuffle": random_value() < 0.5,
+        "skipped": ms_played < 30000 and random_value() < 0.5,
         "offline": offline,
-        "offline_timestamp": str(int(end_time.timestamp() * 1000)) if offline else None,
-        "incognito_mode": random.choice([True, False]),
-        
+        "offline_timestamp": str(end_seconds * 1000) if offline else None,
+        "incognito_mode": random_value() < 0.5,
+
         # Inicializar campos nulos
-        "artist_name": None, "track_name": None, "album_name": None, 
+        "artist_name": None, "track_name": None, "album_name": None,
         "spotify_track_uri": None, "episode_name": None, "episode_show_name": None,
         "spotify_episode_uri": None, "audiobook_title": None, "audiobook_uri": None,
         "audiobook_chapter_uri": None, "audiobook_chapter_title": None,
@@ -79,34 +101,138 @@ def generate_record(index):
     }
 
     if content_type == "music":
-        artist, album = random.choice(ARTISTS)
-        track = random.choice(TRACKS[artist])
+        artist, album = _pick(rng, ARTISTS)
         record["artist_name"] = artist
-        record["track_name"] = track
+        record["track_name"] = _pick(rng, TRACKS[artist])
         record["album_name"] = album
-        record["spotify_track_uri"] = f"spotify:track:{uuid.uuid4().hex[:22]}"
-        record["context"] = f"spotify:album:{uuid.uuid4().hex[:22]}"
-        
+        record["spotify_track_uri"] = f"spotify:track:{_spotify_id(rng)}"
+        record["context"] = f"spotify:album:{_spotify_id(rng)}"
+
     elif content_type == "podcast":
-        show, publisher = random.choice(PODCASTS)
+        show, publisher = _pick(rng, PODCASTS)
         record["episode_show_name"] = show
-        record["episode_name"] = f"Episode #{random.randint(1, 500)}: Guest {random.choice(['A', 'B', 'C'])}"
-        record["spotify_episode_uri"] = f"spotify:episode:{uuid.uuid4().hex[:22]}"
-        record["context"] = f"spotify:show:{uuid.uuid4().hex[:22]}"
+        record["episode_name"] = f"Episode #{1 + int(random_value() * 500)}: Guest {_pick(rng, 'ABC')}"
+        record["spotify_episode_uri"] = f"spotify:episode:{_spotify_id(rng)}"
+        record["context"] = f"spotify:show:{_spotify_id(rng)}"
 
     elif content_type == "audiobook":
         record["audiobook_title"] = "Harry Potter and the Sorcerer's Stone"
-        record["audiobook_uri"] = f"spotify:audiobook:{uuid.uuid4().hex[:22]}"
-        record["audiobook_chapter_title"] = f"Chapter {random.randint(1, 10)}"
-        record["audiobook_chapter_uri"] = f"spotify:chapter:{uuid.uuid4().hex[:22]}"
+        record["audiobook_uri"] = f"spotify:audiobook:{_spotify_id(rng)}"
+        record["audiobook_chapter_title"] = f"Chapter {1 + int(random_value() * 10)}"
+        record["audiobook_chapter_uri"] = f"spotify:chapter:{_spotify_id(rng)}"
 
     return record
 
-# Generar lista
-data = [generate_record(i) for i in range(NUM_RECORDS)]
 
-# Escribir archivo
-with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-    json.dump(data, f, indent=None, separators=(',', ':')) # Formato compacto pero válido
+def write_shard(path, seed, shard, count, options):
+    # Cada shard tiene su propio generador derivado de (seed, shard): el
+    # contenido no depende del número de procesos ni del orden de ejecución.
+    rng = random.Random(f"{seed}:{shard}")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        written = 0
+        while written < count:
+            batch = [
+                _ENCODER.encode(generate_record(rng, options))
+                for _ in range(min(WRITE_BATCH, count - written))
+            ]
+            if written:
+                f.write(",")
+            f.write(",".join(batch))
+            written += len(batch)
+        f.write("]")
+    return count
+
+
+def build_options(users=NUM_USERS, start_year=START_YEAR, end_year=None, mix=CONTENT_MIX):
+    end_year = end_year or start_year
+    start_seconds = int((datetime(start_year, 1, 1) - EPOCH).total_seconds())
+    end_seconds = int((datetime(end_year + 1, 1, 1) - EPOCH).total_seconds())
+    return {
+        "users": users,
+        "start_seconds": start_seconds,
+        "span_seconds": end_seconds - start_seconds,
+        "cum_weights": list(accumulate(mix)),
+    }
+
+
+def plan_shards(records, records_per_file=None):
+    # Lista de (shard, registros); un único archivo si no se pide fragmentar
+    records_per_file = records_per_file or max(records, 1)
+    return [
+        (shard, min(records_per_file, records - start))
+        for shard, start in enumerate(range(0, records, records_per_file))
+    ]
+
+
+def shard_path(output_dir, prefix, shard, shard_count):
+    if shard_count == 1:
+        return os.path.join(output_dir, f"{prefix}.json")
+    return os.path.join(output_dir, f"{prefix}_{shard:05d}.json")
+
+
+def generate_files(seed, records, options, output_dir=OUTPUT_DIR, prefix=OUTPUT_PREFIX, records_per_file=None, workers=1):
+    shards = plan_shards(records, records_per_file)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [shard_path(output_dir, prefix, shard, len(shards)) for shard, _count in shards]
+    jobs = [(path, seed, shard, count, options) for path, (shard, count) in zip(paths, shards)]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(write_shard, *zip(*jobs)))
+    else:
+        for job in jobs:
+            write_shard(*job)
+    return paths
+
+
+def _parse_mix(value):
+    weights = tuple(int(weight) for weight in value.split(","))
+    if len(weights) != len(CONTENT_TYPES) or min(weights) < 0 or sum(weights) == 0:
+        raise argparse.ArgumentTypeError("Use three non-negative weights: music,podcast,audiobook (e.g. 85,10,5).")
+    return weights
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic Spotify streaming history exports.")
+    parser.add_argument("--seed", type=int, default=0, help="Same seed and options always give byte-identical files.")
+    parser.add_argument("--records", type=int, default=NUM_RECORDS, help="Total number of events to generate.")
+    parser.add_argument("--users", type=int, default=NUM_USERS, help="Number of distinct user ids.")
+    parser.add_argument("--start-year", type=int, default=START_YEAR, help="First year of end_time values (default: 2025).")
+    parser.add_argument("--end-year", type=int, default=None, help="Last year of end_time values (default: --start-year).")
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=CONTENT_MIX,
+        help="Relative weights of music,podcast,audiobook events (default: 85,10,5).",
+    )
+    parser.add_argument(
+        "--records-per-file",
+        type=int,
+        default=None,
+        help="Split the output into files of at most this many events (default: a single file).",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Processes generating files in parallel.")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Directory for the generated files.")
+    parser.add_argument("--prefix", default=OUTPUT_PREFIX, help="File name prefix; shards get a _00000 suffix.")
+    return parser.parse_args(argv)
+
 
-print(f"Archivo '{OUTPUT_FILE}' generado exitosamente con {NUM_RECORDS} registros.")
\ No newline at end of file
+if __name__ == "__main__":
+    args = _parse_args()
+    options = build_options(args.users, args.start_year, args.end_year, args.mix)
+    started = time.perf_counter()
+    paths = generate_files(
+        args.seed,
+        args.records,
+        options,
+        output_dir=args.output_dir,
+        prefix=args.prefix,
+        records_per_file=args.records_per_file,
+        workers=args.workers,
+    )
+    elapsed = time.perf_counter() - started
+    print(
+        f"{len(paths)} archivo(s) generado(s) en '{args.output_dir}' con {args.records} registros "
+        f"({args.records / max(elapsed, 1e-9):,.0f} registros/s)."
+    )
@@ -0,0 +1,300 @@
+import os
+import threading
+import time
+from datetime import date
+
+from psycopg2.extras import Json
+
+# Counters per heavy-hitter sketch. Memory stays fixed whatever the number of
+# distinct tracks; raising it narrows the error of the reported totals.
+LIVE_STATS_CAPACITY = int(os.getenv("LIVE_STATS_CAPACITY", "1000"))
+LIVE_STATS_PUBLISH_SECONDS = float(os.getenv("LIVE_STATS_PUBLISH_SECONDS", "5"))
+# Rows between checks of the publish interval while streaming.
+PUBLISH_CHECK_ROWS = 1000
+# Same slices as the summary SQL.
+SHORT_PLAY_MS = 5000
+TOP_ITEMS = 5
+TOP_SKIPS = 10
+MS_PER_HOUR = 3600000
+MS_PER_MINUTE = 60000
+HOUR_PERIODS = ("Night",) * 5 + ("Morning",) * 7 + ("Afternoon",) * 6 + ("Evening",) * 5 + ("Night",)
+DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+MONTH_NAMES = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+)
+
+# Positions in loader record rows.
+_END_TIME, _ARTIST, _TRACK, _MS_PLAYED, _EPISODE, _SHOW = 0, 1, 2, 3, 11, 12
+
+CLEAR_LIVE_STATS_SQL = "DELETE FROM PRS.SPOTIFY_LIVE_STATS"
+UPSERT_LIVE_STATS_SQL = """
+    INSERT INTO PRS.SPOTIFY_LIVE_STATS (year, updated_at, event_count, loading, payload)
+    VALUES (%s, NOW(), %s, %s, %s)
+    ON CONFLICT (year)
+    DO UPDATE
+    SET updated_at = EXCLUDED.updated_at,
+        event_count = EXCLUDED.event_count,
+        loading = EXCLUDED.loading,
+        payload = EXCLUDED.payload
+"""
+
+
+class SpaceSaving:
+    # Heavy hitters in bounded memory (Space-Saving with batched eviction).
+    # Holds fewer than 2 * capacity counters: when full, only the largest
+    # `capacity` are kept and floor becomes the largest count dropped so far.
+    # A key that is new (again) starts from floor, so estimates never
+    # undercount and overcount by at most the key's error (<= floor).
+    def __init__(self, capacity=LIVE_STATS_CAPACITY):
+        self.capacity = capacity
+        self.floor = 0
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, key, weight=1):
+        counts = self.counts
+        if key in counts:
+            counts[key] += weight
+            return
+        counts[key] = self.floor + weight
+        if self.floor:
+            self.errors[key] = self.floor
+        if len(counts) >= 2 * self.capacity:
+            self._compact()
+
+    def _compact(self):
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        self.floor = max(self.floor, ranked[self.capacity][1])
+        self.counts = dict(ranked[:self.capacity])
+        self.errors = {key: error for key, error in self.errors.items() if key in self.counts}
+
+    def merge(self, other):
+        # A key missing on one side may have counted up to that side's floor there.
+        for key in self.counts:
+            if key not in other.counts and other.floor:
+                self.counts[key] += other.floor
+                self.errors[key] = self.errors.get(key, 0) + other.floor
+        for key, count in other.counts.items():
+            error = other.errors.get(key, 0)
+            if key in self.counts:
+                self.counts[key] += count
+                error += self.errors.get(key, 0)
+            else:
+                self.counts[key] = count + self.floor
+                error += self.floor
+            if error:
+                self.errors[key] = error
+        self.floor += other.floor
+        if len(self.counts) >= 2 * self.capacity:
+            self._compact()
+
+    def top(self, limit):
+        # (key, estimate, error) for the largest estimates; ties by key.
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], str(item[0])))[:limit]
+        return [(key, count, self.errors.get(key, 0)) for key, count in ranked]
+
+
+def _round_ratio(ms, unit):
+    return round(ms / unit, 2)
+
+
+class _YearStats:
+    # Exact totals per hour and day (at most 24 and 366 counters) plus sketches
+    # for everything keyed by track, artist or episode.
+    def __init__(self, capacity):
+        self.events = 0
+        self.ms_played = 0
+        self.hours = [0] * 24
+        self.days = {}
+        self.tracks = SpaceSaving(capacity)
+        self.artists = SpaceSaving(capacity)
+        self.episodes = SpaceSaving(capacity)
+        self.plays = SpaceSaving(capacity)
+        self.short_plays = SpaceSaving(capacity)
+
+    def merge(self, other):
+        self.events += other.events
+        self.ms_played += other.ms_played
+        self.hours = [mine + theirs for mine, theirs in zip(self.hours, other.hours)]
+        for day, ms_played in other.days.items():
+            self.days[day] = self.days.get(day, 0) + ms_played
+        for name in ("tracks", "artists", "episodes", "plays", "short_plays"):
+            getattr(self, name).merge(getattr(other, name))
+
+    def payload(self):
+        # Summary-shaped sections; sketched totals carry the bound of their overcount.
+        top_artist = {}
+        for artist_name, ms_played, error in self.artists.top(1):
+            top_artist = {
+                "artist_name": artist_name,
+                "total_hours_played": _round_ratio(ms_played, MS_PER_HOUR),
+                "max_error_hours": _round_ratio(error, MS_PER_HOUR),
+            }
+
+        active_hour = {}
+        if self.ms_played:
+            hour = max(range(24), key=lambda hour: self.hours[hour])
+            active_hour = {"hour": hour, "total_minutes_played": _round_ratio(self.hours[hour], MS_PER_MINUTE)}
+
+        periods = {}
+        for hour, ms_played in enumerate(self.hours):
+            if ms_played:
+                periods[HOUR_PERIODS[hour]] = periods.get(HOUR_PERIODS[hour], 0) + ms_played
+
+        top_days = []
+        for day, ms_played in sorted(self.days.items(), key=lambda item: (-item[1], item[0]))[:TOP_ITEMS]:
+            parsed = date.fromisoformat(day)
+            top_days.append(
+                {
+                    "day": day,
+                    "day_of_week": DAY_NAMES[parsed.weekday()],
+                    "month": MONTH_NAMES[parsed.month - 1],
+                    "total_minutes_played": _round_ratio(ms_played, MS_PER_MINUTE),
+                }
+            )
+
+        most_played = {}
+        for track_name, plays, error in self.plays.top(1):
+            most_played = {"track_name": track_name, "play_count": plays, "max_error": error}
+
+        return {
+            "total_time": {"hours": _round_ratio(self.ms_played, MS_PER_HOUR)},
+            "top_artist": top_artist,
+            "active_hour": active_hour,
+            "top_tracks": [
+                {
+                    "artist_name": artist_name,
+                    "track_name": track_name,
+                    "total_minutes_played": _round_ratio(ms_played, MS_PER_MINUTE),
+                    "total_hours_played": _round_ratio(ms_played, MS_PER_HOUR),
+                    "max_error_minutes": _round_ratio(error, MS_PER_MINUTE),
+                }
+                for (artist_name, track_name), ms_played, error in self.tracks.top(TOP_ITEMS)
+            ],
+            "top_podcasts": [
+                {
+                    "episode_show_name": show_name,
+                    "episode_name": episode_name,
+                    "total_minutes_played": _round_ratio(ms_played, MS_PER_MINUTE),
+                    "total_hours_played": _round_ratio(ms_played, MS_PER_HOUR),
+                    "max_error_minutes": _round_ratio(error, MS_PER_MINUTE),
+                }
+                for (show_name, episode_name), ms_played, error in self.episodes.top(TOP_ITEMS)
+            ],
+            "listening_periods": [
+                {"period": period, "total_minutes_played": _round_ratio(ms_played, MS_PER_MINUTE)}
+                for period, ms_played in sorted(periods.items(), key=lambda item: -item[1])
+            ],
+            "top_days": top_days,
+            "most_played": most_played,
+            "skips": [
+                {"track_name": track_name, "skips": skips, "max_error": error}
+                for track_name, skips, error in self.short_plays.top(TOP_SKIPS)
+            ],
+        }
+
+
+class LiveStats:
+    # Provisional Wrapped statistics per year, updated from loader record
+    # rows as they stream past. Counts every row read, so plays repeated across
+    # overlapping exports are counted again until the real summary replaces them.
+    def __init__(self, capacity=LIVE_STATS_CAPACITY):
+        self.capacity = capacity
+        self.years = {}
+
+    def add(self, row):
+        ms_played = row[_MS_PLAYED]
+        track_name = row[_TRACK]
+        episode_name = row[_EPISODE]
+        # Same rows as loader.PROCESSED_EVENT_FILTER keeps.
+        if not isinstance(ms_played, int) or ms_played <= 0 or (track_name is None and episode_name is None):
+            return
+        end_time = row[_END_TIME]
+        try:
+            year = int(end_time[:4])
+            hour = int(end_time[11:13])
+        except (TypeError, ValueError):
+            return
+
+        stats = self.years.get(year)
+        if stats is None:
+            stats = self.years[year] = _YearStats(self.capacity)
+        stats.events += 1
+        stats.ms_played += ms_played
+        stats.hours[hour] += ms_played
+        day = end_time[:10]
+        stats.days[day] = stats.days.get(day, 0) + ms_played
+        artist_name = row[_ARTIST]
+        if artist_name is not None:
+            stats.artists.add(artist_name, ms_played)
+        if track_name is not None:
+            stats.tracks.add((artist_name or None, track_name), ms_played)
+            stats.plays.add(track_name)
+            if ms_played < SHORT_PLAY_MS:
+                stats.short_plays.add(track_name)
+        else:
+            stats.episodes.add((row[_SHOW] or None, episode_name), ms_played)
+
+    def observe(self, rows):
+        for row in rows:
+            self.add(row)
+            yield row
+
+    def merge(self, other):
+        for year, stats in other.years.items():
+            if year in self.years:
+                self.years[year].merge(stats)
+            else:
+                self.years[year] = stats
+
+    def payloads(self):
+        return {year: (stats.events, stats.payload()) for year, stats in self.years.items()}
+
+
+class LiveStatsPublisher:
+    # Owns a load run's LiveStats and writes them to PRS.SPOTIFY_LIVE_STATS at
+    # most every interval seconds on its own connection, where the API reads
+    # them. Statistics of the previous run are cleared when it starts.
+    def __init__(self, conn, interval=LIVE_STATS_PUBLISH_SECONDS, capacity=LIVE_STATS_CAPACITY):
+        self.stats = LiveStats(capacity)
+        self.interval = interval
+        self._conn = conn
+        self._conn.autocommit = True
+        self._lock = threading.Lock()
+        self._published_at = time.monotonic()
+        with self._conn.cursor() as cur:
+            cur.execute(CLEAR_LIVE_STATS_SQL)
+
+    def _publish(self, loading):
+        self._published_at = time.monotonic()
+        try:
+            with self._conn.cursor() as cur:
+                for year, (events, payload) in sorted(self.stats.payloads().items()):
+                    cur.execute(UPSERT_LIVE_STATS_SQL, (year, events, loading, Json(payload)))
+        except Exception as exc:
+            # Provisional numbers must never fail the load itself.
+            print(f"Publishing live statistics failed: {exc}")
+
+    def _maybe_publish(self):
+        if time.monotonic() - self._published_at >= self.interval:
+            self._publish(loading=True)
+
+    def observe(self, rows):
+        # For rows mapped in this process (sequential loads).
+        for count, row in enumerate(self.stats.observe(rows), 1):
+            if count % PUBLISH_CHECK_ROWS == 0:
+                with self._lock:
+                    self._maybe_publish()
+            yield row
+
+    def merge(self, stats):
+        # For the LiveStats of one file built in a parser process.
+        with self._lock:
+            self.stats.merge(stats)
+            self._maybe_publish()
+
+    def close(self):
+        with self._lock:
+            self._publish(loading=False)
+        self._conn.close()
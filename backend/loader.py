@@ -1,136 +1,1106 @@
+import argparse
 import glob
+import hashlib
+import io
 import json
+import multiprocessing
 import os
+import queue
+import re
+import time
+import zipfile
+from decimal import ROUND_HALF_UP, Decimal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 
 from psycopg2.extras import execute_values
 
 from database import get_db_connection
-from wrapped_summary import SUMMARY_YEAR, refresh_wrapped_summary
+from live_stats import LiveStats, LiveStatsPublisher
+from metrics import (
+    LOADER_BATCH_SECONDS,
+    LOADER_DUPLICATE_ROWS,
+    LOADER_PHASE_SECONDS,
+    LOADER_ROWS,
+    LOADER_ROWS_PER_SECOND,
+    serve_metrics,
+    write_metrics_file,
+)
+from rollups import PROCESSED_COLUMNS, clear_year_rollups, delete_events_with_rollups, insert_events_with_rollups
+from shadow_tables import SHADOW_SUFFIX, create_shadow_tables, finish_shadow_tables, swap_shadow_tables
+from snapshot import EVENT_FIELDS, encode_events, write_snapshot
+from wrapped_summary import refresh_user_wrapped_summaries, refresh_wrapped_summary, year_bounds
 
 DATA_DIR = "../data"
 BATCH_SIZE = 1000
-RAW_INSERT_SQL = """
-    INSERT INTO RAW.SPOTIFY_EVENTS (
+READ_SIZE = 1 << 16
+HASH_BLOCK_SIZE = 1 << 20
+COMMIT_CHUNKS = 50
+QUEUE_DEPTH = 8
+QUEUE_POLL_SECONDS = 1.0
+SNAPSHOT_FETCH_ROWS = 10000
+# Members of a ZIP archive in DATA_DIR are read in place and addressed as
+# "<archive>.zip/<member>"; only those named like listening history are loaded.
+# An archive with extended history members (Streaming_History_Audio_*, endsong_*)
+# loads only those: its account data StreamingHistory* members hold the same
+# plays at minute precision, which the event_key dedup cannot match.
+ARCHIVE_SUFFIX = ".zip"
+HISTORY_MEMBER_PATTERN = re.compile(r"(streaming_?history|endsong|spotify_events)[^/]*\.json", re.IGNORECASE)
+EXTENDED_MEMBER_PATTERN = re.compile(r"(streaming_history_|endsong)[^/]*\.json", re.IGNORECASE)
+ACCOUNT_DATA_MEMBER_PATTERN = re.compile(r"streaminghistory[^/]*\.json", re.IGNORECASE)
+RAW_COLUMNS = """
         end_time, artist_name, track_name, ms_played, album_name,
         context, platform, user_id, conn_country, ip_addr,
         spotify_track_uri, episode_name, episode_show_name, spotify_episode_uri,
         audiobook_title, audiobook_uri, audiobook_chapter_uri, audiobook_chapter_title,
-        reason_start, reason_end, shuffle, skipped, offline, offline_timestamp, incognito_mode
-    ) VALUES %s
+        reason_start, reason_end, shuffle, skipped, offline, offline_timestamp, incognito_mode,
+        file_id
 """
+# Each batch is written to a per-connection temp table first (neither COPY nor
+# execute_values can skip conflicting rows), then moved into RAW.SPOTIFY_EVENTS;
+# the unique event_key index rejects plays already loaded from any file.
+# Rows are merged in event_key order so parallel writers loading overlapping
+# files wait on each other's keys in the same order instead of deadlocking.
+# {suffix} in the statements below selects the shadow tables of a full reload.
+CREATE_STAGING_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS raw_events_staging ON COMMIT DELETE ROWS AS
+    SELECT {RAW_COLUMNS} FROM RAW.SPOTIFY_EVENTS WITH NO DATA
+"""
+STAGING_INSERT_SQL = f"INSERT INTO raw_events_staging ({RAW_COLUMNS}) VALUES %s"
+STAGING_COPY_SQL = f"COPY raw_events_staging ({RAW_COLUMNS}) FROM STDIN"
+MERGE_STAGING_SQL = f"""
+    INSERT INTO RAW.SPOTIFY_EVENTS{{suffix}} ({RAW_COLUMNS})
+    SELECT {RAW_COLUMNS} FROM raw_events_staging
+    ORDER BY RAW.spotify_event_key(
+        end_time, COALESCE(spotify_track_uri, spotify_episode_uri, audiobook_chapter_uri), ms_played, user_id
+    )
+    ON CONFLICT (event_key) DO NOTHING
+"""
+# After a merge that skipped rows: staged plays held by another file's row
+# are recorded as also being in this one.
+RECORD_DUPLICATES_SQL = """
+    INSERT INTO RAW.SPOTIFY_EVENT_FILES{suffix} (event_key, file_id)
+    SELECT DISTINCT r.event_key, staged.file_id
+    FROM raw_events_staging AS staged
+    JOIN RAW.SPOTIFY_EVENTS{suffix} AS r
+        ON r.event_key = RAW.spotify_event_key(
+            staged.end_time,
+            COALESCE(staged.spotify_track_uri, staged.spotify_episode_uri, staged.audiobook_chapter_uri),
+            staged.ms_played,
+            staged.user_id
+        )
+    WHERE r.file_id <> staged.file_id
+    ON CONFLICT DO NOTHING
+"""
+# Before a file's rows are deleted, each play another file also contains moves
+# to the lowest such file_id; the moved plays are kept in handed_over_events
+# until the transaction ends.
+CREATE_HANDED_OVER_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS handed_over_events (event_key UUID, file_id INTEGER)
+    ON COMMIT DELETE ROWS
+"""
+HAND_OVER_EVENTS_SQL = """
+    WITH heirs AS (
+        SELECT DISTINCT ON (r.event_key) r.event_key, f.file_id
+        FROM RAW.SPOTIFY_EVENTS{suffix} AS r
+        JOIN RAW.SPOTIFY_EVENT_FILES{suffix} AS f ON f.event_key = r.event_key AND f.file_id <> r.file_id
+        WHERE r.file_id = %s
+        ORDER BY r.event_key, f.file_id
+    ),
+    moved AS (
+        UPDATE RAW.SPOTIFY_EVENTS{suffix} AS r
+        SET file_id = heirs.file_id
+        FROM heirs
+        WHERE r.event_key = heirs.event_key
+        RETURNING r.event_key, r.file_id
+    )
+    INSERT INTO handed_over_events SELECT event_key, file_id FROM moved
+"""
+# Moved plays whose new file is already processed get their PRS rows now;
+# others are processed together with the rest of their file.
+HANDED_OVER_PROCESSED_SQL = """
+    FROM RAW.SPOTIFY_EVENTS{suffix}
+    WHERE event_key IN (
+        SELECT h.event_key
+        FROM handed_over_events AS h
+        JOIN RAW.SPOTIFY_LOAD_MANIFEST{suffix} AS m ON m.file_id = h.file_id
+        WHERE m.status = 'processed'
+    )
+      AND {filter}
+"""
+ADD_MANIFEST_YEARS_SQL = """
+    UPDATE RAW.SPOTIFY_LOAD_MANIFEST{suffix}
+    SET years = ARRAY(SELECT DISTINCT unnest(COALESCE(years, '{{}}') || %s::smallint[]) ORDER BY 1)
+    WHERE file_id = %s OR file_id IN (SELECT file_id FROM handed_over_events)
+"""
+GET_MANIFEST_SQL = """
+    SELECT file_id, file_size, content_hash, row_count, duplicate_count, status
+    FROM RAW.SPOTIFY_LOAD_MANIFEST{suffix}
+    WHERE file_path = %s
+"""
+INSERT_MANIFEST_SQL = """
+    INSERT INTO RAW.SPOTIFY_LOAD_MANIFEST{suffix} (file_path, file_size, content_hash)
+    VALUES (%s, %s, %s)
+    RETURNING file_id
+"""
+RESET_MANIFEST_SQL = """
+    UPDATE RAW.SPOTIFY_LOAD_MANIFEST{suffix}
+    SET file_size = %s, content_hash = %s, row_count = 0, duplicate_count = 0, status = 'loading', updated_at = NOW()
+    WHERE file_id = %s
+"""
+UPDATE_MANIFEST_SQL = """
+    UPDATE RAW.SPOTIFY_LOAD_MANIFEST{suffix}
+    SET row_count = %s, duplicate_count = %s, status = %s, updated_at = NOW()
+    WHERE file_id = %s
+"""
+# Summaries of years a full reload no longer has data for are dropped in the swap.
+DELETE_STALE_SUMMARIES_SQL = (
+    "DELETE FROM PRS.SPOTIFY_WRAPPED_SUMMARY WHERE year <> ALL(%s::smallint[])",
+    "DELETE FROM PRS.SPOTIFY_WRAPPED_USER_SUMMARY WHERE year <> ALL(%s::smallint[])",
+)
+PROCESSED_EVENT_FILTER = "ms_played > 0 AND (track_name IS NOT NULL OR episode_name IS NOT NULL)"
+LOAD_MODES = ("copy", "insert")
+DEFAULT_LOAD_MODE = "copy"
+
+_NON_WHITESPACE = re.compile(r"\S")
+# Position of the only integer column of RAW_COLUMNS that records fill in.
+_MS_PLAYED = 3
+# Characters that can continue a number cut off at the end of a read ("0." or "1e").
+_NUMBER_CONTINUATION = frozenset(".eE+-0123456789")
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
 
 
 def _chunked(values, chunk_size):
-    for start in range(0, len(values), chunk_size):
-        yield values[start:start + chunk_size]
+    iterator = iter(values)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _check_json_array_end(next_char):
+    # Like json.load, only whitespace may follow the closing bracket.
+    if next_char():
+        raise ValueError("Unexpected content after the end of the JSON list.")
+
+
+def _iter_json_array(file_obj, read_size=READ_SIZE):
+    # Decodes one array element at a time so only the current record and one
+    # read buffer are ever held in memory, whatever the size of the file.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def next_char():
+        nonlocal buffer, position, eof
+        while True:
+            match = _NON_WHITESPACE.search(buffer, position)
+            if match:
+                position = match.start()
+                return buffer[position]
+            if eof:
+                return ""
+            buffer = file_obj.read(read_size)
+            position = 0
+            eof = not buffer
+
+    if next_char() != "[":
+        raise ValueError("Expected file content to be a JSON list of records.")
+    position += 1
+
+    if next_char() == "]":
+        position += 1
+        _check_json_array_end(next_char)
+        return
+
+    while True:
+        if not next_char():
+            raise ValueError("Unexpected end of file inside JSON list.")
+
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # A value ending exactly at the buffer edge may be truncated, and a number
+            # may have decoded only up to a "." or exponent the next read completes.
+            if end is not None and (
+                eof
+                or (end < len(buffer) and not (type(record) in (int, float) and buffer[end] in _NUMBER_CONTINUATION))
+            ):
+                break
+            chunk = file_obj.read(read_size)
+            buffer = buffer[position:] + chunk
+            position = 0
+            eof = not chunk
 
+        position = end
+        yield record
 
-def _map_record(record):
-    offline_timestamp = record.get("offline_timestamp")
+        separator = next_char()
+        if separator == "]":
+            position += 1
+            _check_json_array_end(next_char)
+            return
+        if separator != ",":
+            raise ValueError("Expected ',' or ']' between JSON list records.")
+        position += 1
 
+
+def _offline_timestamp(value):
+    return str(value) if value is not None else None
+
+
+def _extended_history_mapper(ip_key):
+    # Extended streaming history (Streaming_History_Audio_*.json, endsong_*.json).
+    # Older exports name the IP column ip_addr_decrypted.
+    def map_record(record):
+        get = record.get
+        return (
+            get("ts"),
+            get("master_metadata_album_artist_name"),
+            get("master_metadata_track_name"),
+            get("ms_played", 0),
+            get("master_metadata_album_album_name"),
+            get("context"),
+            get("platform"),
+            get("username"),
+            get("conn_country"),
+            get(ip_key),
+            get("spotify_track_uri"),
+            get("episode_name"),
+            get("episode_show_name"),
+            get("spotify_episode_uri"),
+            get("audiobook_title"),
+            get("audiobook_uri"),
+            get("audiobook_chapter_uri"),
+            get("audiobook_chapter_title"),
+            get("reason_start"),
+            get("reason_end"),
+            get("shuffle"),
+            get("skipped"),
+            get("offline"),
+            _offline_timestamp(get("offline_timestamp")),
+            get("incognito_mode"),
+        )
+
+    return map_record
+
+
+def _map_account_data(record):
+    # Account data (StreamingHistory_music_*.json / StreamingHistory_podcast_*.json):
+    # minute-precision end times, names and ms_played only.
+    get = record.get
     return (
-        record.get("ts") or record.get("end_time"),
-        record.get("master_metadata_album_artist_name") or record.get("artist_name"),
-        record.get("master_metadata_track_name") or record.get("track_name"),
-        record.get("ms_played", 0),
-        record.get("master_metadata_album_album_name") or record.get("album_name"),
-        record.get("context"),
-        record.get("platform"),
-        record.get("username") or record.get("user_id"),
-        record.get("conn_country"),
-        record.get("ip_addr_decrypted") or record.get("ip_addr"),
-        record.get("spotify_track_uri"),
-        record.get("episode_name"),
-        record.get("episode_show_name"),
-        record.get("spotify_episode_uri"),
-        record.get("audiobook_title"),
-        record.get("audiobook_uri"),
-        record.get("audiobook_chapter_uri"),
-        record.get("audiobook_chapter_title"),
-        record.get("reason_start"),
-        record.get("reason_end"),
-        record.get("shuffle"),
-        record.get("skipped"),
-        record.get("offline"),
-        str(offline_timestamp) if offline_timestamp is not None else None,
-        record.get("incognito_mode"),
+        get("endTime"),
+        get("artistName"),
+        get("trackName"),
+        get("msPlayed", 0),
+        None, None, None, None, None, None, None,
+        get("episodeName"),
+        get("podcastName"),
+        None, None, None, None, None, None, None, None, None, None, None, None,
     )
 
 
-def _load_file_records(file_path):
-    with open(file_path, "r", encoding="utf-8") as file_obj:
-        data = json.load(file_obj)
-        if not isinstance(data, list):
-            raise ValueError("Expected file content to be a JSON list of records.")
-        return [_map_record(record) for record in data]
+def _map_generated(record):
+    # json_generator.py output, keyed by the RAW.SPOTIFY_EVENTS column names.
+    get = record.get
+    return (
+        get("end_time"),
+        get("artist_name"),
+        get("track_name"),
+        get("ms_played", 0),
+        get("album_name"),
+        get("context"),
+        get("platform"),
+        get("user_id"),
+        get("conn_country"),
+        get("ip_addr"),
+        get("spotify_track_uri"),
+        get("episode_name"),
+        get("episode_show_name"),
+        get("spotify_episode_uri"),
+        get("audiobook_title"),
+        get("audiobook_uri"),
+        get("audiobook_chapter_uri"),
+        get("audiobook_chapter_title"),
+        get("reason_start"),
+        get("reason_end"),
+        get("shuffle"),
+        get("skipped"),
+        get("offline"),
+        _offline_timestamp(get("offline_timestamp")),
+        get("incognito_mode"),
+    )
 
 
-def load_json_files():
-    json_files = sorted(glob.glob(os.path.join(DATA_DIR, "*.json")))
-    if not json_files:
-        print("No JSON files found in data directory.")
+_map_extended_history = _extended_history_mapper("ip_addr")
+_map_extended_history_decrypted_ip = _extended_history_mapper("ip_addr_decrypted")
+
+
+def _record_mapper(record):
+    # A file holds a single export format, so the mapper is chosen once from its first record.
+    if not isinstance(record, dict):
+        raise ValueError("Expected JSON list records to be objects.")
+    if "ts" in record:
+        return _map_extended_history_decrypted_ip if "ip_addr_decrypted" in record else _map_extended_history
+    if "endTime" in record:
+        return _map_account_data
+    if "end_time" in record:
+        return _map_generated
+    raise ValueError(f"Unrecognized export format; first record has keys: {', '.join(sorted(record))}.")
+
+
+def _split_source(file_path):
+    # "<archive>.zip/<member>" -> (archive path, member name); plain files have no member.
+    archive_path, separator, member = file_path.partition(ARCHIVE_SUFFIX + "/")
+    if not separator:
+        return file_path, None
+    return archive_path + ARCHIVE_SUFFIX, member
+
+
+def _open_source(file_path):
+    # Binary stream of a file or of an archive member, decompressed as it is read.
+    archive_path, member = _split_source(file_path)
+    if member is None:
+        return open(file_path, "rb")
+    # The member keeps the archive's file handle open until it is closed itself.
+    with zipfile.ZipFile(archive_path) as archive:
+        return archive.open(member)
+
+
+def list_export_files(data_dir):
+    # *.json files plus the history members of every *.zip archive in data_dir.
+    file_paths = glob.glob(os.path.join(data_dir, "*.json"))
+    for archive_path in glob.glob(os.path.join(data_dir, "*" + ARCHIVE_SUFFIX)):
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                members = archive.namelist()
+        except zipfile.BadZipFile as exc:
+            print(f"Skipping {archive_path}: {exc}")
+            continue
+        names = {member: member.rsplit("/", 1)[-1] for member in members}
+        history = [member for member in members if HISTORY_MEMBER_PATTERN.fullmatch(names[member])]
+        if any(EXTENDED_MEMBER_PATTERN.fullmatch(names[member]) for member in history):
+            account_data = [member for member in history if ACCOUNT_DATA_MEMBER_PATTERN.fullmatch(names[member])]
+            if account_data:
+                print(f"Skipping {len(account_data)} account data members of {archive_path}; its extended history covers them.")
+                history = [member for member in history if member not in account_data]
+        file_paths.extend(f"{archive_path}/{member}" for member in history)
+    return sorted(file_paths)
+
+
+def _iter_file_records(file_path):
+    with io.TextIOWrapper(_open_source(file_path), encoding="utf-8") as file_obj:
+        records = _iter_json_array(file_obj)
+        first = next(records, None)
+        if first is None:
+            return
+        map_record = _record_mapper(first)
+        yield map_record(first)
+        yield from map(map_record, records)
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def _copy_integer(value):
+    # execute_values sends a float as a numeric literal, which PostgreSQL rounds
+    # half away from zero into an integer column; COPY only takes the integer.
+    return int(Decimal(repr(value)).to_integral_value(ROUND_HALF_UP))
+
+
+def _copy_line(row):
+    if type(row[_MS_PLAYED]) is float:
+        row = (*row[:_MS_PLAYED], _copy_integer(row[_MS_PLAYED]), *row[_MS_PLAYED + 1 :])
+    return "\t".join(map(_copy_value, row)) + "\n"
+
+
+class _CopyStream:
+    # File-like source for COPY ... FROM STDIN that holds at most one encoded
+    # chunk of rows ahead of what PostgreSQL has consumed.
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = ""
+        self._position = 0
+        self.rows = 0
+
+    def _refill(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        self._buffer, count = chunk
+        self._position = 0
+        self.rows += count
+        return True
+
+    def read(self, size=-1):
+        if self._position >= len(self._buffer) and not self._refill():
+            return ""
+
+        if size < 0:
+            size = len(self._buffer) - self._position
+        data = self._buffer[self._position:self._position + size]
+        self._position += len(data)
+        return data
+
+
+def _encode_copy_chunk(rows):
+    return "".join(_copy_line(row) for row in rows), len(rows)
+
+
+def _encode_insert_chunk(rows):
+    return rows, len(rows)
+
+
+def _write_copy_chunks(cur, chunks):
+    stream = _CopyStream(chunks)
+    cur.copy_expert(STAGING_COPY_SQL, stream)
+    return stream.rows
+
+
+def _write_insert_chunks(cur, chunks):
+    loaded = 0
+    for rows, count in chunks:
+        execute_values(cur, STAGING_INSERT_SQL, rows, page_size=BATCH_SIZE)
+        loaded += count
+    return loaded
+
+
+def _merge_staged_rows(cur, staged, suffix=""):
+    # Returns how many of the staged rows were new; the staging table empties on commit.
+    cur.execute(MERGE_STAGING_SQL.format(suffix=suffix))
+    written = cur.rowcount
+    if written < staged:
+        cur.execute(RECORD_DUPLICATES_SQL.format(suffix=suffix))
+    return written
+
+
+# mode -> (encode a chunk of mapped rows, write encoded chunks with a cursor)
+_LOAD_MODES = {
+    "copy": (_encode_copy_chunk, _write_copy_chunks),
+    "insert": (_encode_insert_chunk, _write_insert_chunks),
+}
+
+
+def _iter_file_chunks(file_path, mode, file_id, skip=0, live_stats=None):
+    encode_chunk, _ = _LOAD_MODES[mode]
+    rows = islice(_iter_file_records(file_path), skip, None)
+    if live_stats is not None:
+        rows = live_stats.observe(rows)
+    for chunk in _chunked((row + (file_id,) for row in rows), BATCH_SIZE):
+        yield encode_chunk(chunk)
+
+
+def _parse_file_worker(file_path, mode, chunk_queue, reply_queue, collect_stats=False):
+    # Runs in a parser process: hashes the file for the manifest first, then waits
+    # for the writer that owns chunk_queue to claim it (reply_queue gets
+    # (file_id, rows to skip), or None for a file that needs no loading) and
+    # decodes and encodes it while the writer streams chunks into the DB.
+    # With collect_stats, the file's LiveStats follow its last chunk.
+    try:
+        chunk_queue.put(_file_fingerprint(file_path))
+    except Exception as exc:
+        chunk_queue.put(ValueError(str(exc)))
+        return
+    claim = reply_queue.get()
+    if claim is None:
+        chunk_queue.put(None)
         return
 
-    conn = get_db_connection()
+    file_id, skip = claim
+    live_stats = LiveStats() if collect_stats else None
+    try:
+        for chunk in _iter_file_chunks(file_path, mode, file_id, skip, live_stats):
+            chunk_queue.put(chunk)
+    except Exception as exc:
+        chunk_queue.put(ValueError(str(exc)))
+        return
+    if live_stats is not None:
+        chunk_queue.put(live_stats)
+    chunk_queue.put(None)
+
+
+class _QueuedChunks:
+    def __init__(self, chunk_queue, future):
+        self._queue = chunk_queue
+        self._future = future
+        self.finished = False
+        self.live_stats = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.finished:
+            raise StopIteration
+
+        while True:
+            try:
+                item = self._queue.get(timeout=QUEUE_POLL_SECONDS)
+            except queue.Empty:
+                if self._future.done():
+                    self.finished = True
+                    self._future.result()
+                    raise RuntimeError("Parser worker exited before finishing the file.")
+                continue
+            if not isinstance(item, LiveStats):
+                break
+            self.live_stats = item
+
+        if item is None:
+            self.finished = True
+            raise StopIteration
+        if isinstance(item, Exception):
+            self.finished = True
+            raise item
+        return item
+
+    def drain(self):
+        # Unblocks a parser still producing into the bounded queue after the writer gave up.
+        try:
+            for _ in self:
+                pass
+        except Exception:
+            pass
+
+
+def _report_loaded(file_path, loaded, duplicates, started, mode):
+    elapsed = time.perf_counter() - started
+    rate = loaded / elapsed if elapsed else 0
+    LOADER_ROWS_PER_SECOND.labels(os.path.relpath(file_path, DATA_DIR)).set(rate)
+    print(
+        f"Loaded {loaded} records from {file_path} in {elapsed:.2f}s ({rate:,.0f} rows/sec, {mode}); "
+        f"{duplicates} duplicates of already loaded plays skipped."
+    )
+
+
+def _file_fingerprint(file_path):
+    # Archive members are hashed as they decompress, without extracting them.
+    digest = hashlib.sha256()
+    size = 0
+    with _open_source(file_path) as file_obj:
+        for block in iter(lambda: file_obj.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+            size += len(block)
+    return size, digest.hexdigest()
+
+
+def _hand_over_file_rows(cur, file_id, suffix=""):
+    # Each play is stored once, under the first file that loaded it; the copies
+    # in later files were skipped as duplicates. Plays of a file about to be
+    # deleted that another file also contains move to that file, so replacing
+    # or failing one of several overlapping exports loses none of them.
+    cur.execute(CREATE_HANDED_OVER_SQL)
+    cur.execute(HAND_OVER_EVENTS_SQL.format(suffix=suffix), (file_id,))
+    moved = cur.rowcount
+    if not moved:
+        return
+    print(f"Kept {moved} plays of file {file_id} that other loaded files also contain.")
+
+    processed_sql = HANDED_OVER_PROCESSED_SQL.format(suffix=suffix, filter=PROCESSED_EVENT_FILTER)
+    cur.execute(f"SELECT DISTINCT EXTRACT(YEAR FROM end_time)::int {processed_sql}")
+    years = sorted(row[0] for row in cur.fetchall())
+    if years:
+        # The plays may be in years only the deleted file covered so far.
+        _ensure_partitions(cur, years, suffix)
+        insert_events_with_rollups(cur, f"SELECT {PROCESSED_COLUMNS} {processed_sql} ORDER BY end_time", (), suffix)
+        # Both files' summaries for those years change.
+        cur.execute(ADD_MANIFEST_YEARS_SQL.format(suffix=suffix), (years, file_id))
+
+
+def _delete_file_rows(cur, file_id, suffix=""):
+    delete_events_with_rollups(cur, "file_id = %s", (file_id,), suffix)
+    _hand_over_file_rows(cur, file_id, suffix)
+    cur.execute(f"DELETE FROM RAW.SPOTIFY_EVENTS{suffix} WHERE file_id = %s", (file_id,))
+    cur.execute(f"DELETE FROM RAW.SPOTIFY_EVENT_FILES{suffix} WHERE file_id = %s", (file_id,))
+
+
+def _claim_file(conn, file_path, suffix="", fingerprint=None):
+    # Returns (file_id, rows already committed, duplicates among them) for a file
+    # that needs loading, or None when the manifest shows the same content was loaded before.
+    # Parallel loads pass the fingerprint their parser process computed.
+    manifest_path = os.path.relpath(file_path, DATA_DIR)
+    file_size, content_hash = fingerprint or _file_fingerprint(file_path)
+
+    with conn.cursor() as cur:
+        cur.execute(GET_MANIFEST_SQL.format(suffix=suffix), (manifest_path,))
+        entry = cur.fetchone()
+
+        if entry is None:
+            cur.execute(INSERT_MANIFEST_SQL.format(suffix=suffix), (manifest_path, file_size, content_hash))
+            claim = (cur.fetchone()[0], 0, 0)
+        else:
+            file_id, known_size, known_hash, row_count, duplicate_count, status = entry
+            unchanged = (known_size, known_hash) == (file_size, content_hash)
+            if unchanged and status in ("loaded", "processed"):
+                claim = None
+            elif unchanged and status == "loading":
+                claim = (file_id, row_count, duplicate_count)
+            else:
+                _delete_file_rows(cur, file_id, suffix)
+                cur.execute(RESET_MANIFEST_SQL.format(suffix=suffix), (file_size, content_hash, file_id))
+                claim = (file_id, 0, 0)
 
+    conn.commit()
+    return claim
+
+
+def _load_file(conn, file_path, mode, open_chunks, suffix="", fingerprint=None):
+    _, write_chunks = _LOAD_MODES[mode]
+    update_manifest_sql = UPDATE_MANIFEST_SQL.format(suffix=suffix)
+
+    claim = _claim_file(conn, file_path, suffix, fingerprint)
+    if claim is None:
+        print(f"Skipping {file_path}: unchanged since last load.")
+        return
+
+    file_id, loaded, duplicates = claim
+    resumed_from, resumed_duplicates = loaded, duplicates
+    if resumed_from:
+        print(f"Resuming {file_path} after {resumed_from} committed records...")
+    else:
+        print(f"Loading {file_path}...")
+
+    started = time.perf_counter()
+    chunks = iter(open_chunks(file_id, resumed_from))
     try:
         with conn.cursor() as cur:
-            print(f"Found {len(json_files)} JSON files. Starting load...")
-            cur.execute("TRUNCATE TABLE RAW.SPOTIFY_EVENTS")
+            # Commit every COMMIT_CHUNKS chunks together with the manifest row count,
+            # so an interrupted load resumes after the last committed batch.
+            while True:
+                batch_started = time.perf_counter()
+                cur.execute(CREATE_STAGING_SQL)
+                read = write_chunks(cur, islice(chunks, COMMIT_CHUNKS))
+                if not read:
+                    break
+                written = _merge_staged_rows(cur, read, suffix)
+                loaded += read
+                duplicates += read - written
+                cur.execute(update_manifest_sql, (loaded, duplicates, "loading", file_id))
+                conn.commit()
+                LOADER_BATCH_SECONDS.labels(mode).observe(time.perf_counter() - batch_started)
+                LOADER_ROWS.labels(mode).inc(written)
+                LOADER_DUPLICATE_ROWS.labels(mode).inc(read - written)
+
+            cur.execute(update_manifest_sql, (loaded, duplicates, "loaded", file_id))
+        conn.commit()
+    except Exception as exc:
+        conn.rollback()
+        with conn.cursor() as cur:
+            _delete_file_rows(cur, file_id, suffix)
+            cur.execute(update_manifest_sql, (0, 0, "failed", file_id))
+        conn.commit()
+        print(f"Skipping {file_path}: {exc}")
+        return
+
+    if not loaded:
+        print(f"Skipping {file_path}: no records found.")
+        return
 
-            for file_path in json_files:
+    _report_loaded(file_path, loaded - resumed_from, duplicates - resumed_duplicates, started, mode)
+
+
+def _load_files_sequential(conn, json_files, mode, suffix="", live_stats=None):
+    for file_path in json_files:
+        _load_file(
+            conn,
+            file_path,
+            mode,
+            lambda file_id, skip: _iter_file_chunks(file_path, mode, file_id, skip, live_stats),
+            suffix,
+        )
+
+
+def _writer_loop(parsed_files, mode, suffix="", live_stats=None):
+    conn = get_db_connection()
+
+    try:
+        while True:
+            try:
+                file_path, chunks, reply_queue = parsed_files.get_nowait()
+            except queue.Empty:
+                return
+
+            claimed = []
+
+            def open_chunks(file_id, skip):
+                reply_queue.put((file_id, skip))
+                claimed.append(file_id)
+                return chunks
+
+            try:
+                # The parser sends the file's fingerprint ahead of its chunks.
                 try:
-                    records = _load_file_records(file_path)
+                    fingerprint = next(chunks)
                 except Exception as exc:
                     print(f"Skipping {file_path}: {exc}")
                     continue
+                _load_file(conn, file_path, mode, open_chunks, suffix, fingerprint)
+            finally:
+                if not claimed:
+                    reply_queue.put(None)
+                chunks.drain()
+                if live_stats is not None and chunks.live_stats is not None:
+                    live_stats.merge(chunks.live_stats)
+    finally:
+        conn.close()
 
-                if not records:
-                    print(f"Skipping {file_path}: no records found.")
-                    continue
 
-                print(f"Loading {file_path} with {len(records)} records...")
-                for batch in _chunked(records, BATCH_SIZE):
-                    execute_values(cur, RAW_INSERT_SQL, batch, page_size=BATCH_SIZE)
-                conn.commit()
+def _load_files_parallel(json_files, mode, workers, writers, suffix="", live_stats=None):
+    writers = max(1, min(writers, len(json_files)))
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as parse_pool:
+        # Every file is queued on the parse pool up front, so `workers` files are
+        # hashed and parsed at a time whatever the number of writers; each parser
+        # runs at most QUEUE_DEPTH chunks ahead of the DB. Writers take files in
+        # the same order and commit each independently, so a failing file never
+        # affects the others.
+        parsed_files = queue.Queue()
+        for file_path in json_files:
+            chunk_queue = manager.Queue(maxsize=QUEUE_DEPTH)
+            reply_queue = manager.Queue()
+            future = parse_pool.submit(
+                _parse_file_worker, file_path, mode, chunk_queue, reply_queue, live_stats is not None
+            )
+            parsed_files.put((file_path, _QueuedChunks(chunk_queue, future), reply_queue))
+
+        with ThreadPoolExecutor(max_workers=writers) as writer_pool:
+            futures = [
+                writer_pool.submit(_writer_loop, parsed_files, mode, suffix, live_stats)
+                for _ in range(writers)
+            ]
+            for future in futures:
+                future.result()
+
+
+def clear_loaded_data(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            TRUNCATE TABLE
+                RAW.SPOTIFY_EVENTS,
+                RAW.SPOTIFY_EVENT_FILES,
+                PRS.SPOTIFY_EVENTS,
+                PRS.SPOTIFY_ROLLUP_HOURLY,
+                PRS.SPOTIFY_ROLLUP_TRACKS,
+                PRS.SPOTIFY_ROLLUP_ARTISTS,
+                PRS.SPOTIFY_ROLLUP_EPISODES,
+                RAW.SPOTIFY_LOAD_MANIFEST,
+                PRS.SPOTIFY_WRAPPED_SUMMARY,
+                PRS.SPOTIFY_WRAPPED_USER_SUMMARY
+            """
+        )
+    conn.commit()
+
+
+def load_raw_files(conn, json_files, mode=DEFAULT_LOAD_MODE, workers=1, writers=None, suffix="", live_stats=None):
+    # Loads files into RAW.SPOTIFY_EVENTS only; process_data() transforms them.
+    # live_stats (a LiveStatsPublisher) sees every record as it is mapped.
+    print(f"Found {len(json_files)} JSON files. Starting {mode} load...")
+    if workers > 1:
+        print(f"Parsing with {workers} worker processes.")
+        _load_files_parallel(json_files, mode, workers, writers or workers, suffix, live_stats)
+    else:
+        _load_files_sequential(conn, json_files, mode, suffix, live_stats)
+    print("Raw data loaded successfully.")
+
+
+def _load_raw_files_with_stats(conn, json_files, mode, workers, writers, suffix="", live_stats=False):
+    if not live_stats:
+        load_raw_files(conn, json_files, mode, workers, writers, suffix)
+        return
+    publisher = LiveStatsPublisher(get_db_connection())
+    try:
+        load_raw_files(conn, json_files, mode, workers, writers, suffix, publisher)
+    finally:
+        publisher.close()
+
+
+def reload_all(conn, json_files, mode=DEFAULT_LOAD_MODE, workers=1, writers=None, live_stats=False):
+    # Rebuilds everything from the export files in shadow tables while the API
+    # keeps serving the current data, then swaps them in at once. Returns the
+    # years the new data covers.
+    with conn.cursor() as cur:
+        create_shadow_tables(cur)
+    conn.commit()
+    print("Building a full reload in shadow tables; the current data stays live until the swap.")
+
+    with LOADER_PHASE_SECONDS.labels("ingest").time():
+        _load_raw_files_with_stats(conn, json_files, mode, workers, writers, SHADOW_SUFFIX, live_stats)
+    with LOADER_PHASE_SECONDS.labels("process").time():
+        years = process_data(conn, suffix=SHADOW_SUFFIX)
+        with conn.cursor() as cur:
+            finish_shadow_tables(cur)
+        conn.commit()
 
-        print("Raw data loaded successfully.")
-        process_data(conn)
+    def drop_stale_summaries(cur):
+        for statement in DELETE_STALE_SUMMARIES_SQL:
+            cur.execute(statement, (years,))
+
+    with LOADER_PHASE_SECONDS.labels("swap").time():
+        swap_shadow_tables(conn, drop_stale_summaries)
+    print("Swapped the reloaded tables in.")
+    return years
+
+
+def load_json_files(
+    mode=DEFAULT_LOAD_MODE, workers=1, writers=None, full=False, year=None, snapshot=None, live_stats=False
+):
+    if mode not in _LOAD_MODES:
+        raise ValueError(f"Unknown load mode {mode!r}. Expected one of: {', '.join(LOAD_MODES)}.")
+
+    json_files = list_export_files(DATA_DIR)
+    if not json_files and year is None and snapshot is None:
+        print("No JSON files found in data directory.")
+        return
+
+    conn = get_db_connection()
+
+    try:
+        if full:
+            years = reload_all(conn, json_files, mode, workers, writers, live_stats)
+        else:
+            if json_files:
+                with LOADER_PHASE_SECONDS.labels("ingest").time():
+                    _load_raw_files_with_stats(conn, json_files, mode, workers, writers, live_stats=live_stats)
+            else:
+                print("No JSON files found in data directory.")
+
+            with LOADER_PHASE_SECONDS.labels("process").time():
+                years = process_data(conn)
+
+        if year is not None:
+            rebuild_year(conn, year)
+            years = sorted(set(years) | {year})
+        if snapshot:
+            write_events_snapshot(conn, snapshot)
     finally:
         conn.close()
 
-    summary = refresh_wrapped_summary(SUMMARY_YEAR)
+    if not years:
+        print("No years changed; summaries are up to date.")
+    with LOADER_PHASE_SECONDS.labels("refresh").time():
+        for changed_year in years:
+            refresh_summaries(changed_year)
+
+
+def refresh_summaries(year):
+    # This run just wrote events, so it waits for any refresh in flight and
+    # then runs its own instead of reusing a result that may predate them.
+    summary = refresh_wrapped_summary(year, reuse_in_flight=False)
     if summary:
         print(f"Summary cache refreshed for {summary['year']} at {summary['generated_at']}.")
 
+    user_count = refresh_user_wrapped_summaries(year, reuse_in_flight=False)
+    print(f"Per-user summaries for {year} refreshed for {user_count} users.")
 
-def process_data(conn):
-    print(f"Processing data for {SUMMARY_YEAR}...")
 
-    with conn.cursor() as cur:
-        cur.execute("TRUNCATE TABLE PRS.SPOTIFY_EVENTS_2025")
+def _ensure_partitions(cur, years, suffix=""):
+    # Partitions of the shadow table stay unlogged until shadow_tables.finish_shadow_tables().
+    for year in years:
+        cur.execute("SELECT PRS.ensure_spotify_events_partition(%s, %s, %s)", (year, suffix, bool(suffix)))
+
 
+def process_data(conn, suffix=""):
+    # Only rows from files loaded since the last run are transformed; files
+    # already marked processed keep their PRS rows untouched. Returns the years
+    # whose summaries are out of date, including years a replaced or failed
+    # file previously contributed to.
+    with conn.cursor() as cur:
         cur.execute(
+            f"""
+            SELECT file_id, status, COALESCE(years, '{{}}')
+            FROM RAW.SPOTIFY_LOAD_MANIFEST{suffix}
+            WHERE status = 'loaded'
+               OR (status = 'failed' AND years IS NOT NULL)
+            ORDER BY file_id
+            FOR UPDATE
             """
-            INSERT INTO PRS.SPOTIFY_EVENTS_2025 (end_time, artist_name, track_name, ms_played, episode_name, episode_show_name)
-            SELECT
-                end_time,
-                artist_name,
-                track_name,
-                ms_played,
-                episode_name,
-                episode_show_name
+        )
+        entries = cur.fetchall()
+        changed_years = {year for _file_id, _status, years in entries for year in years}
+        file_ids = [file_id for file_id, status, _years in entries if status == "loaded"]
+        failed_ids = [file_id for file_id, status, _years in entries if status == "failed"]
+
+        if failed_ids:
+            cur.execute(f"UPDATE RAW.SPOTIFY_LOAD_MANIFEST{suffix} SET years = NULL WHERE file_id = ANY(%s)", (failed_ids,))
+
+        if not file_ids:
+            conn.commit()
+            print("No newly loaded files to process.")
+            return sorted(changed_years)
+
+        print(f"Processing {len(file_ids)} newly loaded files...")
+        cur.execute(
+            f"""
+            SELECT file_id, array_agg(DISTINCT EXTRACT(YEAR FROM end_time)::int)
+            FROM RAW.SPOTIFY_EVENTS{suffix}
+            WHERE file_id = ANY(%s)
+              AND {PROCESSED_EVENT_FILTER}
+            GROUP BY file_id
+            """,
+            (file_ids,),
+        )
+        file_years = dict(cur.fetchall())
+        new_years = {year for years in file_years.values() for year in years}
+        _ensure_partitions(cur, sorted(new_years), suffix)
+
+        # The rollups are updated in the same statement, from the inserted rows only.
+        insert_events_with_rollups(
+            cur,
+            f"""
+            SELECT {PROCESSED_COLUMNS}
+            FROM RAW.SPOTIFY_EVENTS{suffix}
+            WHERE file_id = ANY(%s)
+              AND {PROCESSED_EVENT_FILTER}
+            ORDER BY end_time
+            """,
+            (file_ids,),
+            suffix,
+        )
+        for file_id in file_ids:
+            cur.execute(
+                f"""
+                UPDATE RAW.SPOTIFY_LOAD_MANIFEST{suffix}
+                SET status = 'processed', years = %s, updated_at = NOW()
+                WHERE file_id = %s
+                """,
+                (sorted(file_years.get(file_id, [])), file_id),
+            )
+
+    conn.commit()
+    changed_years |= new_years
+    print(f"Data processed into PRS.SPOTIFY_EVENTS for years: {', '.join(map(str, sorted(new_years))) or 'none'}.")
+    return sorted(changed_years)
+
+
+def rebuild_year(conn, year):
+    # Re-derives one partition from the RAW rows of files known to contain that
+    # year; other partitions are neither locked nor scanned. DELETE rather than
+    # TRUNCATE: readers keep seeing the old rows until the rebuild commits
+    # instead of waiting on an ACCESS EXCLUSIVE lock.
+    start, end = year_bounds(year)
+    with conn.cursor() as cur:
+        _ensure_partitions(cur, [year])
+        cur.execute(f"DELETE FROM PRS.SPOTIFY_EVENTS_{int(year)}")
+        clear_year_rollups(cur, year)
+        rebuilt = insert_events_with_rollups(
+            cur,
+            f"""
+            SELECT {PROCESSED_COLUMNS}
             FROM RAW.SPOTIFY_EVENTS
-            WHERE EXTRACT(YEAR FROM end_time) = %s
-              AND ms_played > 0
-              AND (track_name IS NOT NULL OR episode_name IS NOT NULL)
+            WHERE file_id IN (
+                SELECT file_id
+                FROM RAW.SPOTIFY_LOAD_MANIFEST
+                WHERE status = 'processed' AND %s = ANY(years)
+            )
+              AND end_time >= %s
+              AND end_time < %s
+              AND {PROCESSED_EVENT_FILTER}
+            ORDER BY end_time
             """,
-            (SUMMARY_YEAR,),
+            (year, start, end),
         )
 
     conn.commit()
-    print("Data processed and populated into PRS.SPOTIFY_EVENTS_2025.")
+    print(f"Rebuilt PRS.SPOTIFY_EVENTS_{int(year)} with {rebuilt} events.")
+
+
+def write_events_snapshot(conn, path):
+    # Streams PRS.SPOTIFY_EVENTS through a server-side cursor into a columnar
+    # snapshot that analytics processes can memory-map (see snapshot.py).
+    started = time.perf_counter()
+    with conn.cursor(name="spotify_events_snapshot") as cur:
+        cur.itersize = SNAPSHOT_FETCH_ROWS
+        cur.execute(f"SELECT {', '.join(EVENT_FIELDS)} FROM PRS.SPOTIFY_EVENTS")
+        events = encode_events(cur)
+    conn.commit()
+
+    write_snapshot(path, events)
+    print(f"Wrote snapshot of {len(events)} events to {path} in {time.perf_counter() - started:.2f}s.")
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load Spotify JSON exports into PostgreSQL.")
+    parser.add_argument(
+        "--mode",
+        choices=LOAD_MODES,
+        default=DEFAULT_LOAD_MODE,
+        help="Bulk ingest with COPY (default) or fall back to batched INSERT ... VALUES.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Parser processes for parallel loading (for example, the number of CPU cores). 1 loads sequentially.",
+    )
+    parser.add_argument(
+        "--writers",
+        type=int,
+        default=None,
+        help="DB writer connections in parallel mode; each loads one file at a time. Defaults to --workers.",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Rebuild all loaded data and the file manifest from every file in shadow tables, then swap them in. The API keeps serving the current data until the swap.",
+    )
+    parser.add_argument(
+        "--year",
+        type=int,
+        default=None,
+        help="Also rebuild this year's partition from RAW and refresh its summaries. Years that received new events are always refreshed.",
+    )
+    parser.add_argument(
+        "--live-stats",
+        action="store_true",
+        help="Publish provisional top-k statistics (/api/v2/live) while ingesting, at some parsing cost and one extra connection.",
+    )
+    parser.add_argument(
+        "--snapshot",
+        default=None,
+        help="Also write a memory-mappable columnar snapshot of PRS.SPOTIFY_EVENTS to this directory.",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve Prometheus metrics (rows/sec, batch timings) on this port while loading.",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        help="Write Prometheus metrics to this file when the load ends (node_exporter textfile collector).",
+    )
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    load_json_files()
+    args = _parse_args()
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    try:
+        load_json_files(
+            mode=args.mode,
+            workers=args.workers,
+            writers=args.writers,
+            full=args.full,
+            year=args.year,
+            snapshot=args.snapshot,
+            live_stats=args.live_stats,
+        )
+    finally:
+        if args.metrics_file:
+            write_metrics_file(args.metrics_file)
@@ -1,30 +1,119 @@
+import asyncio
 import os
+import time
 from contextlib import asynccontextmanager
+from datetime import datetime
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
-from database import close_db_pool, init_db_pool
-from wrapped_summary import SUMMARY_YEAR, get_wrapped_summary
+import database
+from database import close_async_db_pool, init_async_db_pool, update_pool_metrics
+from event_export import DEFAULT_EXPORT_SOURCE, EXPORT_SOURCES, export_events_async
+from metrics import HTTP_REQUEST_SECONDS, render_metrics, set_summary_ages
+from response_cache import ResponseCache
+from summary_cache import USER_SUMMARY_CACHE_SIZE, AsyncSummaryCache
+from summary_refresh import SummaryRefreshWorker, listen_for_summary_changes, refresh_year
+from timeseries import (
+    DEFAULT_TIMESERIES_BUCKET,
+    TIMESERIES_BUCKETS,
+    TIMESERIES_MAX_POINTS,
+    get_listening_timeseries_async,
+    timeseries_points,
+    utc_naive,
+)
+from wrapped_summary import (
+    SUMMARY_SECTIONS,
+    SUMMARY_YEAR,
+    get_live_stats_async,
+    get_user_wrapped_summary_async,
+    get_user_wrapped_summary_version_async,
+    get_wrapped_summary_async,
+    get_wrapped_summary_sections_async,
+    get_wrapped_summary_version_async,
+    year_bounds,
+)
 
 
 @asynccontextmanager
 async def lifespan(app_instance):
     try:
-        init_db_pool()
+        await init_async_db_pool()
         app_instance.state.db_pool_error = None
     except Exception as exc:
         app_instance.state.db_pool_error = str(exc)
 
+    tasks = [asyncio.create_task(refresh_worker.run())]
+    if database.DATABASE_URL:
+        tasks.append(asyncio.create_task(listen_for_summary_changes(_apply_summary_change, _clear_summary_caches)))
+
     yield
 
-    close_db_pool()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await close_async_db_pool()
+    summary_cache.clear()
+    section_cache.clear()
+    user_summary_cache.clear()
+    response_cache.clear()
+    user_response_cache.clear()
 
 
 app = FastAPI(title="Spotify Wrapped 2025", lifespan=lifespan)
 app.state.db_pool_error = None
 
+# Looked up at call time so the loaders can be swapped (e.g. in tests).
+summary_cache = AsyncSummaryCache(
+    lambda year: get_wrapped_summary_async(year),
+    lambda year: get_wrapped_summary_version_async(year),
+    name="summary",
+)
+# One entry per (year, section), for requests that only need part of a summary.
+section_cache = AsyncSummaryCache(
+    lambda key: get_wrapped_summary_sections_async(key[0], key[1:]),
+    lambda key: get_wrapped_summary_version_async(key[0]),
+    name="summary_section",
+)
+user_summary_cache = AsyncSummaryCache(
+    lambda key: get_user_wrapped_summary_async(*key),
+    lambda key: get_user_wrapped_summary_version_async(*key),
+    max_entries=USER_SUMMARY_CACHE_SIZE,
+    name="user_summary",
+)
+# Serialized and compressed endpoint bodies, rebuilt once per summary version.
+response_cache = ResponseCache()
+user_response_cache = ResponseCache(max_entries=USER_SUMMARY_CACHE_SIZE)
+refresh_worker = SummaryRefreshWorker(lambda year: refresh_year(year))
+
+
+async def _clear_summary_caches():
+    summary_cache.clear()
+    section_cache.clear()
+    user_summary_cache.clear()
+
+
+async def _apply_summary_change(change):
+    # Sent by the summary table triggers after every refresh, from any process.
+    year = change.get("year")
+    if change.get("scope") == "user_summary":
+        user_summary_cache.evict(lambda key: year is None or key[1] == year)
+        return
+    if year is None:
+        summary_cache.clear()
+        section_cache.clear()
+        return
+    # Sections reload lazily; most of them are never asked for on their own.
+    section_cache.evict(lambda key: key[0] == year)
+    try:
+        await summary_cache.reload(year)
+    except Exception as exc:
+        # Dropping the entry makes the next request load it.
+        summary_cache.evict(lambda key: key == year)
+        print(f"Reloading the {year} summary after a change failed: {exc}")
+
 # Allow CORS for local development
 app.add_middleware(
     CORSMiddleware,
@@ -34,17 +123,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Labelled by route template (e.g. /api/v2/wrapped/{user_id}) to keep series bounded.
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.labels(request.method, route, str(status)).observe(time.perf_counter() - started)
+
+
 # Serve frontend static files
 FRONTEND_DIR = os.path.join(os.path.dirname(__file__), "../frontend")
 if os.path.exists(FRONTEND_DIR):
     app.mount("/static", StaticFiles(directory=FRONTEND_DIR), name="static")
 
 
-def _get_cached_summary():
+YEAR_QUERY = Query(SUMMARY_YEAR, ge=1970, le=9999, description="Wrapped year; defaults to 2025.")
+
+
+async def _ensure_db_pool():
     startup_error = getattr(app.state, "db_pool_error", None)
     if startup_error:
         try:
-            init_db_pool()
+            await init_async_db_pool()
             app.state.db_pool_error = None
         except Exception as exc:
             raise HTTPException(
@@ -52,18 +158,81 @@ def _get_cached_summary():
                 detail=f"Database unavailable. {exc}",
             )
 
+
+async def _load_from_cache(cache, key):
+    await _ensure_db_pool()
     try:
-        summary = get_wrapped_summary(SUMMARY_YEAR)
+        return await cache.get(key)
     except Exception:
         raise HTTPException(
             status_code=503,
             detail="Database unavailable. Verify DATABASE_URL and that PostgreSQL is running.",
         )
 
+
+def _missing_summary(year):
+    return HTTPException(
+        status_code=503,
+        detail=f"Wrapped summary for {year} is missing. Run `python backend/loader.py --year {year}` to load data and refresh the summary cache.",
+    )
+
+
+async def _get_cached_summary(year=SUMMARY_YEAR):
+    summary = await _load_from_cache(summary_cache, year)
     if not summary:
+        raise _missing_summary(year)
+
+    return summary
+
+
+async def _get_cached_sections(year, sections):
+    # A cached full summary already has every section. Otherwise each section
+    # is loaded and cached on its own, so clients polling one stat never fetch
+    # or decode the whole document.
+    summary = summary_cache.peek(year)
+    if summary is not None:
+        return summary
+
+    parts = await asyncio.gather(*(_load_from_cache(section_cache, (year, section)) for section in sections))
+    if not all(parts):
+        raise _missing_summary(year)
+    if len({part["generated_at"] for part in parts}) > 1:
+        # A refresh landed between the section loads; the full summary is consistent.
+        return await _get_cached_summary(year)
+
+    summary = {}
+    for part in parts:
+        summary.update(part)
+    return summary
+
+
+def _parse_fields(fields):
+    # "top_tracks, skips" -> sections in SUMMARY_SECTIONS order; None for the whole summary.
+    if fields is None:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested.difference(SUMMARY_SECTIONS)
+    if unknown:
         raise HTTPException(
-            status_code=503,
-            detail="Wrapped summary for 2025 is missing. Run `python backend/loader.py` to load data and refresh the summary cache.",
+            status_code=422,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Choose from: {', '.join(SUMMARY_SECTIONS)}.",
+        )
+    return tuple(section for section in SUMMARY_SECTIONS if section in requested) or None
+
+
+def _project_fields(sections, *keys):
+    return lambda summary: {
+        **{key: summary.get(key) for key in keys},
+        **{section: summary.get(section) for section in sections},
+    }
+
+
+async def _get_cached_user_summary(user_id, year=SUMMARY_YEAR):
+    summary = await _load_from_cache(user_summary_cache, (user_id, year))
+    if not summary:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No Wrapped summary for user {user_id!r} in {year}.",
         )
 
     return summary
@@ -76,61 +245,243 @@ async def read_root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    update_pool_metrics()
+    set_summary_ages(summary_cache.items())
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@app.post("/api/v2/wrapped/refresh", status_code=202)
+async def request_summary_refresh(year: int = YEAR_QUERY):
+    # The refresh runs in the background worker; listeners reload when it commits.
+    refresh_worker.request(year)
+    return {"status": "scheduled", "year": year}
+
+
+async def _summary_response(request, year, name, project, sections=None):
+    if sections is None:
+        summary = await _get_cached_summary(year)
+    else:
+        summary = await _get_cached_sections(year, sections)
+    prepared = response_cache.get(name, summary, project)
+    return prepared.to_response(request.headers)
+
+
+FIELDS_QUERY = Query(
+    None,
+    description="Comma-separated summary sections to return (e.g. top_tracks,skips); defaults to all of them.",
+)
+
+
 @app.get("/api/v2/wrapped")
-def get_wrapped_v2():
-    return _get_cached_summary()
+async def get_wrapped_v2(request: Request, year: int = YEAR_QUERY, fields: str = FIELDS_QUERY):
+    sections = _parse_fields(fields)
+    if sections is None:
+        return await _summary_response(request, year, "wrapped", lambda summary: summary)
+    return await _summary_response(
+        request,
+        year,
+        "wrapped:" + ",".join(sections),
+        _project_fields(sections, "year", "generated_at"),
+        sections,
+    )
+
+
+@app.get("/api/v2/live")
+async def get_live_stats(year: int = YEAR_QUERY):
+    # Provisional, approximate sections the loader publishes while ingesting.
+    # Not cached: they change every few seconds during a load.
+    await _ensure_db_pool()
+    try:
+        stats = await get_live_stats_async(year)
+    except Exception:
+        raise HTTPException(
+            status_code=503,
+            detail="Database unavailable. Verify DATABASE_URL and that PostgreSQL is running.",
+        )
+    if not stats:
+        raise HTTPException(status_code=404, detail=f"No live statistics for {year}; the loader publishes them while it runs.")
+    return stats
+
+
+@app.get("/api/v2/wrapped/{user_id}")
+async def get_user_wrapped_v2(user_id: str, request: Request, year: int = YEAR_QUERY, fields: str = FIELDS_QUERY):
+    sections = _parse_fields(fields)
+    summary = await _get_cached_user_summary(user_id, year)
+    if sections is None:
+        prepared = user_response_cache.get("wrapped", summary, lambda user_summary: user_summary)
+    else:
+        prepared = user_response_cache.get(
+            "wrapped:" + ",".join(sections), summary, _project_fields(sections, "user_id", "year", "generated_at")
+        )
+    return prepared.to_response(request.headers)
 
 
 @app.get("/api/stats/top-tracks")
-def get_top_tracks():
-    summary = _get_cached_summary()
-    return summary.get("top_tracks", [])
+async def get_top_tracks(request: Request, year: int = YEAR_QUERY):
+    return await _summary_response(
+        request,
+        year,
+        "top_tracks",
+        lambda summary: summary.get("top_tracks", []),
+        ("top_tracks",),
+    )
 
 
 @app.get("/api/stats/top-podcasts")
-def get_top_podcasts():
-    summary = _get_cached_summary()
-    return summary.get("top_podcasts", [])
+async def get_top_podcasts(request: Request, year: int = YEAR_QUERY):
+    return await _summary_response(
+        request,
+        year,
+        "top_podcasts",
+        lambda summary: summary.get("top_podcasts", []),
+        ("top_podcasts",),
+    )
 
 
 @app.get("/api/stats/total-time")
-def get_total_time():
-    summary = _get_cached_summary()
-    hours = summary.get("total_time", {}).get("hours", 0)
-    return {"total_hours_played_2025": hours}
+async def get_total_time(request: Request, year: int = YEAR_QUERY):
+    return await _summary_response(
+        request,
+        year,
+        "total_time",
+        lambda summary: {f"total_hours_played_{year}": summary.get("total_time", {}).get("hours", 0)},
+        ("total_time",),
+    )
 
 
 @app.get("/api/stats/top-artist")
-def get_top_artist():
-    summary = _get_cached_summary()
-    return summary.get("top_artist", {})
+async def get_top_artist(request: Request, year: int = YEAR_QUERY):
+    return await _summary_response(
+        request,
+        year,
+        "top_artist",
+        lambda summary: summary.get("top_artist", {}),
+        ("top_artist",),
+    )
 
 
 @app.get("/api/stats/active-hour")
-def get_active_hour():
-    summary = _get_cached_summary()
-    return summary.get("active_hour", {})
+async def get_active_hour(request: Request, year: int = YEAR_QUERY):
+    return await _summary_response(
+        request,
+        year,
+        "active_hour",
+        lambda summary: summary.get("active_hour", {}),
+        ("active_hour",),
+    )
 
 
 @app.get("/api/stats/top-days")
-def get_top_days():
-    summary = _get_cached_summary()
-    return summary.get("top_days", [])
+async def get_top_days(request: Request, year: int = YEAR_QUERY):
+    return await _summary_response(
+        request,
+        year,
+        "top_days",
+        lambda summary: summary.get("top_days", []),
+        ("top_days",),
+    )
 
 
 @app.get("/api/stats/listening-periods")
-def get_listening_periods():
-    summary = _get_cached_summary()
-    return summary.get("listening_periods", [])
+async def get_listening_periods(request: Request, year: int = YEAR_QUERY):
+    return await _summary_response(
+        request,
+        year,
+        "listening_periods",
+        lambda summary: summary.get("listening_periods", []),
+        ("listening_periods",),
+    )
 
 
 @app.get("/api/stats/most-played")
-def get_most_played():
-    summary = _get_cached_summary()
-    return summary.get("most_played", {})
+async def get_most_played(request: Request, year: int = YEAR_QUERY):
+    return await _summary_response(
+        request,
+        year,
+        "most_played",
+        lambda summary: summary.get("most_played", {}),
+        ("most_played",),
+    )
 
 
 @app.get("/api/stats/skips")
-def get_skips():
-    summary = _get_cached_summary()
-    return summary.get("skips", [])
+async def get_skips(request: Request, year: int = YEAR_QUERY):
+    return await _summary_response(request, year, "skips", lambda summary: summary.get("skips", []), ("skips",))
+
+
+@app.get("/api/stats/timeseries")
+async def get_timeseries(
+    year: int = YEAR_QUERY,
+    start: datetime = Query(None, alias="from", description="Range start (inclusive); defaults to the start of year."),
+    end: datetime = Query(None, alias="to", description="Range end (exclusive); defaults to the end of year."),
+    bucket: str = Query(DEFAULT_TIMESERIES_BUCKET, description="minute, hour, day, week or month."),
+    user_id: str = Query(None, description="Only this user's listening."),
+):
+    if bucket not in TIMESERIES_BUCKETS:
+        raise HTTPException(status_code=422, detail=f"Unknown bucket {bucket!r}. Choose from: {', '.join(TIMESERIES_BUCKETS)}.")
+    year_start, year_end = year_bounds(year)
+    start = utc_naive(start) if start is not None else year_start
+    end = utc_naive(end) if end is not None else year_end
+    if start >= end:
+        raise HTTPException(status_code=422, detail="from must be before to.")
+    if timeseries_points(start, end, bucket) > TIMESERIES_MAX_POINTS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Too many {bucket} buckets; request at most {TIMESERIES_MAX_POINTS} or use a coarser bucket.",
+        )
+
+    points = await _load_timeseries(start, end, bucket, user_id)
+    return {"from": start.isoformat(), "to": end.isoformat(), "bucket": bucket, "user_id": user_id, "points": points}
+
+
+async def _load_timeseries(start, end, bucket, user_id):
+    await _ensure_db_pool()
+    try:
+        return await get_listening_timeseries_async(start, end, bucket, user_id)
+    except Exception:
+        raise HTTPException(
+            status_code=503,
+            detail="Database unavailable. Verify DATABASE_URL and that PostgreSQL is running.",
+        )
+
+
+@app.get("/api/export/events")
+async def export_events(
+    source: str = Query(DEFAULT_EXPORT_SOURCE, description="raw or processed events."),
+    start: datetime = Query(None, description="Only events ending at or after this time."),
+    end: datetime = Query(None, description="Only events ending before this time."),
+    user_id: str = Query(None, description="Only this user's events."),
+    gzip: bool = Query(False, description="Compress the NDJSON stream with gzip."),
+):
+    if source not in EXPORT_SOURCES:
+        raise HTTPException(status_code=422, detail=f"Unknown source {source!r}. Choose from: {', '.join(sorted(EXPORT_SOURCES))}.")
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end.")
+
+    # Rows go out as they are fetched; the first chunk is read before the
+    # response starts so a database error can still become a 503.
+    chunks = export_events_async(source, start, end, user_id, gzip)
+    try:
+        first = await anext(chunks, b"")
+    except Exception:
+        await chunks.aclose()
+        raise HTTPException(
+            status_code=503,
+            detail="Database unavailable. Verify DATABASE_URL and that PostgreSQL is running.",
+        )
+
+    async def stream():
+        if first:
+            yield first
+        async for chunk in chunks:
+            yield chunk
+
+    filename = f"spotify_events_{source}.ndjson" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream(),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,114 @@
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+    write_to_textfile,
+)
+
+# Buckets in seconds, from cache-hit requests up to multi-second refresh queries.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# API
+HTTP_REQUEST_SECONDS = Histogram(
+    "wrapped_http_request_duration_seconds",
+    "API request latency by route template.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+SUMMARY_CACHE_REQUESTS = Counter(
+    "wrapped_summary_cache_requests_total",
+    "Summary cache lookups; result is hit, stale (served while revalidating) or miss.",
+    ["cache", "result"],
+)
+SUMMARY_AGE_SECONDS = Gauge(
+    "wrapped_summary_age_seconds",
+    "Seconds since the cached global summary was generated.",
+    ["year"],
+)
+EXPORT_ROWS = Counter("wrapped_export_rows_total", "Rows streamed by event exports.", ["source"])
+
+# Database
+DB_QUERY_SECONDS = Histogram(
+    "wrapped_db_query_duration_seconds",
+    "Query latency by query name, including fetching the result.",
+    ["query"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "wrapped_db_pool_wait_seconds",
+    "Time spent waiting for a connection.",
+    ["pool"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_SIZE = Gauge("wrapped_db_pool_size", "Open connections in the pool.", ["pool"])
+DB_POOL_IN_USE = Gauge("wrapped_db_pool_in_use", "Connections currently checked out.", ["pool"])
+DB_POOL_WAITING = Gauge("wrapped_db_pool_waiting", "Requests waiting for a connection.", ["pool"])
+
+# Loader
+LOADER_ROWS = Counter("wrapped_loader_rows_total", "Raw rows written by the loader.", ["mode"])
+LOADER_DUPLICATE_ROWS = Counter(
+    "wrapped_loader_duplicate_rows_total",
+    "Rows skipped by the loader because the same play was already loaded.",
+    ["mode"],
+)
+LOADER_BATCH_SECONDS = Histogram(
+    "wrapped_loader_batch_duration_seconds",
+    "Time to write and commit one batch of COMMIT_CHUNKS chunks.",
+    ["mode"],
+    buckets=LATENCY_BUCKETS,
+)
+LOADER_ROWS_PER_SECOND = Gauge("wrapped_loader_rows_per_second", "Load rate of the last run per file.", ["file"])
+LOADER_PHASE_SECONDS = Gauge(
+    "wrapped_loader_phase_duration_seconds",
+    "Duration of the last loader run per phase (ingest, process, swap, refresh).",
+    ["phase"],
+)
+
+
+@contextmanager
+def timed(histogram, *labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(*labels).observe(time.perf_counter() - started)
+
+
+def set_pool_stats(name, size, in_use, waiting=0):
+    DB_POOL_SIZE.labels(name).set(size)
+    DB_POOL_IN_USE.labels(name).set(in_use)
+    DB_POOL_WAITING.labels(name).set(waiting)
+
+
+def set_summary_ages(summaries):
+    # summaries: (year, summary) pairs; years no longer cached are dropped.
+    SUMMARY_AGE_SECONDS.clear()
+    for year, summary in summaries:
+        generated_at = summary.get("generated_at")
+        if not generated_at:
+            continue
+        generated = datetime.fromisoformat(generated_at)
+        age = (datetime.now(generated.tzinfo) - generated).total_seconds()
+        SUMMARY_AGE_SECONDS.labels(str(year)).set(max(age, 0.0))
+
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def serve_metrics(port):
+    # For long-running scripts: exposes /metrics on its own port in a daemon thread.
+    start_http_server(port)
+
+
+def write_metrics_file(path):
+    # Prometheus text format for the node_exporter textfile collector.
+    write_to_textfile(path, REGISTRY)
@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from fastapi import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always served
+    brotli = None
+
+MIN_COMPRESS_SIZE = 500
+CACHE_CONTROL = "no-cache"
+
+
+def _parse_accept_encoding(header):
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def _parse_if_none_match(header):
+    tags = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        # If-None-Match uses weak comparison.
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.add(tag)
+    return tags
+
+
+class PreparedResponse:
+    # One endpoint payload for one summary version, serialized and compressed once.
+    def __init__(self, payload, version_key):
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(version_key.encode("utf-8")).hexdigest()[:32]
+
+        # coding -> (body, strong ETag); each content-coding is its own representation.
+        self.variants = {"identity": (body, f'"{digest}"')}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = (gzip.compress(body, mtime=0), f'"{digest}-gzip"')
+            if brotli is not None:
+                self.variants["br"] = (brotli.compress(body), f'"{digest}-br"')
+
+    def _select_coding(self, accept_encoding):
+        accepted = _parse_accept_encoding(accept_encoding or "")
+        for coding in ("br", "gzip"):
+            if coding in self.variants and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+                return coding
+        return "identity"
+
+    def to_response(self, headers):
+        coding = self._select_coding(headers.get("accept-encoding"))
+        body, etag = self.variants[coding]
+        response_headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match:
+            tags = _parse_if_none_match(if_none_match)
+            known = {variant_etag for _body, variant_etag in self.variants.values()}
+            if "*" in tags or tags & known:
+                return Response(status_code=304, headers=response_headers)
+
+        if coding != "identity":
+            response_headers["Content-Encoding"] = coding
+        return Response(content=body, media_type="application/json", headers=response_headers)
+
+
+class ResponseCache:
+    # Keyed by (endpoint, user, year); an entry is rebuilt only when generated_at changes.
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name, summary, project):
+        key = (name, summary.get("user_id"), summary.get("year"))
+        version = summary.get("generated_at")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        prepared = PreparedResponse(project(summary), ":".join(map(str, key + (version,))))
+        with self._lock:
+            self._entries[key] = (version, prepared)
+            self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return prepared
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,113 @@
+from wrapped_summary import year_bounds
+
+PROCESSED_COLUMNS = "end_time, artist_name, track_name, ms_played, episode_name, episode_show_name, user_id, file_id"
+
+# Applies the aggregates of the rows returned by `changed` to every rollup,
+# multiplied by {sign} (1 when events are added, -1 when they are removed),
+# so the change and its rollup update commit together. {suffix} selects the
+# shadow tables a full reload builds (see shadow_tables.py).
+_ROLLUP_UPDATE_SQL = """
+WITH changed AS (
+    {change_sql}
+    RETURNING end_time, artist_name, track_name, ms_played, episode_name, episode_show_name, user_id
+),
+hourly AS (
+    INSERT INTO PRS.SPOTIFY_ROLLUP_HOURLY{suffix} AS r (day, user_id, hour, ms_played, plays)
+    SELECT
+        DATE(end_time),
+        COALESCE(user_id, ''),
+        EXTRACT(HOUR FROM end_time)::smallint,
+        {sign} * SUM(ms_played),
+        {sign} * COUNT(*)
+    FROM changed
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, user_id, hour)
+    DO UPDATE
+    SET ms_played = r.ms_played + EXCLUDED.ms_played,
+        plays = r.plays + EXCLUDED.plays
+),
+tracks AS (
+    INSERT INTO PRS.SPOTIFY_ROLLUP_TRACKS{suffix} AS r (year, user_id, artist_name, track_name, ms_played, plays, short_plays)
+    SELECT
+        EXTRACT(YEAR FROM end_time)::smallint,
+        COALESCE(user_id, ''),
+        COALESCE(artist_name, ''),
+        track_name,
+        {sign} * SUM(ms_played),
+        {sign} * COUNT(*),
+        {sign} * COUNT(*) FILTER (WHERE ms_played < 5000)
+    FROM changed
+    WHERE track_name IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (year, user_id, artist_name, track_name)
+    DO UPDATE
+    SET ms_played = r.ms_played + EXCLUDED.ms_played,
+        plays = r.plays + EXCLUDED.plays,
+        short_plays = r.short_plays + EXCLUDED.short_plays
+),
+artists AS (
+    INSERT INTO PRS.SPOTIFY_ROLLUP_ARTISTS{suffix} AS r (year, user_id, artist_name, ms_played, plays)
+    SELECT
+        EXTRACT(YEAR FROM end_time)::smallint,
+        COALESCE(user_id, ''),
+        artist_name,
+        {sign} * SUM(ms_played),
+        {sign} * COUNT(*)
+    FROM changed
+    WHERE artist_name IS NOT NULL
+    GROUP BY 1, 2, 3
+    ON CONFLICT (year, user_id, artist_name)
+    DO UPDATE
+    SET ms_played = r.ms_played + EXCLUDED.ms_played,
+        plays = r.plays + EXCLUDED.plays
+),
+episodes AS (
+    INSERT INTO PRS.SPOTIFY_ROLLUP_EPISODES{suffix} AS r (year, user_id, episode_show_name, episode_name, ms_played, plays)
+    SELECT
+        EXTRACT(YEAR FROM end_time)::smallint,
+        COALESCE(user_id, ''),
+        COALESCE(episode_show_name, ''),
+        episode_name,
+        {sign} * SUM(ms_played),
+        {sign} * COUNT(*)
+    FROM changed
+    WHERE episode_name IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (year, user_id, episode_show_name, episode_name)
+    DO UPDATE
+    SET ms_played = r.ms_played + EXCLUDED.ms_played,
+        plays = r.plays + EXCLUDED.plays
+)
+SELECT COUNT(*) FROM changed
+"""
+
+ROLLUP_TABLES = (
+    "PRS.SPOTIFY_ROLLUP_HOURLY",
+    "PRS.SPOTIFY_ROLLUP_TRACKS",
+    "PRS.SPOTIFY_ROLLUP_ARTISTS",
+    "PRS.SPOTIFY_ROLLUP_EPISODES",
+)
+
+
+def insert_events_with_rollups(cur, select_sql, params, suffix=""):
+    # select_sql must produce PROCESSED_COLUMNS; returns the number of events inserted.
+    change_sql = f"INSERT INTO PRS.SPOTIFY_EVENTS{suffix} ({PROCESSED_COLUMNS})\n    {select_sql}"
+    cur.execute(_ROLLUP_UPDATE_SQL.format(change_sql=change_sql, sign=1, suffix=suffix), params)
+    return cur.fetchone()[0]
+
+
+def delete_events_with_rollups(cur, where_sql, params, suffix=""):
+    change_sql = f"DELETE FROM PRS.SPOTIFY_EVENTS{suffix} WHERE {where_sql}"
+    cur.execute(_ROLLUP_UPDATE_SQL.format(change_sql=change_sql, sign=-1, suffix=suffix), params)
+    deleted = cur.fetchone()[0]
+    if deleted:
+        for table in ROLLUP_TABLES:
+            cur.execute(f"DELETE FROM {table}{suffix} WHERE plays <= 0")
+    return deleted
+
+
+def clear_year_rollups(cur, year):
+    start, end = year_bounds(year)
+    cur.execute("DELETE FROM PRS.SPOTIFY_ROLLUP_HOURLY WHERE day >= %s AND day < %s", (start, end))
+    for table in ROLLUP_TABLES[1:]:
+        cur.execute(f"DELETE FROM {table} WHERE year = %s", (year,))
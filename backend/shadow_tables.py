@@ -0,0 +1,162 @@
+import re
+import time
+
+from psycopg2 import errors
+
+# A full reload builds every loaded table again as <table>_SHADOW while the
+# live tables keep serving, then swaps them in within one transaction.
+SHADOW_SUFFIX = "_SHADOW"
+# Tables rebuilt by a full reload, with the indexes they need while loading
+# (ON CONFLICT targets: the dedup key, manifest paths, rollup keys). None keeps
+# them all; every other index is built after the bulk insert.
+SHADOW_TABLES = (
+    ("RAW.SPOTIFY_LOAD_MANIFEST", None),
+    ("RAW.SPOTIFY_EVENTS", ("idx_raw_events_event_key",)),
+    ("RAW.SPOTIFY_EVENT_FILES", None),
+    ("PRS.SPOTIFY_EVENTS", ()),
+    ("PRS.SPOTIFY_ROLLUP_HOURLY", None),
+    ("PRS.SPOTIFY_ROLLUP_TRACKS", None),
+    ("PRS.SPOTIFY_ROLLUP_ARTISTS", None),
+    ("PRS.SPOTIFY_ROLLUP_EPISODES", None),
+)
+# The swap gives up on a lock after SWAP_LOCK_TIMEOUT instead of queueing
+# readers behind it, and tries again.
+SWAP_LOCK_TIMEOUT = "2s"
+SWAP_ATTEMPTS = 10
+SWAP_RETRY_SECONDS = 1.0
+
+# Indexes of a table; constraint is set for primary keys and unique constraints.
+INDEXES_SQL = """
+    SELECT
+        index_class.relname,
+        con.conname,
+        pg_get_constraintdef(con.oid),
+        pg_get_indexdef(i.indexrelid)
+    FROM pg_index i
+    JOIN pg_class index_class ON index_class.oid = i.indexrelid
+    LEFT JOIN pg_constraint con
+        ON con.conindid = i.indexrelid AND con.conrelid = i.indrelid AND con.contype IN ('p', 'u')
+    WHERE i.indrelid = %s::regclass
+    ORDER BY index_class.relname
+"""
+PARTITIONS_SQL = "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass ORDER BY 1"
+SERIAL_SEQUENCES_SQL = """
+    SELECT attname, pg_get_serial_sequence(%s, attname)
+    FROM pg_attribute
+    WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+      AND pg_get_serial_sequence(%s, attname) IS NOT NULL
+"""
+
+_INDEX_HEAD = re.compile(r"^CREATE (UNIQUE )?INDEX \S+ ON (ONLY )?\S+ ")
+_TRAILING_DIGITS = re.compile(r"(?<=_idx|pkey)\d+$")
+
+
+def _indexes(cur, table):
+    cur.execute(INDEXES_SQL, (table,))
+    return cur.fetchall()
+
+
+def _partitions(cur, table):
+    cur.execute(PARTITIONS_SQL, (table,))
+    return [row[0] for row in cur.fetchall()]
+
+
+def _shadow_index_sql(shadow, name, constraint, constraint_def, index_def):
+    if constraint:
+        return f"ALTER TABLE {shadow} ADD CONSTRAINT {constraint}{SHADOW_SUFFIX} {constraint_def}"
+    unique = "UNIQUE " if index_def.startswith("CREATE UNIQUE") else ""
+    # ON ONLY is dropped so the index also covers the partitions.
+    return _INDEX_HEAD.sub(f"CREATE {unique}INDEX {name}{SHADOW_SUFFIX} ON {shadow} ", index_def, count=1)
+
+
+def create_shadow_tables(cur):
+    # Replaces whatever an interrupted reload left behind with empty, unlogged
+    # copies of SHADOW_TABLES. Column defaults keep using the live sequences.
+    for table, load_indexes in SHADOW_TABLES:
+        shadow = table + SHADOW_SUFFIX
+        cur.execute(f"DROP TABLE IF EXISTS {shadow}")
+        cur.execute("SELECT pg_get_partkeydef(%s::regclass)", (table,))
+        partition_key = cur.fetchone()[0]
+        if partition_key:
+            # A partitioned table has no storage; its partitions are created unlogged.
+            cur.execute(
+                f"CREATE TABLE {shadow} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED) PARTITION BY {partition_key}"
+            )
+        else:
+            cur.execute(f"CREATE UNLOGGED TABLE {shadow} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED)")
+        for index in _indexes(cur, table):
+            if load_indexes is None or index[0] in load_indexes:
+                cur.execute(_shadow_index_sql(shadow, *index))
+
+
+def finish_shadow_tables(cur):
+    # After the bulk load: makes the shadow tables crash-safe, then builds the
+    # indexes that were left out so each is sorted once instead of maintained per row.
+    for table, load_indexes in SHADOW_TABLES:
+        shadow = table + SHADOW_SUFFIX
+        for relation in _partitions(cur, shadow) or [shadow]:
+            cur.execute(f"ALTER TABLE {relation} SET LOGGED")
+        if load_indexes is not None:
+            for index in _indexes(cur, table):
+                if index[0] not in load_indexes:
+                    cur.execute(_shadow_index_sql(shadow, *index))
+        cur.execute(f"ANALYZE {shadow}")
+
+
+def _live_name(shadow_name, name):
+    return _TRAILING_DIGITS.sub("", shadow_name.replace((name + SHADOW_SUFFIX).lower(), name.lower(), 1))
+
+
+def _swap_table(cur, table):
+    schema, name = table.split(".")
+    shadow = table + SHADOW_SUFFIX
+    # The live table owns the sequences both tables draw from; hand them over first.
+    cur.execute(SERIAL_SEQUENCES_SQL, (table, table, table))
+    for column, sequence in cur.fetchall():
+        cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY {shadow}.{column}")
+    partitions = [(partition, _indexes(cur, partition)) for partition in _partitions(cur, shadow)]
+    indexes = _indexes(cur, shadow)
+
+    cur.execute(f"DROP TABLE {table}")
+    cur.execute(f"ALTER TABLE {shadow} RENAME TO {name}")
+    for partition, partition_indexes in partitions:
+        # prs.spotify_events_shadow_2025 -> spotify_events_2025, and the same for
+        # its generated index names (minus the digit added if the name was taken,
+        # numbered again like Postgres does when two indexes share columns).
+        cur.execute(f"ALTER TABLE {partition} RENAME TO {_live_name(partition.split('.')[-1], name)}")
+        taken = set()
+        for index_name, *_definition in partition_indexes:
+            live_name = base_name = _live_name(index_name, name)
+            number = 0
+            while live_name in taken:
+                number += 1
+                live_name = f"{base_name}{number}"
+            taken.add(live_name)
+            cur.execute(f"ALTER INDEX {schema}.{index_name} RENAME TO {live_name}")
+    for index_name, constraint, _constraint_def, _index_def in indexes:
+        if constraint:
+            cur.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {constraint} TO {constraint[:-len(SHADOW_SUFFIX)]}")
+        else:
+            cur.execute(f"ALTER INDEX {schema}.{index_name} RENAME TO {index_name[:-len(SHADOW_SUFFIX)]}")
+
+
+def swap_shadow_tables(conn, before_commit=None):
+    # Drops every live table and renames its shadow into place in a single
+    # transaction, so readers see either all old or all new data. before_commit(cur)
+    # runs inside that transaction.
+    for attempt in range(1, SWAP_ATTEMPTS + 1):
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+                for table, _load_indexes in SHADOW_TABLES:
+                    _swap_table(cur, table)
+                if before_commit is not None:
+                    before_commit(cur)
+            conn.commit()
+            return
+        except errors.LockNotAvailable:
+            conn.rollback()
+            if attempt == SWAP_ATTEMPTS:
+                raise
+            print(f"Tables are busy; retrying the swap ({attempt}/{SWAP_ATTEMPTS})...")
+            time.sleep(SWAP_RETRY_SECONDS)
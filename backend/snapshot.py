@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from itertools import islice
+
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+ENCODE_CHUNK_ROWS = 100000
+TEXT_COLUMNS = ("artist_name", "track_name", "episode_name", "episode_show_name", "user_id")
+# Row layout accepted by encode_events: end_time, ms_played, then TEXT_COLUMNS.
+EVENT_FIELDS = ("end_time", "ms_played") + TEXT_COLUMNS
+
+
+class EventColumns:
+    # Processed events as parallel arrays: end_time in seconds since the epoch,
+    # ms_played, and one int32 code array per text column. Codes index into
+    # values[column]; -1 is NULL.
+    def __init__(self, end_time, ms_played, codes, values):
+        self.end_time = end_time
+        self.ms_played = ms_played
+        self.codes = codes
+        self.values = values
+
+    def __len__(self):
+        return len(self.end_time)
+
+    def select(self, mask):
+        return EventColumns(
+            self.end_time[mask],
+            self.ms_played[mask],
+            {column: code_array[mask] for column, code_array in self.codes.items()},
+            self.values,
+        )
+
+
+class StringDictionary:
+    # Dictionary values kept as one UTF-8 blob plus offsets, so a snapshot's
+    # strings can be memory-mapped like the other columns; entries are decoded
+    # on access.
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, code):
+        return bytes(self._blob[self._offsets[code]:self._offsets[code + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[code] for code in range(len(self)))
+
+
+def encode_events(rows):
+    # Builds EventColumns from EVENT_FIELDS tuples; end_time may be a datetime or
+    # an ISO string without zone suffix.
+    dictionaries = {column: {} for column in TEXT_COLUMNS}
+    chunks = []
+    rows = iter(rows)
+
+    while True:
+        chunk = list(islice(rows, ENCODE_CHUNK_ROWS))
+        if not chunk:
+            break
+        fields = list(zip(*chunk))
+        codes = {}
+        for column, values in zip(TEXT_COLUMNS, fields[2:]):
+            lookup = dictionaries[column]
+            codes[column] = np.array(
+                [-1 if value is None else lookup.setdefault(value, len(lookup)) for value in values],
+                dtype=np.int32,
+            )
+        chunks.append(
+            (
+                np.array(fields[0], dtype="datetime64[us]").astype("datetime64[s]").astype(np.int64),
+                np.array([value or 0 for value in fields[1]], dtype=np.int32),
+                codes,
+            )
+        )
+
+    values = {column: list(dictionaries[column]) for column in TEXT_COLUMNS}
+    if not chunks:
+        empty_codes = {column: np.array([], dtype=np.int32) for column in TEXT_COLUMNS}
+        return EventColumns(np.array([], dtype=np.int64), np.array([], dtype=np.int32), empty_codes, values)
+
+    return EventColumns(
+        np.concatenate([chunk[0] for chunk in chunks]),
+        np.concatenate([chunk[1] for chunk in chunks]),
+        {column: np.concatenate([chunk[2][column] for chunk in chunks]) for column in TEXT_COLUMNS},
+        values,
+    )
+
+
+def write_snapshot(path, events):
+    # Written next to the target and swapped in, so readers never see a partial
+    # snapshot; processes that still map the old files keep reading them.
+    staging_path = f"{path}.tmp"
+    shutil.rmtree(staging_path, ignore_errors=True)
+    os.makedirs(staging_path)
+
+    def save(name, array):
+        np.save(os.path.join(staging_path, f"{name}.npy"), array)
+
+    save("end_time", np.asarray(events.end_time, dtype=np.int64))
+    save("ms_played", np.asarray(events.ms_played, dtype=np.int32))
+    for column in TEXT_COLUMNS:
+        save(column, np.asarray(events.codes[column], dtype=np.int32))
+        strings = events.values[column]
+        if not isinstance(strings, StringDictionary):
+            strings = StringDictionary.from_values(strings)
+        save(f"{column}.values", np.asarray(strings._blob))
+        save(f"{column}.offsets", np.asarray(strings._offsets))
+
+    with open(os.path.join(staging_path, "meta.json"), "w", encoding="utf-8") as file_obj:
+        json.dump(
+            {"version": SNAPSHOT_VERSION, "rows": len(events), "generated_at": datetime.now().isoformat()},
+            file_obj,
+        )
+
+    previous_path = f"{path}.old"
+    shutil.rmtree(previous_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, previous_path)
+    os.replace(staging_path, path)
+    shutil.rmtree(previous_path, ignore_errors=True)
+
+
+def open_snapshot(path):
+    # Every array is memory-mapped read-only: opening costs a few header reads,
+    # and processes opening the same snapshot share its pages.
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as file_obj:
+        meta = json.load(file_obj)
+    if meta.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {meta.get('version')!r} in {path}.")
+
+    def load(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+    return EventColumns(
+        load("end_time"),
+        load("ms_played"),
+        {column: load(column) for column in TEXT_COLUMNS},
+        {column: StringDictionary(load(f"{column}.values"), load(f"{column}.offsets")) for column in TEXT_COLUMNS},
+    )
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+from metrics import SUMMARY_CACHE_REQUESTS
+
+SUMMARY_CACHE_TTL_SECONDS = float(os.getenv("SUMMARY_CACHE_TTL_SECONDS", "30"))
+USER_SUMMARY_CACHE_SIZE = int(os.getenv("USER_SUMMARY_CACHE_SIZE", "1024"))
+
+
+_background_tasks = set()
+
+
+def _spawn_task(target, *args):
+    # The loop only keeps weak references to tasks, so hold on to them until done.
+    task = asyncio.get_running_loop().create_task(target(*args))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+class AsyncSummaryCache:
+    # Decoded summaries keyed by year (or any hashable key the coroutine loaders
+    # accept). Within the TTL an entry is served with no database access; after
+    # it, the stale entry is still served while one background task revalidates
+    # it, comparing generated_at and reloading only on change. Concurrent misses
+    # for one key share a single load instead of each querying. Only the event
+    # loop's thread touches it, so no locking is needed.
+    def __init__(
+        self,
+        load_summary,
+        load_version,
+        ttl_seconds=SUMMARY_CACHE_TTL_SECONDS,
+        max_entries=None,
+        clock=time.monotonic,
+        spawn=_spawn_task,
+        name="summary",
+    ):
+        self.name = name
+        self._load_summary = load_summary
+        self._load_version = load_version
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._spawn = spawn
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._loading = {}
+
+    def _store(self, key, summary):
+        self._entries[key] = (summary, self._clock())
+        self._entries.move_to_end(key)
+        if self.max_entries is not None:
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, key):
+        # Returns the cached summary (None on a miss) and whether it is due for revalidation.
+        entry = self._entries.get(key)
+        if entry is None:
+            SUMMARY_CACHE_REQUESTS.labels(self.name, "miss").inc()
+            return None, False
+        summary, checked_at = entry
+        self._entries.move_to_end(key)
+        if self._clock() - checked_at < self.ttl_seconds:
+            SUMMARY_CACHE_REQUESTS.labels(self.name, "hit").inc()
+            return summary, False
+        SUMMARY_CACHE_REQUESTS.labels(self.name, "stale").inc()
+        if key not in self._refreshing:
+            self._refreshing.add(key)
+            return summary, True
+        return summary, False
+
+    def _finish_revalidation(self, key, summary):
+        # clear() while revalidating drops the result instead of resurrecting the entry.
+        if key in self._refreshing:
+            self._store(key, summary)
+            self._refreshing.discard(key)
+
+    def peek(self, key):
+        # The entry if it is within its TTL; never loads or revalidates.
+        entry = self._entries.get(key)
+        if entry is None or self._clock() - entry[1] >= self.ttl_seconds:
+            return None
+        SUMMARY_CACHE_REQUESTS.labels(self.name, "hit").inc()
+        return entry[0]
+
+    def evict(self, predicate):
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+            # An in-flight revalidation must not put the old summary back.
+            self._refreshing.discard(key)
+        # Later misses start a new load rather than joining one that began before the change.
+        for key in [key for key in self._loading if predicate(key)]:
+            del self._loading[key]
+
+    def items(self):
+        return [(key, summary) for key, (summary, _checked_at) in self._entries.items()]
+
+    def clear(self):
+        self._entries.clear()
+        self._refreshing.clear()
+        self._loading.clear()
+
+    async def get(self, key):
+        summary, revalidate = self._lookup(key)
+        if summary is not None:
+            if revalidate:
+                self._spawn(self._revalidate, key, summary)
+            return summary
+
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._load(key))
+            self._loading[key] = task
+            task.add_done_callback(lambda done: self._loading.pop(key) if self._loading.get(key) is done else None)
+        # A cancelled request must not cancel the load the others are waiting on.
+        return await asyncio.shield(task)
+
+    async def _load(self, key):
+        summary = await self._load_summary(key)
+        if summary:
+            self._store(key, summary)
+        return summary
+
+    async def _revalidate(self, key, summary):
+        try:
+            version = await self._load_version(key)
+            if version is not None and version != summary.get("generated_at"):
+                summary = await self._load_summary(key) or summary
+        except Exception as exc:
+            print(f"Summary cache revalidation for {key} failed: {exc}")
+        finally:
+            self._finish_revalidation(key, summary)
+
+    async def reload(self, key):
+        # Replaces the entry right away, for when the summary is known to have changed.
+        summary = await self._load_summary(key)
+        self._refreshing.discard(key)
+        if summary:
+            self._store(key, summary)
+        else:
+            self._entries.pop(key, None)
+        return summary
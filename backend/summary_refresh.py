@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+
+from database import listen_async
+from wrapped_summary import SUMMARY_YEAR, refresh_user_wrapped_summaries_async, refresh_wrapped_summary_async
+
+# Must match the channel used by PRS.notify_spotify_wrapped_summary() in schema.sql.
+SUMMARY_CHANNEL = "spotify_wrapped_summary"
+# 0 disables scheduled refreshes; on-demand requests are always served.
+SUMMARY_REFRESH_INTERVAL_SECONDS = float(os.getenv("SUMMARY_REFRESH_INTERVAL_SECONDS", "0"))
+SUMMARY_REFRESH_YEARS = tuple(int(year) for year in os.getenv("SUMMARY_REFRESH_YEARS", str(SUMMARY_YEAR)).split(","))
+LISTEN_RETRY_SECONDS = 1.0
+LISTEN_MAX_RETRY_SECONDS = 30.0
+
+
+async def refresh_year(year):
+    await refresh_wrapped_summary_async(year)
+    await refresh_user_wrapped_summaries_async(year)
+
+
+class SummaryRefreshWorker:
+    # Refreshes summaries off the request path: every interval_seconds for the
+    # configured years, and for any year passed to request(). Requests that
+    # arrive while a refresh runs are batched into the next pass.
+    def __init__(self, refresh=refresh_year, interval_seconds=SUMMARY_REFRESH_INTERVAL_SECONDS, years=SUMMARY_REFRESH_YEARS):
+        self._refresh = refresh
+        self.interval_seconds = interval_seconds
+        self.years = years
+        self._pending = set()
+        self._wakeup = None
+
+    def request(self, year):
+        self._pending.add(year)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run_pending(self):
+        years, self._pending = sorted(self._pending), set()
+        if self._wakeup is not None:
+            self._wakeup.clear()
+        for year in years:
+            try:
+                await self._refresh(year)
+                print(f"Background refresh of {year} summaries finished.")
+            except Exception as exc:
+                print(f"Background refresh of {year} summaries failed: {exc}")
+
+    async def run(self):
+        # Created here so the event belongs to the loop running the worker.
+        self._wakeup = asyncio.Event()
+        if self._pending:
+            self._wakeup.set()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval_seconds or None)
+            except asyncio.TimeoutError:
+                self._pending.update(self.years)
+            await self.run_pending()
+
+
+async def listen_for_summary_changes(on_change, on_listen):
+    # Calls on_change with each decoded notification. After a disconnect the
+    # listener reconnects with backoff and calls on_listen again, since
+    # notifications sent in between are lost.
+    delay = LISTEN_RETRY_SECONDS
+    while True:
+        try:
+            async for payload in listen_async(SUMMARY_CHANNEL, on_listen):
+                delay = LISTEN_RETRY_SECONDS
+                await on_change(json.loads(payload))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            print(f"Summary change listener disconnected: {exc}. Retrying in {delay:g}s.")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, LISTEN_MAX_RETRY_SECONDS)
@@ -0,0 +1,111 @@
+import os
+from datetime import timedelta, timezone
+
+from database import execute_query_async
+
+# Bucket name (a date_trunc field) -> its shortest length, for limiting the number of points.
+TIMESERIES_BUCKETS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+    "month": timedelta(days=28),
+}
+DEFAULT_TIMESERIES_BUCKET = "day"
+TIMESERIES_MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", "10000"))
+
+# Whole hours in [rollup_start, rollup_end) come from PRS.SPOTIFY_ROLLUP_HOURLY
+# (a year is at most 8784 hours per user); only the partial hours at either end,
+# or every row for minute buckets, are read from PRS.SPOTIFY_EVENTS through the
+# end_time indexes. Empty buckets are returned with zeros.
+LISTENING_TIMESERIES_SQL = """
+WITH plays AS (
+    SELECT
+        date_trunc(%(bucket)s, day + hour * INTERVAL '1 hour') AS bucket,
+        SUM(ms_played) AS ms_played,
+        SUM(plays) AS plays
+    FROM PRS.SPOTIFY_ROLLUP_HOURLY
+    WHERE day >= %(rollup_start)s::date
+      AND day <= %(rollup_end)s::date
+      AND day + hour * INTERVAL '1 hour' >= %(rollup_start)s
+      AND day + hour * INTERVAL '1 hour' < %(rollup_end)s
+      AND (%(user_id)s::text IS NULL OR user_id = %(user_id)s)
+    GROUP BY 1
+    UNION ALL
+    SELECT date_trunc(%(bucket)s, end_time), SUM(ms_played), COUNT(*)
+    FROM PRS.SPOTIFY_EVENTS
+    WHERE (
+        (end_time >= %(start)s AND end_time < %(rollup_start)s)
+        OR (end_time >= %(rollup_end)s AND end_time < %(end)s)
+    )
+      AND (%(user_id)s::text IS NULL OR user_id = %(user_id)s)
+    GROUP BY 1
+)
+SELECT
+    buckets.bucket,
+    COALESCE(SUM(plays.ms_played), 0) AS ms_played,
+    COALESCE(SUM(plays.plays), 0) AS plays
+FROM generate_series(
+    date_trunc(%(bucket)s, %(start)s::timestamp),
+    %(end)s::timestamp - INTERVAL '1 microsecond',
+    ('1 ' || %(bucket)s)::interval
+) AS buckets (bucket)
+LEFT JOIN plays USING (bucket)
+GROUP BY buckets.bucket
+ORDER BY buckets.bucket;
+"""
+
+
+def utc_naive(value):
+    # end_time holds UTC wall-clock times without a zone; start and end must be
+    # converted with this before they are passed in.
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _ceil_hour(value):
+    floor = value.replace(minute=0, second=0, microsecond=0)
+    return floor if floor == value else floor + timedelta(hours=1)
+
+
+def timeseries_points(start, end, bucket):
+    # Upper bound on the number of buckets in [start, end).
+    return (end - start) // TIMESERIES_BUCKETS[bucket] + 2
+
+
+def _timeseries_params(start, end, bucket, user_id):
+    if bucket == "minute":
+        rollup_start = rollup_end = end
+    else:
+        rollup_start = min(_ceil_hour(start), end)
+        rollup_end = max(end.replace(minute=0, second=0, microsecond=0), rollup_start)
+    return {
+        "bucket": bucket,
+        "start": start,
+        "end": end,
+        "rollup_start": rollup_start,
+        "rollup_end": rollup_end,
+        "user_id": user_id,
+    }
+
+
+def _points_from_rows(rows):
+    return [
+        {
+            "start": row["bucket"].isoformat(),
+            "total_minutes_played": round(int(row["ms_played"]) / 60000, 2),
+            "plays": int(row["plays"]),
+        }
+        for row in rows
+    ]
+
+
+async def get_listening_timeseries_async(start, end, bucket=DEFAULT_TIMESERIES_BUCKET, user_id=None):
+    rows = await execute_query_async(
+        LISTENING_TIMESERIES_SQL,
+        _timeseries_params(start, end, bucket, user_id),
+        fetch=True,
+        name="get_listening_timeseries",
+    )
+    return _points_from_rows(rows)
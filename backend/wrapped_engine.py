@@ -0,0 +1,300 @@
+import argparse
+import json
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from loader import DATA_DIR, _iter_file_records, list_export_files
+from snapshot import encode_events, open_snapshot
+from wrapped_summary import SUMMARY_YEAR
+
+MS_PER_HOUR = 3600000
+MS_PER_MINUTE = 60000
+SKIP_THRESHOLD_MS = 5000
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+# Group keys spanning at most this many values (or the row count) are counted
+# densely with bincount instead of being sorted.
+DENSE_GROUP_LIMIT = 1 << 20
+PERIODS = ("Morning", "Afternoon", "Evening", "Night")
+# Period index per hour of day, matching the CASE in the summary SQL.
+HOUR_PERIODS = np.array([3] * 5 + [0] * 7 + [1] * 6 + [2] * 5 + [3])
+# TO_CHAR(..., 'Day') / 'Month' names, independent of the process locale.
+DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+MONTH_NAMES = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+)
+
+# Positions of the processed columns in loader record rows.
+_END_TIME, _ARTIST, _TRACK, _MS_PLAYED, _USER, _EPISODE, _SHOW = 0, 1, 2, 3, 7, 11, 12
+# Positions of the URIs RAW.SPOTIFY_EVENTS.event_key falls back through.
+_TRACK_URI, _EPISODE_URI, _CHAPTER_URI = 10, 13, 16
+
+
+def _iter_file_events(file_paths):
+    # Overlapping exports repeat plays; like the loader's unique event_key, only
+    # the first row with a given timestamp, URI, ms_played and user is kept.
+    seen = set()
+    for file_path in file_paths:
+        for row in _iter_file_records(file_path):
+            end_time = row[_END_TIME]
+            ms_played = row[_MS_PLAYED]
+            # Neither can be NULL in RAW.SPOTIFY_EVENTS.
+            if end_time is None or ms_played is None:
+                continue
+            # PostgreSQL ignores the zone suffix when casting to TIMESTAMP; so do we.
+            if end_time.endswith("Z"):
+                end_time = end_time[:-1]
+            uri = row[_TRACK_URI]
+            if uri is None:
+                uri = row[_EPISODE_URI] if row[_EPISODE_URI] is not None else row[_CHAPTER_URI]
+            key = (end_time, uri, ms_played, row[_USER])
+            if key in seen:
+                continue
+            seen.add(key)
+            yield end_time, ms_played, row[_ARTIST], row[_TRACK], row[_EPISODE], row[_SHOW], row[_USER]
+
+
+def read_events(file_paths):
+    events = encode_events(_iter_file_events(file_paths))
+    # Same rows PRS.SPOTIFY_EVENTS keeps (loader.PROCESSED_EVENT_FILTER).
+    return events.select(
+        (events.ms_played > 0) & ((events.codes["track_name"] >= 0) | (events.codes["episode_name"] >= 0))
+    )
+
+
+def _round_ratio(ms, unit):
+    # ROUND(ms / unit, 2) with PostgreSQL's half-away-from-zero rounding; whole
+    # numbers come back from jsonb as ints, so they are returned as ints too.
+    hundredths = (200 * int(ms) + unit) // (2 * unit)
+    if hundredths % 100 == 0:
+        return hundredths // 100
+    return hundredths / 100
+
+
+def _group(keys, ms_played):
+    # Returns the distinct keys (ascending) with their summed ms_played and row counts.
+    offset = keys.min()
+    span = int(keys.max() - offset) + 1
+    if span <= max(len(keys), DENSE_GROUP_LIMIT):
+        slots = keys - offset
+        counts = np.bincount(slots, minlength=span)
+        groups = np.flatnonzero(counts)
+        totals = np.bincount(slots, weights=ms_played, minlength=span)[groups].astype(np.int64)
+        return groups + offset, totals, counts[groups]
+
+    groups, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, weights=ms_played, minlength=len(groups)).astype(np.int64)
+    counts = np.bincount(inverse, minlength=len(groups))
+    return groups, totals, counts
+
+
+def _ranked(values, limit=None, tie_key=None):
+    # Descending; ties are ordered by tie_key(index), or by ascending index
+    # (hour, day), like the secondary ORDER BY of the summary SQL.
+    candidates = np.arange(len(values))
+    if limit is not None and limit < len(values):
+        # Only rows reaching the limit-th largest value can rank; keeping every
+        # row tied with it leaves the order the same as a full sort.
+        threshold = np.partition(values, len(values) - limit)[len(values) - limit]
+        candidates = np.flatnonzero(values >= threshold)
+    if tie_key is None:
+        order = candidates[np.argsort(-values[candidates], kind="stable")]
+    else:
+        order = sorted(candidates, key=lambda index: (-values[index], tie_key(index)))
+    return order if limit is None else order[:limit]
+
+
+def _collated(name):
+    # ORDER BY name COLLATE "C": UTF-8 bytes compare like code points; NULLS LAST.
+    return (name is None, name or "")
+
+
+def _name_order(names, groups):
+    return lambda index: names[groups[index]]
+
+
+def _pair_order(outer_names, inner_names, groups, inner_count):
+    # Groups keyed (outer code + 1) * inner_count + inner code; outer may be NULL.
+    return lambda index: (
+        _collated(_name(outer_names, groups[index] // inner_count - 1)),
+        inner_names[groups[index] % inner_count],
+    )
+
+
+def _jsonb_order(value):
+    # jsonb stores object keys shortest first, then bytewise; mirror that so the
+    # serialized payload matches the one read back from PostgreSQL.
+    if isinstance(value, dict):
+        return {key: _jsonb_order(value[key]) for key in sorted(value, key=lambda key: (len(key.encode()), key.encode()))}
+    if isinstance(value, list):
+        return [_jsonb_order(item) for item in value]
+    return value
+
+
+def _name(values, code):
+    return values[code] if code >= 0 else None
+
+
+def compute_summary_payload(events, year=SUMMARY_YEAR):
+    start, end = (np.datetime64(f"{bound:04d}-01-01", "s").astype(np.int64) for bound in (year, year + 1))
+    selected = events.select((events.end_time >= start) & (events.end_time < end))
+    end_time = selected.end_time
+    ms_played = selected.ms_played.astype(np.int64)
+    codes = selected.codes
+    values = events.values
+    hours = end_time // SECONDS_PER_HOUR % 24
+    days = end_time // SECONDS_PER_DAY
+
+    top_artist = {}
+    has_artist = codes["artist_name"] >= 0
+    if has_artist.any():
+        artists, totals, _counts = _group(codes["artist_name"][has_artist], ms_played[has_artist])
+        best = _ranked(totals, 1, _name_order(values["artist_name"], artists))[0]
+        top_artist = {
+            "artist_name": values["artist_name"][artists[best]],
+            "total_hours_played": _round_ratio(totals[best], MS_PER_HOUR),
+        }
+
+    active_hour = {}
+    hour_totals = np.bincount(hours, weights=ms_played, minlength=24).astype(np.int64)
+    hour_counts = np.bincount(hours, minlength=24)
+    if len(ms_played):
+        # Hours without events sort after every played hour (their total is 0).
+        best = _ranked(np.where(hour_counts > 0, hour_totals, -1), 1)[0]
+        active_hour = {"hour": int(best), "total_minutes_played": _round_ratio(hour_totals[best], MS_PER_MINUTE)}
+
+    top_tracks = []
+    has_track = codes["track_name"] >= 0
+    track_count = max(len(values["track_name"]), 1)
+    if has_track.any():
+        keys = (codes["artist_name"][has_track].astype(np.int64) + 1) * track_count + codes["track_name"][has_track]
+        groups, totals, _counts = _group(keys, ms_played[has_track])
+        track_order = _pair_order(values["artist_name"], values["track_name"], groups, track_count)
+        for index in _ranked(totals, 5, track_order):
+            top_tracks.append(
+                {
+                    "artist_name": _name(values["artist_name"], groups[index] // track_count - 1),
+                    "track_name": values["track_name"][groups[index] % track_count],
+                    "total_minutes_played": _round_ratio(totals[index], MS_PER_MINUTE),
+                    "total_hours_played": _round_ratio(totals[index], MS_PER_HOUR),
+                }
+            )
+
+    top_podcasts = []
+    has_episode = codes["episode_name"] >= 0
+    episode_count = max(len(values["episode_name"]), 1)
+    if has_episode.any():
+        keys = (codes["episode_show_name"][has_episode].astype(np.int64) + 1) * episode_count + codes["episode_name"][has_episode]
+        groups, totals, _counts = _group(keys, ms_played[has_episode])
+        episode_order = _pair_order(values["episode_show_name"], values["episode_name"], groups, episode_count)
+        for index in _ranked(totals, 5, episode_order):
+            top_podcasts.append(
+                {
+                    "episode_show_name": _name(values["episode_show_name"], groups[index] // episode_count - 1),
+                    "episode_name": values["episode_name"][groups[index] % episode_count],
+                    "total_minutes_played": _round_ratio(totals[index], MS_PER_MINUTE),
+                    "total_hours_played": _round_ratio(totals[index], MS_PER_HOUR),
+                }
+            )
+
+    period_totals = np.bincount(HOUR_PERIODS[np.arange(24)], weights=hour_totals, minlength=4).astype(np.int64)
+    period_counts = np.bincount(HOUR_PERIODS[np.arange(24)], weights=hour_counts, minlength=4)
+    listening_periods = [
+        {"period": PERIODS[index], "total_minutes_played": _round_ratio(period_totals[index], MS_PER_MINUTE)}
+        for index in _ranked(period_totals, tie_key=PERIODS.__getitem__)
+        if period_counts[index] > 0
+    ]
+
+    top_days = []
+    if len(ms_played):
+        day_groups, totals, _counts = _group(days, ms_played)
+        for index in _ranked(totals, 5):
+            day = np.datetime64(int(day_groups[index]), "D").item()
+            top_days.append(
+                {
+                    "day": day.isoformat(),
+                    "day_of_week": DAY_NAMES[day.weekday()],
+                    "month": MONTH_NAMES[day.month - 1],
+                    "total_minutes_played": _round_ratio(totals[index], MS_PER_MINUTE),
+                }
+            )
+
+    most_played = {}
+    skips = []
+    if has_track.any():
+        tracks, _totals, plays = _group(codes["track_name"][has_track], ms_played[has_track])
+        best = _ranked(plays, 1, _name_order(values["track_name"], tracks))[0]
+        most_played = {"track_name": values["track_name"][tracks[best]], "play_count": int(plays[best])}
+
+        is_skip = has_track & (ms_played < SKIP_THRESHOLD_MS)
+        if is_skip.any():
+            skipped, _totals, skip_counts = _group(codes["track_name"][is_skip], ms_played[is_skip])
+            skips = [
+                {"track_name": values["track_name"][skipped[index]], "skips": int(skip_counts[index])}
+                for index in _ranked(skip_counts, 10, _name_order(values["track_name"], skipped))
+            ]
+
+    return _jsonb_order(
+        {
+            "total_time": {"hours": _round_ratio(ms_played.sum(), MS_PER_HOUR)},
+            "top_artist": top_artist,
+            "active_hour": active_hour,
+            "top_tracks": top_tracks,
+            "top_podcasts": top_podcasts,
+            "listening_periods": listening_periods,
+            "top_days": top_days,
+            "most_played": most_played,
+            "skips": skips,
+        }
+    )
+
+
+def compute_wrapped_summary(file_paths, year=SUMMARY_YEAR, events=None):
+    # Same shape as wrapped_summary.get_wrapped_summary, computed without a
+    # database from the export files or from already loaded events (e.g. a snapshot).
+    if events is None:
+        events = read_events(file_paths)
+    payload = compute_summary_payload(events, year)
+    return {"year": year, "generated_at": datetime.now().isoformat(), **payload}
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compute a Wrapped summary from Spotify JSON exports without PostgreSQL.")
+    parser.add_argument("files", nargs="*", help="Export files to read. Defaults to every *.json file and ZIP archive member in the data directory.")
+    parser.add_argument("--year", type=int, default=SUMMARY_YEAR, help="Wrapped year; defaults to 2025.")
+    parser.add_argument(
+        "--snapshot",
+        default=None,
+        help="Read processed events from a snapshot written by `loader.py --snapshot` instead of export files.",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Compare with the summary stored in PostgreSQL and list the sections that differ.",
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    if args.snapshot:
+        summary = compute_wrapped_summary(None, args.year, events=open_snapshot(args.snapshot))
+    else:
+        file_paths = args.files or list_export_files(DATA_DIR)
+        summary = compute_wrapped_summary(file_paths, args.year)
+
+    if not args.compare:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        sys.exit(0)
+
+    from wrapped_summary import get_wrapped_summary
+
+    stored = get_wrapped_summary(args.year) or {}
+    differences = [key for key in summary if key != "generated_at" and summary[key] != stored.get(key)]
+    for key in differences:
+        print(f"{key} differs:\n  engine: {summary[key]}\n  stored: {stored.get(key)}")
+    print(f"{len(differences)} of {len(summary) - 1} sections differ.")
+    sys.exit(1 if differences else 0)
@@ -1,138 +1,243 @@
 import json
 from datetime import datetime
 
-from database import execute_query
+from database import execute_query, execute_query_async, execute_single_flight, execute_single_flight_async
 
 SUMMARY_YEAR = 2025
+# Top-level keys of a summary payload, in response order.
+SUMMARY_SECTIONS = (
+    "total_time",
+    "top_artist",
+    "active_hour",
+    "top_tracks",
+    "top_podcasts",
+    "listening_periods",
+    "top_days",
+    "most_played",
+    "skips",
+)
+# Advisory lock classes for single-flight refreshes; the year is the second
+# key. PRS.refresh_spotify_wrapped_summary() takes SUMMARY_REFRESH_LOCK_ID too.
+SUMMARY_REFRESH_LOCK_ID = 727001
+USER_SUMMARY_REFRESH_LOCK_ID = 727002
 
-REFRESH_WRAPPED_SUMMARY_SQL = """
-WITH base AS (
-    SELECT *
-    FROM PRS.SPOTIFY_EVENTS_2025
-    WHERE EXTRACT(YEAR FROM end_time) = %s
+# Every section is derived from the rollup tables the loader maintains, so a
+# refresh reads grouped totals instead of scanning PRS.SPOTIFY_EVENTS.
+# The global summary groups every row under a single '' user.
+# Ties rank by name (bytewise, COLLATE "C"), hour or day, the same secondary
+# order wrapped_engine uses, so both produce identical lists.
+_SUMMARY_SECTIONS_SQL = """
+WITH track_totals AS (
+    SELECT
+        {user_column},
+        NULLIF(artist_name, '') AS artist_name,
+        track_name,
+        SUM(ms_played) AS ms_played,
+        SUM(plays) AS plays,
+        SUM(short_plays) AS short_plays
+    FROM PRS.SPOTIFY_ROLLUP_TRACKS
+    WHERE year = %(year)s{user_filter}
+    GROUP BY 1, 2, 3
 ),
-total_time AS (
-    SELECT COALESCE(ROUND(SUM(ms_played) / 3600000.0, 2), 0)::double precision AS hours
-    FROM base
+artist_totals AS (
+    SELECT {user_column}, artist_name, SUM(ms_played) AS ms_played
+    FROM PRS.SPOTIFY_ROLLUP_ARTISTS
+    WHERE year = %(year)s{user_filter}
+    GROUP BY 1, 2
 ),
-top_artist AS (
+episode_totals AS (
     SELECT
-        artist_name,
-        ROUND(SUM(ms_played) / 3600000.0, 2)::double precision AS total_hours_played
-    FROM base
-    WHERE artist_name IS NOT NULL
-    GROUP BY artist_name
-    ORDER BY total_hours_played DESC
-    LIMIT 1
+        {user_column},
+        NULLIF(episode_show_name, '') AS episode_show_name,
+        episode_name,
+        SUM(ms_played) AS ms_played
+    FROM PRS.SPOTIFY_ROLLUP_EPISODES
+    WHERE year = %(year)s{user_filter}
+    GROUP BY 1, 2, 3
+),
+hour_totals AS (
+    SELECT {user_column}, day, hour::int AS hour, SUM(ms_played) AS ms_played
+    FROM PRS.SPOTIFY_ROLLUP_HOURLY
+    WHERE day >= %(start)s
+      AND day < %(end)s{user_filter}
+    GROUP BY 1, 2, 3
+),
+users AS (
+    SELECT user_id, SUM(ms_played) AS ms_played
+    FROM hour_totals
+    GROUP BY user_id
+),
+top_artist AS (
+    SELECT DISTINCT ON (user_id)
+        user_id,
+        jsonb_build_object(
+            'artist_name', artist_name,
+            'total_hours_played', ROUND(ms_played / 3600000.0, 2)::double precision
+        ) AS item
+    FROM artist_totals
+    ORDER BY user_id, ms_played DESC, artist_name COLLATE "C"
 ),
 active_hour AS (
-    SELECT
-        EXTRACT(HOUR FROM end_time)::int AS hour,
-        ROUND(SUM(ms_played) / 60000.0, 2)::double precision AS total_minutes_played
-    FROM base
-    GROUP BY EXTRACT(HOUR FROM end_time)
-    ORDER BY total_minutes_played DESC
-    LIMIT 1
+    SELECT DISTINCT ON (user_id)
+        user_id,
+        jsonb_build_object(
+            'hour', hour,
+            'total_minutes_played', ROUND(ms_played / 60000.0, 2)::double precision
+        ) AS item
+    FROM (
+        SELECT user_id, hour, SUM(ms_played) AS ms_played
+        FROM hour_totals
+        GROUP BY user_id, hour
+    ) h
+    ORDER BY user_id, ms_played DESC, hour
 ),
 top_tracks AS (
-    SELECT COALESCE(jsonb_agg(to_jsonb(t) ORDER BY t.total_minutes_played DESC), '[]'::jsonb) AS items
+    SELECT
+        user_id,
+        jsonb_agg(
+            jsonb_build_object(
+                'artist_name', artist_name,
+                'track_name', track_name,
+                'total_minutes_played', ROUND(ms_played / 60000.0, 2)::double precision,
+                'total_hours_played', ROUND(ms_played / 3600000.0, 2)::double precision
+            )
+            ORDER BY ms_played DESC, artist_name COLLATE "C", track_name COLLATE "C"
+        ) AS items
     FROM (
-        SELECT
-            artist_name,
-            track_name,
-            ROUND(SUM(ms_played) / 60000.0, 2)::double precision AS total_minutes_played,
-            ROUND(SUM(ms_played) / 3600000.0, 2)::double precision AS total_hours_played
-        FROM base
-        WHERE track_name IS NOT NULL
-        GROUP BY artist_name, track_name
-        ORDER BY total_minutes_played DESC
-        LIMIT 5
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY user_id ORDER BY ms_played DESC, artist_name COLLATE "C", track_name COLLATE "C"
+        ) AS rank
+        FROM track_totals
     ) t
+    WHERE rank <= 5
+    GROUP BY user_id
 ),
 top_podcasts AS (
-    SELECT COALESCE(jsonb_agg(to_jsonb(p) ORDER BY p.total_minutes_played DESC), '[]'::jsonb) AS items
+    SELECT
+        user_id,
+        jsonb_agg(
+            jsonb_build_object(
+                'episode_show_name', episode_show_name,
+                'episode_name', episode_name,
+                'total_minutes_played', ROUND(ms_played / 60000.0, 2)::double precision,
+                'total_hours_played', ROUND(ms_played / 3600000.0, 2)::double precision
+            )
+            ORDER BY ms_played DESC, episode_show_name COLLATE "C", episode_name COLLATE "C"
+        ) AS items
     FROM (
-        SELECT
-            episode_show_name,
-            episode_name,
-            ROUND(SUM(ms_played) / 60000.0, 2)::double precision AS total_minutes_played,
-            ROUND(SUM(ms_played) / 3600000.0, 2)::double precision AS total_hours_played
-        FROM base
-        WHERE episode_name IS NOT NULL
-        GROUP BY episode_show_name, episode_name
-        ORDER BY total_minutes_played DESC
-        LIMIT 5
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY user_id ORDER BY ms_played DESC, episode_show_name COLLATE "C", episode_name COLLATE "C"
+        ) AS rank
+        FROM episode_totals
     ) p
+    WHERE rank <= 5
+    GROUP BY user_id
 ),
 listening_periods AS (
-    SELECT COALESCE(jsonb_agg(to_jsonb(lp) ORDER BY lp.total_minutes_played DESC), '[]'::jsonb) AS items
+    SELECT
+        user_id,
+        jsonb_agg(
+            jsonb_build_object(
+                'period', period,
+                'total_minutes_played', ROUND(ms_played / 60000.0, 2)::double precision
+            )
+            ORDER BY ms_played DESC, period COLLATE "C"
+        ) AS items
     FROM (
         SELECT
+            user_id,
             CASE
-                WHEN EXTRACT(HOUR FROM end_time) BETWEEN 5 AND 11 THEN 'Morning'
-                WHEN EXTRACT(HOUR FROM end_time) BETWEEN 12 AND 17 THEN 'Afternoon'
-                WHEN EXTRACT(HOUR FROM end_time) BETWEEN 18 AND 22 THEN 'Evening'
+                WHEN hour BETWEEN 5 AND 11 THEN 'Morning'
+                WHEN hour BETWEEN 12 AND 17 THEN 'Afternoon'
+                WHEN hour BETWEEN 18 AND 22 THEN 'Evening'
                 ELSE 'Night'
             END AS period,
-            ROUND(SUM(ms_played) / 60000.0, 2)::double precision AS total_minutes_played
-        FROM base
-        GROUP BY 1
-        ORDER BY 2 DESC
+            SUM(ms_played) AS ms_played
+        FROM hour_totals
+        GROUP BY 1, 2
     ) lp
+    GROUP BY user_id
 ),
 top_days AS (
-    SELECT COALESCE(jsonb_agg(to_jsonb(d) ORDER BY d.total_minutes_played DESC), '[]'::jsonb) AS items
+    SELECT
+        user_id,
+        jsonb_agg(
+            jsonb_build_object(
+                'day', TO_CHAR(day, 'YYYY-MM-DD'),
+                'day_of_week', TRIM(TO_CHAR(day, 'Day')),
+                'month', TRIM(TO_CHAR(day, 'Month')),
+                'total_minutes_played', ROUND(ms_played / 60000.0, 2)::double precision
+            )
+            ORDER BY ms_played DESC, day
+        ) AS items
     FROM (
         SELECT
-            TO_CHAR(DATE(end_time), 'YYYY-MM-DD') AS day,
-            TRIM(TO_CHAR(end_time, 'Day')) AS day_of_week,
-            TRIM(TO_CHAR(end_time, 'Month')) AS month,
-            ROUND(SUM(ms_played) / 60000.0, 2)::double precision AS total_minutes_played
-        FROM base
-        GROUP BY DATE(end_time), TRIM(TO_CHAR(end_time, 'Day')), TRIM(TO_CHAR(end_time, 'Month'))
-        ORDER BY total_minutes_played DESC
-        LIMIT 5
+            user_id,
+            day,
+            SUM(ms_played) AS ms_played,
+            ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY SUM(ms_played) DESC, day) AS rank
+        FROM hour_totals
+        GROUP BY user_id, day
     ) d
+    WHERE rank <= 5
+    GROUP BY user_id
+),
+track_name_totals AS (
+    SELECT user_id, track_name, SUM(plays) AS plays, SUM(short_plays) AS short_plays
+    FROM track_totals
+    GROUP BY user_id, track_name
 ),
 most_played AS (
-    SELECT
-        track_name,
-        COUNT(*)::int AS play_count
-    FROM base
-    WHERE track_name IS NOT NULL
-    GROUP BY track_name
-    ORDER BY play_count DESC
-    LIMIT 1
+    SELECT DISTINCT ON (user_id)
+        user_id,
+        jsonb_build_object('track_name', track_name, 'play_count', plays::int) AS item
+    FROM track_name_totals
+    ORDER BY user_id, plays DESC, track_name COLLATE "C"
 ),
 skips AS (
-    SELECT COALESCE(jsonb_agg(to_jsonb(s) ORDER BY s.skips DESC), '[]'::jsonb) AS items
+    SELECT
+        user_id,
+        jsonb_agg(
+            jsonb_build_object('track_name', track_name, 'skips', short_plays::int)
+            ORDER BY short_plays DESC, track_name COLLATE "C"
+        ) AS items
     FROM (
-        SELECT
-            track_name,
-            COUNT(*)::int AS skips
-        FROM base
-        WHERE ms_played < 5000 AND track_name IS NOT NULL
-        GROUP BY track_name
-        ORDER BY skips DESC
-        LIMIT 10
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY user_id ORDER BY short_plays DESC, track_name COLLATE "C"
+        ) AS rank
+        FROM track_name_totals
+        WHERE short_plays > 0
     ) s
-)
-INSERT INTO PRS.SPOTIFY_WRAPPED_2025_SUMMARY (year, generated_at, payload)
-VALUES (
-    %s,
+    WHERE rank <= 10
+    GROUP BY user_id
+)"""
+
+REFRESH_WRAPPED_SUMMARY_SQL = _SUMMARY_SECTIONS_SQL.format(user_column="''::text AS user_id", user_filter="") + """
+INSERT INTO PRS.SPOTIFY_WRAPPED_SUMMARY (year, generated_at, payload)
+SELECT
+    %(year)s,
     NOW(),
     jsonb_build_object(
-        'total_time', jsonb_build_object('hours', (SELECT hours FROM total_time)),
-        'top_artist', COALESCE((SELECT to_jsonb(a) FROM top_artist a), '{}'::jsonb),
-        'active_hour', COALESCE((SELECT to_jsonb(h) FROM active_hour h), '{}'::jsonb),
-        'top_tracks', (SELECT items FROM top_tracks),
-        'top_podcasts', (SELECT items FROM top_podcasts),
-        'listening_periods', (SELECT items FROM listening_periods),
-        'top_days', (SELECT items FROM top_days),
-        'most_played', COALESCE((SELECT to_jsonb(m) FROM most_played m), '{}'::jsonb),
-        'skips', (SELECT items FROM skips)
+        'total_time', jsonb_build_object('hours', COALESCE(ROUND(u.ms_played / 3600000.0, 2), 0)::double precision),
+        'top_artist', COALESCE(ta.item, '{}'::jsonb),
+        'active_hour', COALESCE(ah.item, '{}'::jsonb),
+        'top_tracks', COALESCE(tt.items, '[]'::jsonb),
+        'top_podcasts', COALESCE(tp.items, '[]'::jsonb),
+        'listening_periods', COALESCE(lp.items, '[]'::jsonb),
+        'top_days', COALESCE(td.items, '[]'::jsonb),
+        'most_played', COALESCE(mp.item, '{}'::jsonb),
+        'skips', COALESCE(sk.items, '[]'::jsonb)
     )
-)
+FROM (SELECT ''::text AS user_id) g
+LEFT JOIN users u USING (user_id)
+LEFT JOIN top_artist ta USING (user_id)
+LEFT JOIN active_hour ah USING (user_id)
+LEFT JOIN top_tracks tt USING (user_id)
+LEFT JOIN top_podcasts tp USING (user_id)
+LEFT JOIN listening_periods lp USING (user_id)
+LEFT JOIN top_days td USING (user_id)
+LEFT JOIN most_played mp USING (user_id)
+LEFT JOIN skips sk USING (user_id)
 ON CONFLICT (year)
 DO UPDATE
 SET generated_at = EXCLUDED.generated_at,
@@ -140,13 +245,110 @@ SET generated_at = EXCLUDED.generated_at,
 RETURNING year, generated_at, payload;
 """
 
+# Rows keyed by '' hold events without a user and only count towards the global summary.
+REFRESH_USER_WRAPPED_SUMMARIES_SQL = _SUMMARY_SECTIONS_SQL.format(
+    user_column="user_id", user_filter="\n      AND user_id <> ''"
+) + """,
+stale AS (
+    DELETE FROM PRS.SPOTIFY_WRAPPED_USER_SUMMARY s
+    WHERE s.year = %(year)s
+      AND NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = s.user_id)
+)
+INSERT INTO PRS.SPOTIFY_WRAPPED_USER_SUMMARY (user_id, year, generated_at, payload)
+SELECT
+    u.user_id,
+    %(year)s,
+    NOW(),
+    jsonb_build_object(
+        'total_time', jsonb_build_object('hours', ROUND(u.ms_played / 3600000.0, 2)::double precision),
+        'top_artist', COALESCE(ta.item, '{}'::jsonb),
+        'active_hour', COALESCE(ah.item, '{}'::jsonb),
+        'top_tracks', COALESCE(tt.items, '[]'::jsonb),
+        'top_podcasts', COALESCE(tp.items, '[]'::jsonb),
+        'listening_periods', COALESCE(lp.items, '[]'::jsonb),
+        'top_days', COALESCE(td.items, '[]'::jsonb),
+        'most_played', COALESCE(mp.item, '{}'::jsonb),
+        'skips', COALESCE(sk.items, '[]'::jsonb)
+    )
+FROM users u
+LEFT JOIN top_artist ta USING (user_id)
+LEFT JOIN active_hour ah USING (user_id)
+LEFT JOIN top_tracks tt USING (user_id)
+LEFT JOIN top_podcasts tp USING (user_id)
+LEFT JOIN listening_periods lp USING (user_id)
+LEFT JOIN top_days td USING (user_id)
+LEFT JOIN most_played mp USING (user_id)
+LEFT JOIN skips sk USING (user_id)
+ON CONFLICT (user_id, year)
+DO UPDATE
+SET generated_at = EXCLUDED.generated_at,
+    payload = EXCLUDED.payload
+RETURNING user_id;
+"""
+
 GET_WRAPPED_SUMMARY_SQL = """
 SELECT year, generated_at, payload
-FROM PRS.SPOTIFY_WRAPPED_2025_SUMMARY
+FROM PRS.SPOTIFY_WRAPPED_SUMMARY
+WHERE year = %s
+LIMIT 1;
+"""
+
+# Only the requested top-level payload keys, so the rest of the document is
+# neither sent nor decoded.
+GET_WRAPPED_SUMMARY_SECTIONS_SQL = """
+SELECT
+    year,
+    generated_at,
+    (
+        SELECT COALESCE(jsonb_object_agg(key, value), '{}'::jsonb)
+        FROM jsonb_each(payload)
+        WHERE key = ANY(%s)
+    ) AS payload
+FROM PRS.SPOTIFY_WRAPPED_SUMMARY
+WHERE year = %s
+LIMIT 1;
+"""
+
+GET_WRAPPED_SUMMARY_VERSION_SQL = """
+SELECT generated_at
+FROM PRS.SPOTIFY_WRAPPED_SUMMARY
 WHERE year = %s
 LIMIT 1;
 """
 
+GET_USER_WRAPPED_SUMMARY_SQL = """
+SELECT user_id, year, generated_at, payload
+FROM PRS.SPOTIFY_WRAPPED_USER_SUMMARY
+WHERE user_id = %s AND year = %s
+LIMIT 1;
+"""
+
+GET_USER_WRAPPED_SUMMARY_VERSION_SQL = """
+SELECT generated_at
+FROM PRS.SPOTIFY_WRAPPED_USER_SUMMARY
+WHERE user_id = %s AND year = %s
+LIMIT 1;
+"""
+
+GET_LIVE_STATS_SQL = """
+SELECT year, updated_at, event_count, loading, payload
+FROM PRS.SPOTIFY_LIVE_STATS
+WHERE year = %s
+LIMIT 1;
+"""
+
+GET_USER_WRAPPED_SUMMARIES_VERSION_SQL = """
+SELECT MAX(generated_at) AS generated_at, COUNT(*) AS users
+FROM PRS.SPOTIFY_WRAPPED_USER_SUMMARY
+WHERE year = %s;
+"""
+
+GET_USER_WRAPPED_SUMMARY_IDS_SQL = """
+SELECT user_id
+FROM PRS.SPOTIFY_WRAPPED_USER_SUMMARY
+WHERE year = %s;
+"""
+
 
 def _normalize_payload(payload):
     if payload is None:
@@ -164,8 +366,18 @@ def _to_iso(ts):
     return str(ts)
 
 
-def refresh_wrapped_summary(year=SUMMARY_YEAR):
-    row = execute_query(REFRESH_WRAPPED_SUMMARY_SQL, (year, year), fetch="one")
+def year_bounds(year):
+    # Half-open [start, end) range on end_time; unlike EXTRACT(YEAR ...) it can
+    # use the end_time index and prune PRS.SPOTIFY_EVENTS partitions.
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+
+def _year_params(year):
+    start, end = year_bounds(year)
+    return {"year": year, "start": start, "end": end}
+
+
+def _summary_from_row(row):
     if not row:
         return None
 
@@ -177,14 +389,132 @@ def refresh_wrapped_summary(year=SUMMARY_YEAR):
     }
 
 
-def get_wrapped_summary(year=SUMMARY_YEAR):
-    row = execute_query(GET_WRAPPED_SUMMARY_SQL, (year,), fetch="one")
+def _user_summary_from_row(row):
     if not row:
         return None
 
     payload = _normalize_payload(row.get("payload"))
     return {
+        "user_id": row["user_id"],
         "year": int(row["year"]),
         "generated_at": _to_iso(row.get("generated_at")),
         **payload,
     }
+
+
+def _live_stats_from_row(row):
+    if not row:
+        return None
+
+    return {
+        "year": int(row["year"]),
+        "updated_at": _to_iso(row.get("updated_at")),
+        "event_count": int(row["event_count"]),
+        "loading": row["loading"],
+        **_normalize_payload(row.get("payload")),
+    }
+
+
+def _version_from_row(row):
+    if not row:
+        return None
+    return _to_iso(row.get("generated_at"))
+
+
+def _summary_refresh_flight(year, reuse_in_flight):
+    # Callers that wait on a refresh already running elsewhere return its
+    # summary. Pass reuse_in_flight=False after writing new events: a refresh
+    # that started before they were committed would not include them.
+    return {
+        "lock_key": (SUMMARY_REFRESH_LOCK_ID, year),
+        "query": REFRESH_WRAPPED_SUMMARY_SQL,
+        "params": _year_params(year),
+        "version_query": GET_WRAPPED_SUMMARY_VERSION_SQL,
+        "reuse_query": GET_WRAPPED_SUMMARY_SQL,
+        "key_params": (year,),
+        "fetch": "one",
+        "name": "refresh_wrapped_summary",
+        "reuse": reuse_in_flight,
+    }
+
+
+def _user_summary_refresh_flight(year, reuse_in_flight):
+    return {
+        "lock_key": (USER_SUMMARY_REFRESH_LOCK_ID, year),
+        "query": REFRESH_USER_WRAPPED_SUMMARIES_SQL,
+        "params": _year_params(year),
+        "version_query": GET_USER_WRAPPED_SUMMARIES_VERSION_SQL,
+        "reuse_query": GET_USER_WRAPPED_SUMMARY_IDS_SQL,
+        "key_params": (year,),
+        "fetch": True,
+        "name": "refresh_user_wrapped_summaries",
+        "reuse": reuse_in_flight,
+    }
+
+
+def refresh_wrapped_summary(year=SUMMARY_YEAR, reuse_in_flight=True):
+    row = execute_single_flight(**_summary_refresh_flight(year, reuse_in_flight))
+    return _summary_from_row(row)
+
+
+def get_wrapped_summary(year=SUMMARY_YEAR):
+    row = execute_query(GET_WRAPPED_SUMMARY_SQL, (year,), fetch="one", name="get_wrapped_summary")
+    return _summary_from_row(row)
+
+
+def get_wrapped_summary_sections(year, sections):
+    row = execute_query(GET_WRAPPED_SUMMARY_SECTIONS_SQL, (list(sections), year), fetch="one", name="get_wrapped_summary_sections")
+    return _summary_from_row(row)
+
+
+def refresh_user_wrapped_summaries(year=SUMMARY_YEAR, reuse_in_flight=True):
+    rows = execute_single_flight(**_user_summary_refresh_flight(year, reuse_in_flight))
+    return len(rows or [])
+
+
+def get_user_wrapped_summary(user_id, year=SUMMARY_YEAR):
+    row = execute_query(GET_USER_WRAPPED_SUMMARY_SQL, (user_id, year), fetch="one", name="get_user_wrapped_summary")
+    return _user_summary_from_row(row)
+
+
+# Coroutine variants for the API, running on the async connection pool.
+async def refresh_wrapped_summary_async(year=SUMMARY_YEAR, reuse_in_flight=True):
+    row = await execute_single_flight_async(**_summary_refresh_flight(year, reuse_in_flight))
+    return _summary_from_row(row)
+
+
+async def get_wrapped_summary_async(year=SUMMARY_YEAR):
+    row = await execute_query_async(GET_WRAPPED_SUMMARY_SQL, (year,), fetch="one", name="get_wrapped_summary")
+    return _summary_from_row(row)
+
+
+async def get_wrapped_summary_sections_async(year, sections):
+    row = await execute_query_async(
+        GET_WRAPPED_SUMMARY_SECTIONS_SQL, (list(sections), year), fetch="one", name="get_wrapped_summary_sections"
+    )
+    return _summary_from_row(row)
+
+
+async def get_wrapped_summary_version_async(year=SUMMARY_YEAR):
+    row = await execute_query_async(GET_WRAPPED_SUMMARY_VERSION_SQL, (year,), fetch="one", name="get_wrapped_summary_version")
+    return _version_from_row(row)
+
+
+async def get_live_stats_async(year=SUMMARY_YEAR):
+    row = await execute_query_async(GET_LIVE_STATS_SQL, (year,), fetch="one", name="get_live_stats")
+    return _live_stats_from_row(row)
+
+
+async def refresh_user_wrapped_summaries_async(year=SUMMARY_YEAR, reuse_in_flight=True):
+    rows = await execute_single_flight_async(**_user_summary_refresh_flight(year, reuse_in_flight))
+    return len(rows or [])
+
+
+async def get_user_wrapped_summary_async(user_id, year=SUMMARY_YEAR):
+    row = await execute_query_async(GET_USER_WRAPPED_SUMMARY_SQL, (user_id, year), fetch="one", name="get_user_wrapped_summary")
+    return _user_summary_from_row(row)
+
+
+async def get_user_wrapped_summary_version_async(user_id, year=SUMMARY_YEAR):
+    row = await execute_query_async(GET_USER_WRAPPED_SUMMARY_VERSION_SQL, (user_id, year), fetch="one", name="get_user_wrapped_summary_version")
+    return _version_from_row(row)
@@ -2,10 +2,37 @@
 CREATE SCHEMA IF NOT EXISTS RAW;
 CREATE SCHEMA IF NOT EXISTS PRS;
 
+-- Shadow tables left by an interrupted full reload (see backend/shadow_tables.py)
+-- share the live tables' sequences, so they go first.
+DROP TABLE IF EXISTS RAW.SPOTIFY_EVENTS_SHADOW;
+DROP TABLE IF EXISTS RAW.SPOTIFY_EVENT_FILES_SHADOW;
+DROP TABLE IF EXISTS RAW.SPOTIFY_LOAD_MANIFEST_SHADOW;
+DROP TABLE IF EXISTS PRS.SPOTIFY_EVENTS_SHADOW;
+DROP TABLE IF EXISTS PRS.SPOTIFY_ROLLUP_HOURLY_SHADOW;
+DROP TABLE IF EXISTS PRS.SPOTIFY_ROLLUP_TRACKS_SHADOW;
+DROP TABLE IF EXISTS PRS.SPOTIFY_ROLLUP_ARTISTS_SHADOW;
+DROP TABLE IF EXISTS PRS.SPOTIFY_ROLLUP_EPISODES_SHADOW;
+
 -- =========================
 -- RAW DATA TABLE
 -- =========================
 DROP TABLE IF EXISTS RAW.SPOTIFY_EVENTS;
+
+-- Natural key of a play: the same stream appears in every overlapping export,
+-- so rows are deduplicated on it at ingest (16-byte md5 digest).
+CREATE OR REPLACE FUNCTION RAW.spotify_event_key(end_time TIMESTAMP, uri TEXT, ms_played INTEGER, user_id TEXT)
+RETURNS UUID
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT md5(
+        EXTRACT(EPOCH FROM end_time)::text
+        || '|' || COALESCE(uri, '')
+        || '|' || ms_played::text
+        || '|' || COALESCE(user_id, '')
+    )::uuid
+$$;
+
 CREATE TABLE RAW.SPOTIFY_EVENTS (
     id SERIAL PRIMARY KEY,
     end_time TIMESTAMP NOT NULL,
@@ -32,184 +59,486 @@ CREATE TABLE RAW.SPOTIFY_EVENTS (
     skipped BOOLEAN,
     offline BOOLEAN,
     offline_timestamp TEXT,
-    incognito_mode BOOLEAN
+    incognito_mode BOOLEAN,
+    file_id INTEGER,
+    event_key UUID GENERATED ALWAYS AS (
+        RAW.spotify_event_key(
+            end_time, COALESCE(spotify_track_uri, spotify_episode_uri, audiobook_chapter_uri), ms_played, user_id
+        )
+    ) STORED
+);
+
+CREATE INDEX IF NOT EXISTS idx_raw_events_file_id
+    ON RAW.SPOTIFY_EVENTS (file_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_raw_events_event_key
+    ON RAW.SPOTIFY_EVENTS (event_key);
+
+-- A play's row belongs to the file that loaded it first (file_id above); the
+-- other files it was read from are listed here. When the owning file is
+-- replaced or fails, the row is handed to one of them instead of being lost.
+DROP TABLE IF EXISTS RAW.SPOTIFY_EVENT_FILES;
+CREATE TABLE RAW.SPOTIFY_EVENT_FILES (
+    event_key UUID NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (event_key, file_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_raw_event_files_file_id
+    ON RAW.SPOTIFY_EVENT_FILES (file_id);
+
+-- =========================
+-- LOAD MANIFEST
+-- =========================
+-- One row per ingested export file. status moves loading -> loaded -> processed
+-- (or failed); row_count (records read, duplicates included) is committed
+-- together with each batch so interrupted loads resume where they stopped.
+-- duplicate_count is how many of them were already loaded. years lists the PRS partitions the file's
+-- processed rows landed in, so replacing a file refreshes those years too.
+DROP TABLE IF EXISTS RAW.SPOTIFY_LOAD_MANIFEST;
+CREATE TABLE RAW.SPOTIFY_LOAD_MANIFEST (
+    file_id SERIAL PRIMARY KEY,
+    file_path TEXT NOT NULL UNIQUE,
+    file_size BIGINT NOT NULL,
+    content_hash TEXT NOT NULL,
+    row_count BIGINT NOT NULL DEFAULT 0,
+    duplicate_count BIGINT NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'loading',
+    years SMALLINT[],
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
 -- =========================
--- PROCESSED 2025 DATA TABLE
+-- PROCESSED DATA TABLE (PARTITIONED BY YEAR)
 -- =========================
+-- One range partition per calendar year (PRS.SPOTIFY_EVENTS_<year>), so
+-- filters on end_time ranges only touch the partitions of the years involved.
 DROP TABLE IF EXISTS PRS.SPOTIFY_EVENTS_2025;
-CREATE TABLE PRS.SPOTIFY_EVENTS_2025 (
-    id SERIAL PRIMARY KEY,
+DROP TABLE IF EXISTS PRS.SPOTIFY_EVENTS;
+CREATE TABLE PRS.SPOTIFY_EVENTS (
+    id SERIAL,
     end_time TIMESTAMP NOT NULL,
     artist_name TEXT,
     track_name TEXT,
     ms_played INTEGER,
     episode_name TEXT,
-    episode_show_name TEXT
-);
+    episode_show_name TEXT,
+    user_id TEXT,
+    file_id INTEGER,
+    PRIMARY KEY (id, end_time)
+) PARTITION BY RANGE (end_time);
+
+-- suffix targets the shadow table of a full reload, whose partitions are
+-- unlogged until the load finishes.
+DROP FUNCTION IF EXISTS PRS.ensure_spotify_events_partition(INTEGER);
+CREATE OR REPLACE FUNCTION PRS.ensure_spotify_events_partition(
+    target_year INTEGER,
+    suffix TEXT DEFAULT '',
+    unlogged BOOLEAN DEFAULT FALSE
+)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    EXECUTE format(
+        'CREATE %sTABLE IF NOT EXISTS PRS.SPOTIFY_EVENTS%s_%s PARTITION OF PRS.SPOTIFY_EVENTS%s FOR VALUES FROM (%L) TO (%L)',
+        CASE WHEN unlogged THEN 'UNLOGGED ' ELSE '' END,
+        suffix,
+        target_year,
+        suffix,
+        make_timestamp(target_year, 1, 1, 0, 0, 0),
+        make_timestamp(target_year + 1, 1, 1, 0, 0, 0)
+    );
+END;
+$$;
+
+SELECT PRS.ensure_spotify_events_partition(2025);
 
-CREATE INDEX IF NOT EXISTS idx_prs_events_2025_end_time
-    ON PRS.SPOTIFY_EVENTS_2025 (end_time);
+CREATE INDEX IF NOT EXISTS idx_prs_events_user_id
+    ON PRS.SPOTIFY_EVENTS (user_id)
+    WHERE user_id IS NOT NULL;
 
-CREATE INDEX IF NOT EXISTS idx_prs_events_2025_artist_name
-    ON PRS.SPOTIFY_EVENTS_2025 (artist_name)
+CREATE INDEX IF NOT EXISTS idx_prs_events_file_id
+    ON PRS.SPOTIFY_EVENTS (file_id);
+
+-- Year and range filters on end_time (rebuilds, timeseries edges and minute
+-- buckets) use the btree whatever the physical row order. Each processing
+-- batch inserts in end_time order, so the BRIN index, a few pages per
+-- partition, also lets wide ranges over freshly loaded data be bitmap-scanned.
+CREATE INDEX IF NOT EXISTS idx_prs_events_end_time
+    ON PRS.SPOTIFY_EVENTS (end_time);
+
+CREATE INDEX IF NOT EXISTS idx_prs_events_end_time_brin
+    ON PRS.SPOTIFY_EVENTS USING BRIN (end_time) WITH (pages_per_range = 32);
+
+CREATE INDEX IF NOT EXISTS idx_prs_events_artist_name
+    ON PRS.SPOTIFY_EVENTS (artist_name)
     WHERE artist_name IS NOT NULL;
 
-CREATE INDEX IF NOT EXISTS idx_prs_events_2025_track_name
-    ON PRS.SPOTIFY_EVENTS_2025 (track_name)
+CREATE INDEX IF NOT EXISTS idx_prs_events_track_name
+    ON PRS.SPOTIFY_EVENTS (track_name)
     WHERE track_name IS NOT NULL;
 
-CREATE INDEX IF NOT EXISTS idx_prs_events_2025_episode_name
-    ON PRS.SPOTIFY_EVENTS_2025 (episode_name)
+CREATE INDEX IF NOT EXISTS idx_prs_events_episode_name
+    ON PRS.SPOTIFY_EVENTS (episode_name)
     WHERE episode_name IS NOT NULL;
 
-CREATE INDEX IF NOT EXISTS idx_prs_events_2025_ms_played_skips
-    ON PRS.SPOTIFY_EVENTS_2025 (ms_played)
+CREATE INDEX IF NOT EXISTS idx_prs_events_ms_played_skips
+    ON PRS.SPOTIFY_EVENTS (ms_played)
     WHERE ms_played < 5000;
 
+-- =========================
+-- ROLLUPS
+-- =========================
+-- Aggregates of PRS.SPOTIFY_EVENTS kept up to date by the loader: rows are
+-- added when files are processed and subtracted when a file is replaced or
+-- fails. The summaries are built from these instead of scanning the events.
+-- NULL user, artist and show names are stored as '' so they can be keyed.
+DROP TABLE IF EXISTS PRS.SPOTIFY_ROLLUP_HOURLY;
+CREATE TABLE PRS.SPOTIFY_ROLLUP_HOURLY (
+    day DATE NOT NULL,
+    user_id TEXT NOT NULL,
+    hour SMALLINT NOT NULL,
+    ms_played BIGINT NOT NULL,
+    plays BIGINT NOT NULL,
+    PRIMARY KEY (day, user_id, hour)
+);
+
+DROP TABLE IF EXISTS PRS.SPOTIFY_ROLLUP_TRACKS;
+CREATE TABLE PRS.SPOTIFY_ROLLUP_TRACKS (
+    year SMALLINT NOT NULL,
+    user_id TEXT NOT NULL,
+    artist_name TEXT NOT NULL,
+    track_name TEXT NOT NULL,
+    ms_played BIGINT NOT NULL,
+    plays BIGINT NOT NULL,
+    short_plays BIGINT NOT NULL,
+    PRIMARY KEY (year, user_id, artist_name, track_name)
+);
+
+DROP TABLE IF EXISTS PRS.SPOTIFY_ROLLUP_ARTISTS;
+CREATE TABLE PRS.SPOTIFY_ROLLUP_ARTISTS (
+    year SMALLINT NOT NULL,
+    user_id TEXT NOT NULL,
+    artist_name TEXT NOT NULL,
+    ms_played BIGINT NOT NULL,
+    plays BIGINT NOT NULL,
+    PRIMARY KEY (year, user_id, artist_name)
+);
+
+DROP TABLE IF EXISTS PRS.SPOTIFY_ROLLUP_EPISODES;
+CREATE TABLE PRS.SPOTIFY_ROLLUP_EPISODES (
+    year SMALLINT NOT NULL,
+    user_id TEXT NOT NULL,
+    episode_show_name TEXT NOT NULL,
+    episode_name TEXT NOT NULL,
+    ms_played BIGINT NOT NULL,
+    plays BIGINT NOT NULL,
+    PRIMARY KEY (year, user_id, episode_show_name, episode_name)
+);
+
 -- =========================
 -- CACHED WRAPPED SUMMARY
 -- =========================
 DROP TABLE IF EXISTS PRS.SPOTIFY_WRAPPED_2025_SUMMARY;
-CREATE TABLE PRS.SPOTIFY_WRAPPED_2025_SUMMARY (
+DROP TABLE IF EXISTS PRS.SPOTIFY_WRAPPED_SUMMARY;
+CREATE TABLE PRS.SPOTIFY_WRAPPED_SUMMARY (
     year SMALLINT PRIMARY KEY,
     generated_at TIMESTAMP NOT NULL DEFAULT NOW(),
     payload JSONB NOT NULL
 );
 
-CREATE OR REPLACE FUNCTION PRS.refresh_spotify_wrapped_2025_summary(target_year SMALLINT DEFAULT 2025)
+-- =========================
+-- CACHED PER-USER WRAPPED SUMMARIES
+-- =========================
+DROP TABLE IF EXISTS PRS.SPOTIFY_WRAPPED_USER_SUMMARY;
+CREATE TABLE PRS.SPOTIFY_WRAPPED_USER_SUMMARY (
+    user_id TEXT NOT NULL,
+    year SMALLINT NOT NULL,
+    generated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    payload JSONB NOT NULL,
+    PRIMARY KEY (user_id, year)
+);
+
+-- =========================
+-- LIVE LOADER STATISTICS
+-- =========================
+-- Provisional per-year results the loader publishes while it ingests (see
+-- backend/live_stats.py): approximate top-k sections with their error bounds.
+-- loading turns false when the run's ingest finishes; the next run clears them.
+DROP TABLE IF EXISTS PRS.SPOTIFY_LIVE_STATS;
+CREATE TABLE PRS.SPOTIFY_LIVE_STATS (
+    year SMALLINT PRIMARY KEY,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    event_count BIGINT NOT NULL,
+    loading BOOLEAN NOT NULL,
+    payload JSONB NOT NULL
+);
+
+-- =========================
+-- SUMMARY CHANGE NOTIFICATIONS
+-- =========================
+-- Any write to the summary tables (loader, API refresh worker or a manual
+-- PRS.refresh_spotify_wrapped_summary call) is announced on this channel so
+-- API processes reload their in-memory copy. Identical notifications are
+-- folded into one per transaction, so a refresh of many user rows sends one
+-- message per year. TRUNCATE sends a null year: everything changed.
+CREATE OR REPLACE FUNCTION PRS.notify_spotify_wrapped_summary()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    changed_year SMALLINT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_year := OLD.year;
+    ELSIF TG_OP IN ('INSERT', 'UPDATE') THEN
+        changed_year := NEW.year;
+    END IF;
+
+    PERFORM pg_notify(
+        'spotify_wrapped_summary',
+        json_build_object('scope', TG_ARGV[0], 'year', changed_year)::text
+    );
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER spotify_wrapped_summary_notify
+AFTER INSERT OR UPDATE OR DELETE ON PRS.SPOTIFY_WRAPPED_SUMMARY
+FOR EACH ROW EXECUTE FUNCTION PRS.notify_spotify_wrapped_summary('summary');
+
+CREATE TRIGGER spotify_wrapped_summary_notify_truncate
+AFTER TRUNCATE ON PRS.SPOTIFY_WRAPPED_SUMMARY
+FOR EACH STATEMENT EXECUTE FUNCTION PRS.notify_spotify_wrapped_summary('summary');
+
+CREATE TRIGGER spotify_wrapped_user_summary_notify
+AFTER INSERT OR UPDATE OR DELETE ON PRS.SPOTIFY_WRAPPED_USER_SUMMARY
+FOR EACH ROW EXECUTE FUNCTION PRS.notify_spotify_wrapped_summary('user_summary');
+
+CREATE TRIGGER spotify_wrapped_user_summary_notify_truncate
+AFTER TRUNCATE ON PRS.SPOTIFY_WRAPPED_USER_SUMMARY
+FOR EACH STATEMENT EXECUTE FUNCTION PRS.notify_spotify_wrapped_summary('user_summary');
+
+DROP FUNCTION IF EXISTS PRS.refresh_spotify_wrapped_2025_summary(SMALLINT);
+CREATE OR REPLACE FUNCTION PRS.refresh_spotify_wrapped_summary(target_year SMALLINT DEFAULT 2025)
 RETURNS VOID
 LANGUAGE plpgsql
 AS $$
 BEGIN
-    WITH base AS (
-        SELECT *
-        FROM PRS.SPOTIFY_EVENTS_2025
-        WHERE EXTRACT(YEAR FROM end_time) = target_year
+    -- Waits for any refresh of the same year in flight (lock class
+    -- wrapped_summary.SUMMARY_REFRESH_LOCK_ID), so the heavy query never runs twice at once.
+    PERFORM pg_advisory_xact_lock(727001, target_year);
+
+    WITH track_totals AS (
+        SELECT
+            ''::text AS user_id,
+            NULLIF(artist_name, '') AS artist_name,
+            track_name,
+            SUM(ms_played) AS ms_played,
+            SUM(plays) AS plays,
+            SUM(short_plays) AS short_plays
+        FROM PRS.SPOTIFY_ROLLUP_TRACKS
+        WHERE year = target_year
+        GROUP BY 1, 2, 3
     ),
-    total_time AS (
-        SELECT COALESCE(ROUND(SUM(ms_played) / 3600000.0, 2), 0)::double precision AS hours
-        FROM base
+    artist_totals AS (
+        SELECT ''::text AS user_id, artist_name, SUM(ms_played) AS ms_played
+        FROM PRS.SPOTIFY_ROLLUP_ARTISTS
+        WHERE year = target_year
+        GROUP BY 1, 2
     ),
-    top_artist AS (
+    episode_totals AS (
         SELECT
-            artist_name,
-            ROUND(SUM(ms_played) / 3600000.0, 2)::double precision AS total_hours_played
-        FROM base
-        WHERE artist_name IS NOT NULL
-        GROUP BY artist_name
-        ORDER BY total_hours_played DESC
-        LIMIT 1
+            ''::text AS user_id,
+            NULLIF(episode_show_name, '') AS episode_show_name,
+            episode_name,
+            SUM(ms_played) AS ms_played
+        FROM PRS.SPOTIFY_ROLLUP_EPISODES
+        WHERE year = target_year
+        GROUP BY 1, 2, 3
+    ),
+    hour_totals AS (
+        SELECT ''::text AS user_id, day, hour::int AS hour, SUM(ms_played) AS ms_played
+        FROM PRS.SPOTIFY_ROLLUP_HOURLY
+        WHERE day >= make_timestamp(target_year, 1, 1, 0, 0, 0)
+          AND day < make_timestamp(target_year + 1, 1, 1, 0, 0, 0)
+        GROUP BY 1, 2, 3
+    ),
+    users AS (
+        SELECT user_id, SUM(ms_played) AS ms_played
+        FROM hour_totals
+        GROUP BY user_id
+    ),
+    top_artist AS (
+        SELECT DISTINCT ON (user_id)
+            user_id,
+            jsonb_build_object(
+                'artist_name', artist_name,
+                'total_hours_played', ROUND(ms_played / 3600000.0, 2)::double precision
+            ) AS item
+        FROM artist_totals
+        ORDER BY user_id, ms_played DESC, artist_name COLLATE "C"
     ),
     active_hour AS (
-        SELECT
-            EXTRACT(HOUR FROM end_time)::int AS hour,
-            ROUND(SUM(ms_played) / 60000.0, 2)::double precision AS total_minutes_played
-        FROM base
-        GROUP BY EXTRACT(HOUR FROM end_time)
-        ORDER BY total_minutes_played DESC
-        LIMIT 1
+        SELECT DISTINCT ON (user_id)
+            user_id,
+            jsonb_build_object(
+                'hour', hour,
+                'total_minutes_played', ROUND(ms_played / 60000.0, 2)::double precision
+            ) AS item
+        FROM (
+            SELECT user_id, hour, SUM(ms_played) AS ms_played
+            FROM hour_totals
+            GROUP BY user_id, hour
+        ) h
+        ORDER BY user_id, ms_played DESC, hour
     ),
     top_tracks AS (
-        SELECT COALESCE(jsonb_agg(to_jsonb(t) ORDER BY t.total_minutes_played DESC), '[]'::jsonb) AS items
+        SELECT
+            user_id,
+            jsonb_agg(
+                jsonb_build_object(
+                    'artist_name', artist_name,
+                    'track_name', track_name,
+                    'total_minutes_played', ROUND(ms_played / 60000.0, 2)::double precision,
+                    'total_hours_played', ROUND(ms_played / 3600000.0, 2)::double precision
+                )
+                ORDER BY ms_played DESC, artist_name COLLATE "C", track_name COLLATE "C"
+            ) AS items
         FROM (
-            SELECT
-                artist_name,
-                track_name,
-                ROUND(SUM(ms_played) / 60000.0, 2)::double precision AS total_minutes_played,
-                ROUND(SUM(ms_played) / 3600000.0, 2)::double precision AS total_hours_played
-            FROM base
-            WHERE track_name IS NOT NULL
-            GROUP BY artist_name, track_name
-            ORDER BY total_minutes_played DESC
-            LIMIT 5
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY user_id ORDER BY ms_played DESC, artist_name COLLATE "C", track_name COLLATE "C"
+            ) AS rank
+            FROM track_totals
         ) t
+        WHERE rank <= 5
+        GROUP BY user_id
     ),
     top_podcasts AS (
-        SELECT COALESCE(jsonb_agg(to_jsonb(p) ORDER BY p.total_minutes_played DESC), '[]'::jsonb) AS items
+        SELECT
+            user_id,
+            jsonb_agg(
+                jsonb_build_object(
+                    'episode_show_name', episode_show_name,
+                    'episode_name', episode_name,
+                    'total_minutes_played', ROUND(ms_played / 60000.0, 2)::double precision,
+                    'total_hours_played', ROUND(ms_played / 3600000.0, 2)::double precision
+                )
+                ORDER BY ms_played DESC, episode_show_name COLLATE "C", episode_name COLLATE "C"
+            ) AS items
         FROM (
-            SELECT
-                episode_show_name,
-                episode_name,
-                ROUND(SUM(ms_played) / 60000.0, 2)::double precision AS total_minutes_played,
-                ROUND(SUM(ms_played) / 3600000.0, 2)::double precision AS total_hours_played
-            FROM base
-            WHERE episode_name IS NOT NULL
-            GROUP BY episode_show_name, episode_name
-            ORDER BY total_minutes_played DESC
-            LIMIT 5
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY user_id ORDER BY ms_played DESC, episode_show_name COLLATE "C", episode_name COLLATE "C"
+            ) AS rank
+            FROM episode_totals
         ) p
+        WHERE rank <= 5
+        GROUP BY user_id
     ),
     listening_periods AS (
-        SELECT COALESCE(jsonb_agg(to_jsonb(lp) ORDER BY lp.total_minutes_played DESC), '[]'::jsonb) AS items
+        SELECT
+            user_id,
+            jsonb_agg(
+                jsonb_build_object(
+                    'period', period,
+                    'total_minutes_played', ROUND(ms_played / 60000.0, 2)::double precision
+                )
+                ORDER BY ms_played DESC, period COLLATE "C"
+            ) AS items
         FROM (
             SELECT
+                user_id,
                 CASE
-                    WHEN EXTRACT(HOUR FROM end_time) BETWEEN 5 AND 11 THEN 'Morning'
-                    WHEN EXTRACT(HOUR FROM end_time) BETWEEN 12 AND 17 THEN 'Afternoon'
-                    WHEN EXTRACT(HOUR FROM end_time) BETWEEN 18 AND 22 THEN 'Evening'
+                    WHEN hour BETWEEN 5 AND 11 THEN 'Morning'
+                    WHEN hour BETWEEN 12 AND 17 THEN 'Afternoon'
+                    WHEN hour BETWEEN 18 AND 22 THEN 'Evening'
                     ELSE 'Night'
                 END AS period,
-                ROUND(SUM(ms_played) / 60000.0, 2)::double precision AS total_minutes_played
-            FROM base
-            GROUP BY 1
-            ORDER BY 2 DESC
+                SUM(ms_played) AS ms_played
+            FROM hour_totals
+            GROUP BY 1, 2
         ) lp
+        GROUP BY user_id
     ),
     top_days AS (
-        SELECT COALESCE(jsonb_agg(to_jsonb(d) ORDER BY d.total_minutes_played DESC), '[]'::jsonb) AS items
+        SELECT
+            user_id,
+            jsonb_agg(
+                jsonb_build_object(
+                    'day', TO_CHAR(day, 'YYYY-MM-DD'),
+                    'day_of_week', TRIM(TO_CHAR(day, 'Day')),
+                    'month', TRIM(TO_CHAR(day, 'Month')),
+                    'total_minutes_played', ROUND(ms_played / 60000.0, 2)::double precision
+                )
+                ORDER BY ms_played DESC, day
+            ) AS items
         FROM (
             SELECT
-                TO_CHAR(DATE(end_time), 'YYYY-MM-DD') AS day,
-                TRIM(TO_CHAR(end_time, 'Day')) AS day_of_week,
-                TRIM(TO_CHAR(end_time, 'Month')) AS month,
-                ROUND(SUM(ms_played) / 60000.0, 2)::double precision AS total_minutes_played
-            FROM base
-            GROUP BY DATE(end_time), TRIM(TO_CHAR(end_time, 'Day')), TRIM(TO_CHAR(end_time, 'Month'))
-            ORDER BY total_minutes_played DESC
-            LIMIT 5
+                user_id,
+                day,
+                SUM(ms_played) AS ms_played,
+                ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY SUM(ms_played) DESC, day) AS rank
+            FROM hour_totals
+            GROUP BY user_id, day
         ) d
+        WHERE rank <= 5
+        GROUP BY user_id
+    ),
+    track_name_totals AS (
+        SELECT user_id, track_name, SUM(plays) AS plays, SUM(short_plays) AS short_plays
+        FROM track_totals
+        GROUP BY user_id, track_name
     ),
     most_played AS (
-        SELECT
-            track_name,
-            COUNT(*)::int AS play_count
-        FROM base
-        WHERE track_name IS NOT NULL
-        GROUP BY track_name
-        ORDER BY play_count DESC
-        LIMIT 1
+        SELECT DISTINCT ON (user_id)
+            user_id,
+            jsonb_build_object('track_name', track_name, 'play_count', plays::int) AS item
+        FROM track_name_totals
+        ORDER BY user_id, plays DESC, track_name COLLATE "C"
     ),
     skips AS (
-        SELECT COALESCE(jsonb_agg(to_jsonb(s) ORDER BY s.skips DESC), '[]'::jsonb) AS items
+        SELECT
+            user_id,
+            jsonb_agg(
+                jsonb_build_object('track_name', track_name, 'skips', short_plays::int)
+                ORDER BY short_plays DESC, track_name COLLATE "C"
+            ) AS items
         FROM (
-            SELECT
-                track_name,
-                COUNT(*)::int AS skips
-            FROM base
-            WHERE ms_played < 5000 AND track_name IS NOT NULL
-            GROUP BY track_name
-            ORDER BY skips DESC
-            LIMIT 10
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY user_id ORDER BY short_plays DESC, track_name COLLATE "C"
+            ) AS rank
+            FROM track_name_totals
+            WHERE short_plays > 0
         ) s
+        WHERE rank <= 10
+        GROUP BY user_id
     )
-    INSERT INTO PRS.SPOTIFY_WRAPPED_2025_SUMMARY (year, generated_at, payload)
-    VALUES (
+    INSERT INTO PRS.SPOTIFY_WRAPPED_SUMMARY (year, generated_at, payload)
+    SELECT
         target_year,
         NOW(),
         jsonb_build_object(
-            'total_time', jsonb_build_object('hours', (SELECT hours FROM total_time)),
-            'top_artist', COALESCE((SELECT to_jsonb(a) FROM top_artist a), '{}'::jsonb),
-            'active_hour', COALESCE((SELECT to_jsonb(h) FROM active_hour h), '{}'::jsonb),
-            'top_tracks', (SELECT items FROM top_tracks),
-            'top_podcasts', (SELECT items FROM top_podcasts),
-            'listening_periods', (SELECT items FROM listening_periods),
-            'top_days', (SELECT items FROM top_days),
-            'most_played', COALESCE((SELECT to_jsonb(m) FROM most_played m), '{}'::jsonb),
-            'skips', (SELECT items FROM skips)
+            'total_time', jsonb_build_object('hours', COALESCE(ROUND(u.ms_played / 3600000.0, 2), 0)::double precision),
+            'top_artist', COALESCE(ta.item, '{}'::jsonb),
+            'active_hour', COALESCE(ah.item, '{}'::jsonb),
+            'top_tracks', COALESCE(tt.items, '[]'::jsonb),
+            'top_podcasts', COALESCE(tp.items, '[]'::jsonb),
+            'listening_periods', COALESCE(lp.items, '[]'::jsonb),
+            'top_days', COALESCE(td.items, '[]'::jsonb),
+            'most_played', COALESCE(mp.item, '{}'::jsonb),
+            'skips', COALESCE(sk.items, '[]'::jsonb)
         )
-    )
+    FROM (SELECT ''::text AS user_id) g
+    LEFT JOIN users u USING (user_id)
+    LEFT JOIN top_artist ta USING (user_id)
+    LEFT JOIN active_hour ah USING (user_id)
+    LEFT JOIN top_tracks tt USING (user_id)
+    LEFT JOIN top_podcasts tp USING (user_id)
+    LEFT JOIN listening_periods lp USING (user_id)
+    LEFT JOIN top_days td USING (user_id)
+    LEFT JOIN most_played mp USING (user_id)
+    LEFT JOIN skips sk USING (user_id)
     ON CONFLICT (year)
     DO UPDATE
     SET generated_at = EXCLUDED.generated_at,
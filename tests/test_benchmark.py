@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import benchmark
+
+
+def _report(wall_seconds, ingest, refresh, peak_rss_mb=50.0, records=10000):
+    return {
+        "results": [
+            {
+                "records": records,
+                "wall_seconds": wall_seconds,
+                "peak_rss_mb": peak_rss_mb,
+                "phases": {"ingest": ingest, "process": 0.2, "refresh": refresh, "refresh_users": 0.05},
+            }
+        ]
+    }
+
+
+def test_compare_results_flags_slower_phases():
+    baseline = _report(2.0, 1.5, 0.2)
+
+    regressions = benchmark.compare_results(_report(3.0, 2.5, 0.2), baseline)
+
+    assert regressions == [
+        "10000 records: wall_seconds 3.0s vs baseline 2.0s (+50%)",
+        "10000 records: phases.ingest 2.5s vs baseline 1.5s (+67%)",
+    ]
+
+
+def test_compare_results_ignores_noise_and_unknown_sizes():
+    baseline = _report(2.0, 1.5, 0.01)
+
+    # refresh doubled but only by 10ms; memory grew by less than the slack.
+    assert benchmark.compare_results(_report(2.1, 1.5, 0.02, peak_rss_mb=70.0), baseline) == []
+    assert benchmark.compare_results(_report(9.0, 9.0, 9.0, records=500), baseline) == []
+    assert benchmark.compare_results(_report(2.0, 1.5, 0.01, peak_rss_mb=200.0), baseline) == [
+        "10000 records: peak_rss_mb 200.0 MB vs baseline 50.0 MB (+300%)"
+    ]
+
+
+@pytest.mark.integration
+def test_run_benchmarks_reports_every_phase():
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration benchmark test.")
+
+    report = benchmark.run_benchmarks(test_database_url, sizes=(200,), repeat=1)
+
+    (result,) = report["results"]
+    assert result["records"] == 200
+    assert 0 < result["events"] <= 200
+    assert set(result["phases"]) == set(benchmark.PHASES)
+    assert result["rows_per_second"] > 0
+    assert benchmark.compare_results(report, report) == []
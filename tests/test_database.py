@@ -0,0 +1,63 @@
+import asyncio
+import os
+
+import psycopg2
+import pytest
+from psycopg_pool import PoolTimeout
+
+import database
+
+
+def test_only_connections_idle_for_a_while_are_pinged(monkeypatch):
+    pinged = []
+
+    async def check_connection(conn):
+        pinged.append(conn)
+
+    class Connection:
+        pass
+
+    monkeypatch.setattr(database.AsyncConnectionPool, "check_connection", staticmethod(check_connection))
+    monkeypatch.setattr(database, "DB_POOL_CHECK_IDLE_SECONDS", 60)
+    fresh, returned = Connection(), Connection()
+
+    async def scenario():
+        await database._mark_async_returned(returned)
+        await database._check_async_connection(returned)
+        await database._check_async_connection(fresh)
+
+    asyncio.run(scenario())
+    assert pinged == [fresh]
+
+
+@pytest.mark.integration
+def test_async_pool_applies_settings_and_replaces_terminated_connection(monkeypatch):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration pool test.")
+
+    monkeypatch.setattr(database, "DATABASE_URL", test_database_url)
+    monkeypatch.setattr(database, "DB_POOL_CHECK_IDLE_SECONDS", 0)
+    monkeypatch.setattr(database, "DB_POOL_TIMEOUT_SECONDS", 0.2)
+
+    async def backend_pid():
+        row = await database.execute_query_async("SELECT pg_backend_pid() AS pid", fetch="one")
+        return row["pid"]
+
+    async def scenario():
+        pool = await database.init_async_db_pool(min_size=1, max_size=1)
+        try:
+            assert (pool.min_size, pool.max_size, pool.timeout) == (1, 1, 0.2)
+            first_pid = await backend_pid()
+            with psycopg2.connect(test_database_url) as admin, admin.cursor() as cur:
+                cur.execute("SELECT pg_terminate_backend(%s)", (first_pid,))
+            assert await backend_pid() != first_pid
+
+            # A checkout queues for at most DB_POOL_TIMEOUT_SECONDS while the only connection is busy.
+            async with pool.connection():
+                with pytest.raises(PoolTimeout):
+                    await backend_pid()
+        finally:
+            await database.close_async_db_pool()
+
+    asyncio.run(scenario())
@@ -0,0 +1,115 @@
+import gzip
+import json
+import os
+from pathlib import Path
+
+import psycopg2
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import event_export
+import main
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / "schema.sql"
+ROWS = [['{"end_time":"2025-01-01T08:10:00","user_id":"user_a"}'], ['{"end_time":"2025-01-02T09:00:00","user_id":null}']]
+
+
+def test_build_export_query_filters_by_time_and_user():
+    query, params = event_export.build_export_query("processed", "2025-01-01", "2025-02-01", "user_a")
+
+    assert "FROM PRS.SPOTIFY_EVENTS WHERE end_time >= %s AND end_time < %s AND user_id = %s" in query
+    assert params == ("2025-01-01", "2025-02-01", "user_a")
+    query, params = event_export.build_export_query("raw")
+    assert "FROM RAW.SPOTIFY_EVENTS)" in query
+    assert "file_id" not in query
+    assert params == ()
+
+
+def test_export_events_streams_one_chunk_per_fetch(monkeypatch):
+    monkeypatch.setattr(event_export, "stream_query", lambda *args, **kwargs: iter([ROWS[:1], ROWS[1:]]))
+
+    chunks = list(event_export.export_events())
+    compressed = b"".join(event_export.export_events(compress=True))
+
+    assert len(chunks) == 2
+    assert [json.loads(line) for line in b"".join(chunks).decode().splitlines()] == [
+        {"end_time": "2025-01-01T08:10:00", "user_id": "user_a"},
+        {"end_time": "2025-01-02T09:00:00", "user_id": None},
+    ]
+    assert gzip.decompress(compressed) == b"".join(chunks)
+
+
+def test_export_endpoint_streams_ndjson(monkeypatch):
+    seen = []
+
+    async def stream(query, params, fetch_rows, name):
+        seen.append(params)
+        for rows in (ROWS[:1], ROWS[1:]):
+            yield rows
+
+    monkeypatch.setattr(event_export, "stream_query_async", stream)
+
+    with TestClient(main.app) as client:
+        plain = client.get("/api/export/events", params={"user_id": "user_a", "start": "2025-01-01T00:00:00"})
+        compressed = client.get("/api/export/events", params={"gzip": "true"})
+        bad_source = client.get("/api/export/events", params={"source": "nope"})
+        bad_range = client.get("/api/export/events", params={"start": "2025-02-01", "end": "2025-01-01"})
+
+    assert plain.status_code == 200
+    assert plain.headers["content-type"] == "application/x-ndjson"
+    assert len(plain.text.splitlines()) == 2
+    assert seen[0][1] == "user_a"
+    assert compressed.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(compressed.content).decode() == plain.text
+    assert bad_source.status_code == 422
+    assert bad_range.status_code == 422
+
+
+def test_export_endpoint_returns_503_when_database_fails(monkeypatch):
+    async def stream(*args, **kwargs):
+        raise RuntimeError("Database down")
+        yield
+
+    monkeypatch.setattr(event_export, "stream_query_async", stream)
+
+    with TestClient(main.app) as client:
+        response = client.get("/api/export/events")
+
+    assert response.status_code == 503
+
+
+@pytest.mark.integration
+def test_export_events_reads_with_a_server_side_cursor(monkeypatch):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration export test.")
+
+    conn = psycopg2.connect(test_database_url)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+            cur.execute(
+                """
+                INSERT INTO PRS.SPOTIFY_EVENTS (end_time, artist_name, track_name, ms_played, user_id)
+                SELECT TIMESTAMP '2025-01-01' + n * INTERVAL '1 hour', 'Artist', 'Song ' || n, 1000 * n,
+                       CASE WHEN n % 2 = 0 THEN 'user_a' ELSE 'user_b' END
+                FROM generate_series(1, 25) AS n
+                """
+            )
+        conn.commit()
+
+        monkeypatch.setattr(database, "DATABASE_URL", test_database_url)
+        monkeypatch.setattr(event_export, "EXPORT_FETCH_ROWS", 4)
+        chunks = list(event_export.export_events(user_id="user_a", start="2025-01-01 05:00", end="2025-01-01 21:00"))
+        events = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+
+        assert len(chunks) == 2
+        assert sorted(event["track_name"] for event in events) == [f"Song {n}" for n in (10, 12, 14, 16, 18, 20, 6, 8)]
+        assert set(events[0]) == set(event_export.EXPORT_SOURCES["processed"][1])
+        assert events[0]["end_time"].startswith("2025-01-01T")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE TABLE PRS.SPOTIFY_EVENTS")
+        conn.commit()
+        conn.close()
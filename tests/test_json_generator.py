@@ -0,0 +1,47 @@
+import json
+
+import json_generator
+from loader import _iter_file_records
+
+
+def _generate(tmp_path, name, workers=1, seed=7):
+    options = json_generator.build_options(users=3, start_year=2024, end_year=2025, mix=(6, 3, 1))
+    return json_generator.generate_files(
+        seed,
+        25,
+        options,
+        output_dir=str(tmp_path / name),
+        records_per_file=10,
+        workers=workers,
+    )
+
+
+def _read_bytes(paths):
+    return [open(path, "rb").read() for path in paths]
+
+
+def test_same_seed_gives_byte_identical_shards(tmp_path):
+    serial = _generate(tmp_path, "serial")
+    parallel = _generate(tmp_path, "parallel", workers=3)
+    other_seed = _generate(tmp_path, "other", seed=8)
+
+    assert [path.rsplit("/", 1)[1] for path in serial] == [
+        "spotify_events_00000.json",
+        "spotify_events_00001.json",
+        "spotify_events_00002.json",
+    ]
+    assert _read_bytes(serial) == _read_bytes(parallel)
+    assert _read_bytes(serial) != _read_bytes(other_seed)
+
+
+def test_generated_files_load_with_configured_shape(tmp_path):
+    paths = _generate(tmp_path, "data")
+
+    records = [record for path in paths for record in json.load(open(path, encoding="utf-8"))]
+    assert len(records) == 25
+    assert {record["end_time"][:4] for record in records} <= {"2024", "2025"}
+    assert {record["user_id"] for record in records} <= {"user_100", "user_101", "user_102"}
+
+    rows = [row for path in paths for row in _iter_file_records(path)]
+    assert len(rows) == 25
+    assert all(row[0] and row[3] for row in rows)
@@ -0,0 +1,79 @@
+import random
+from collections import Counter
+
+from live_stats import LiveStats, SpaceSaving
+
+
+def _row(end_time, ms_played, artist=None, track=None, episode=None, show=None):
+    row = [None] * 25
+    row[0], row[1], row[2], row[3], row[11], row[12] = end_time, artist, track, ms_played, episode, show
+    return tuple(row)
+
+
+def _assert_bounded(sketch, exact):
+    for key, estimate, error in sketch.top(len(sketch.counts)):
+        assert estimate - error <= exact[key] <= estimate
+    # Anything heavier than the floor is always tracked.
+    assert all(key in sketch.counts for key, count in exact.items() if count > sketch.floor)
+
+
+def test_space_saving_keeps_fixed_memory_and_bounded_error():
+    rng = random.Random(7)
+    keys = [f"track {int(rng.paretovariate(1.2))}" for _ in range(20000)]
+    sketch = SpaceSaving(capacity=50)
+    for key in keys:
+        sketch.add(key)
+
+    exact = Counter(keys)
+    assert len(exact) > 100
+    assert len(sketch.counts) < 100
+    _assert_bounded(sketch, exact)
+    assert [key for key, _estimate, _error in sketch.top(3)] == [key for key, _count in exact.most_common(3)]
+
+
+def test_space_saving_merge_keeps_the_bounds():
+    rng = random.Random(11)
+    left_keys = [f"k{int(rng.paretovariate(1.1))}" for _ in range(5000)]
+    right_keys = [f"k{int(rng.paretovariate(1.1))}" for _ in range(5000)]
+    left, right = SpaceSaving(capacity=20), SpaceSaving(capacity=20)
+    for key in left_keys:
+        left.add(key, 2)
+    for key in right_keys:
+        right.add(key, 2)
+
+    left.merge(right)
+
+    exact = Counter()
+    for key in left_keys + right_keys:
+        exact[key] += 2
+    _assert_bounded(left, exact)
+
+
+def test_live_stats_build_summary_shaped_sections_per_year():
+    stats = LiveStats(capacity=10)
+    rows = [
+        _row("2025-01-01T08:10:00Z", 180000, "Artist A", "Song 1"),
+        _row("2025-01-01T08:40:00Z", 120000, "Artist A", "Song 1"),
+        _row("2025-01-01T09:00:00Z", 3000, "Artist C", "Song Skip"),
+        _row("2025-01-02T14:20:00Z", 240000, episode="Episode", show="Show"),
+        _row("2025-01-02T20:00:00Z", 0, "Artist B", "Song 2"),
+        _row("2024-12-31T23:59:59Z", 9000000, "Artist Z", "Song Z"),
+    ]
+    first, second = LiveStats(capacity=10), LiveStats(capacity=10)
+    assert list(first.observe(rows[:3])) == rows[:3]
+    list(second.observe(rows[3:]))
+    stats.merge(first)
+    stats.merge(second)
+
+    events, payload = stats.payloads()[2025]
+    assert events == 4
+    assert payload["total_time"] == {"hours": 0.15}
+    assert payload["top_artist"] == {"artist_name": "Artist A", "total_hours_played": 0.08, "max_error_hours": 0.0}
+    assert payload["top_tracks"][0]["track_name"] == "Song 1"
+    assert payload["top_podcasts"][0]["episode_show_name"] == "Show"
+    assert payload["active_hour"] == {"hour": 8, "total_minutes_played": 5.0}
+    assert payload["top_days"][0]["day"] == "2025-01-01"
+    assert payload["top_days"][0]["day_of_week"] == "Wednesday"
+    assert payload["most_played"] == {"track_name": "Song 1", "play_count": 2, "max_error": 0}
+    assert payload["skips"] == [{"track_name": "Song Skip", "skips": 1, "max_error": 0}]
+    assert stats.payloads()[2024][1]["top_artist"]["artist_name"] == "Artist Z"
@@ -0,0 +1,715 @@
+import hashlib
+import io
+import json
+import os
+import queue
+import zipfile
+from concurrent.futures import Future
+from pathlib import Path
+
+import psycopg2
+import pytest
+
+import loader
+import shadow_tables
+from snapshot import open_snapshot
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / "schema.sql"
+
+
+def _parse(text, read_size=7):
+    return list(loader._iter_json_array(io.StringIO(text), read_size=read_size))
+
+
+def test_iter_json_array_streams_records_across_read_boundaries():
+    records = [
+        {"ts": "2025-01-01T08:10:00Z", "ms_played": 180000, "master_metadata_track_name": "Song, \"1\""},
+        {"end_time": "2025-01-02T09:00:00Z", "ms_played": 1234567890, "track_name": None},
+        {"ts": "2025-01-03T10:00:00Z", "ms_played": 0, "nested": {"items": [1, 2, 3]}},
+    ]
+    text = "  \n[ " + " ,\n ".join(json.dumps(record) for record in records) + " ]\n"
+
+    for read_size in (1, 3, 7, 64, 1 << 16):
+        assert _parse(text, read_size) == records
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 5, 8])
+def test_iter_json_array_reads_numbers_split_across_reads(read_size):
+    assert _parse("[0.1, 0.1, 12e-3, -4.5E+2, 7]", read_size) == [0.1, 0.1, 12e-3, -4.5e2, 7]
+
+
+def test_iter_json_array_handles_empty_list():
+    assert _parse(" [ \n ] ") == []
+
+
+def test_iter_json_array_rejects_non_list_content():
+    with pytest.raises(ValueError, match="JSON list"):
+        _parse('{"ts": "2025-01-01T08:10:00Z"}')
+
+
+def test_iter_json_array_rejects_truncated_content():
+    with pytest.raises(ValueError):
+        _parse('[{"ts": "2025-01-01T08:10:00Z"}, {"ts": "2025-')
+
+
+def test_iter_json_array_rejects_content_after_the_list():
+    for text in ('[{"ts": "a"}] [{"ts": "b"}]', "[] x", '[{"ts": "a"}],'):
+        with pytest.raises(ValueError, match="after the end of the JSON list"):
+            _parse(text)
+    assert _parse('[{"ts": "a"}] \n\t') == [{"ts": "a"}]
+
+
+def test_chunked_accepts_generators():
+    chunks = list(loader._chunked((value for value in range(7)), 3))
+    assert chunks == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_extended_history_mapper_reads_its_fields():
+    record = {
+        "ts": "2025-03-01T12:00:00Z",
+        "master_metadata_album_artist_name": "Artist A",
+        "master_metadata_track_name": "Song 1",
+        "ms_played": 1500,
+        "username": "listener",
+        "offline_timestamp": 1740830400000,
+    }
+    row = loader._record_mapper(record)(record)
+
+    assert row[:4] == ("2025-03-01T12:00:00Z", "Artist A", "Song 1", 1500)
+    assert row[7] == "listener"
+    assert row[23] == "1740830400000"
+
+
+def test_mapper_is_chosen_from_the_first_record_of_each_format():
+    extended = {"ts": "2025-03-01T12:00:00Z", "master_metadata_track_name": "Song 1", "ip_addr_decrypted": "10.0.0.1"}
+    account = {"endTime": "2025-03-01 12:00", "podcastName": "Show", "episodeName": "Episode", "msPlayed": 900}
+    generated = {"end_time": "2025-03-01T12:00:00Z", "track_name": "Song 2", "user_id": "user_a", "ip_addr": "10.0.0.2"}
+
+    assert loader._record_mapper(extended) is loader._map_extended_history_decrypted_ip
+    rows = [loader._record_mapper(record)(record) for record in (extended, account, generated)]
+    assert rows[0][9] == "10.0.0.1"
+    assert rows[1][:4] == ("2025-03-01 12:00", None, None, 900)
+    assert rows[1][11:13] == ("Episode", "Show")
+    assert rows[2][7:10] == ("user_a", None, "10.0.0.2")
+    assert all(len(row) == 25 for row in rows)
+    with pytest.raises(ValueError, match="Unrecognized export format"):
+        loader._record_mapper({"title": "Playlist"})
+
+
+def test_zip_archive_members_are_read_in_place(tmp_path):
+    records = [{"endTime": "2025-03-01 12:00", "artistName": "Artist", "trackName": "Song", "msPlayed": 1000}]
+    content = json.dumps(records).encode("utf-8")
+    with zipfile.ZipFile(tmp_path / "my_spotify_data.zip", "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("Spotify Account Data/StreamingHistory_music_0.json", content)
+        archive.writestr("Spotify Account Data/Userdata.json", "{}")
+    (tmp_path / "spotify_events.json").write_text("[]", encoding="utf-8")
+    (tmp_path / "broken.zip").write_bytes(b"not a zip")
+
+    file_paths = loader.list_export_files(str(tmp_path))
+
+    member_path = f"{tmp_path}/my_spotify_data.zip/Spotify Account Data/StreamingHistory_music_0.json"
+    assert file_paths == [member_path, str(tmp_path / "spotify_events.json")]
+    assert list(loader._iter_file_records(member_path))[0][:4] == ("2025-03-01 12:00", "Artist", "Song", 1000)
+    assert list(loader._iter_file_records(file_paths[1])) == []
+    assert loader._file_fingerprint(member_path) == (len(content), hashlib.sha256(content).hexdigest())
+
+
+def test_zip_archive_with_extended_history_skips_its_account_data(tmp_path):
+    with zipfile.ZipFile(tmp_path / "my_spotify_data.zip", "w") as archive:
+        archive.writestr("Spotify Account Data/StreamingHistory_music_0.json", "[]")
+        archive.writestr("Spotify Account Data/StreamingHistory0.json", "[]")
+        archive.writestr("Spotify Extended Streaming History/Streaming_History_Audio_2025.json", "[]")
+        archive.writestr("MyData/endsong_0.json", "[]")
+    with zipfile.ZipFile(tmp_path / "account_only.zip", "w") as archive:
+        archive.writestr("StreamingHistory_music_0.json", "[]")
+
+    assert loader.list_export_files(str(tmp_path)) == [
+        f"{tmp_path}/account_only.zip/StreamingHistory_music_0.json",
+        f"{tmp_path}/my_spotify_data.zip/MyData/endsong_0.json",
+        f"{tmp_path}/my_spotify_data.zip/Spotify Extended Streaming History/Streaming_History_Audio_2025.json",
+    ]
+
+
+def test_copy_value_uses_postgres_text_format():
+    assert loader._copy_value(None) == "\\N"
+    assert loader._copy_value(True) == "t"
+    assert loader._copy_value(False) == "f"
+    assert loader._copy_value(1500) == "1500"
+    assert loader._copy_value("a\tb\nc\\d\re") == "a\\tb\\nc\\\\d\\re"
+
+
+def test_copy_line_rounds_float_ms_played_like_insert_mode():
+    row = ("2025-01-01T08:10:00Z", "Artist", None, 2500.5, 1.5)
+    assert loader._copy_line(row) == "2025-01-01T08:10:00Z\tArtist\t\\N\t2501\t1.5\n"
+    assert loader._copy_line(row[:3] + (-0.5,) + row[4:]).split("\t")[3] == "-1"
+
+
+def test_copy_stream_renders_all_rows_in_small_reads():
+    rows = [("2025-01-01T08:10:00Z", "Artist", None, index, True) for index in range(5)]
+    stream = loader._CopyStream(loader._encode_copy_chunk(chunk) for chunk in loader._chunked(rows, 2))
+
+    parts = []
+    while True:
+        data = stream.read(8)
+        if not data:
+            break
+        parts.append(data)
+
+    assert "".join(parts) == "".join(loader._copy_line(row) for row in rows)
+    assert stream.rows == 5
+
+
+def test_parse_file_worker_feeds_queue_until_sentinel(monkeypatch, tmp_path):
+    file_path = tmp_path / "Streaming_History_0.json"
+    file_path.write_text(json.dumps([{"ts": "2025-01-01T08:10:00Z", "ms_played": index} for index in range(5)]))
+    chunk_queue = queue.Queue()
+    future = Future()
+
+    reply_queue = queue.Queue()
+    reply_queue.put((7, 1))
+
+    monkeypatch.setattr(loader, "BATCH_SIZE", 2)
+    loader._parse_file_worker(str(file_path), "insert", chunk_queue, reply_queue)
+    future.set_result(None)
+
+    chunks = list(loader._QueuedChunks(chunk_queue, future))
+    # The fingerprint for the manifest comes first.
+    assert chunks.pop(0) == loader._file_fingerprint(str(file_path))
+    assert [count for _rows, count in chunks] == [2, 2]
+    assert [rows[0][3] for rows, _count in chunks] == [1, 3]
+    assert {row[-1] for rows, _count in chunks for row in rows} == {7}
+
+
+def test_parse_file_worker_sends_live_stats_after_the_last_chunk(tmp_path):
+    file_path = tmp_path / "Streaming_History_2.json"
+    records = [{"ts": "2025-01-01T08:10:00Z", "master_metadata_track_name": "Song", "ms_played": 1000}] * 3
+    file_path.write_text(json.dumps(records))
+    chunk_queue = queue.Queue()
+    future = Future()
+
+    reply_queue = queue.Queue()
+    reply_queue.put((1, 0))
+
+    loader._parse_file_worker(str(file_path), "copy", chunk_queue, reply_queue, collect_stats=True)
+    future.set_result(None)
+
+    chunks = loader._QueuedChunks(chunk_queue, future)
+    next(chunks)
+    assert [count for _text, count in chunks] == [3]
+    events, payload = chunks.live_stats.payloads()[2025]
+    assert events == 3
+    assert payload["most_played"]["play_count"] == 3
+
+
+def test_queued_chunks_reraise_parser_errors(tmp_path):
+    file_path = tmp_path / "Streaming_History_1.json"
+    file_path.write_text('[{"ts": "2025-01-01T08:10:00Z", "ms_played": 1},')
+    chunk_queue = queue.Queue()
+    future = Future()
+
+    reply_queue = queue.Queue()
+    reply_queue.put((1, 0))
+
+    loader._parse_file_worker(str(file_path), "copy", chunk_queue, reply_queue)
+    future.set_result(None)
+
+    chunks = loader._QueuedChunks(chunk_queue, future)
+    next(chunks)
+    with pytest.raises(ValueError, match="Unexpected end of file"):
+        list(chunks)
+    assert chunks.finished
+
+
+def test_parse_file_worker_stops_after_the_fingerprint_when_not_claimed(tmp_path):
+    file_path = tmp_path / "Streaming_History_3.json"
+    file_path.write_text(json.dumps([{"ts": "2025-01-01T08:10:00Z", "ms_played": 1}]))
+    chunk_queue = queue.Queue()
+    reply_queue = queue.Queue()
+    reply_queue.put(None)
+    future = Future()
+
+    loader._parse_file_worker(str(file_path), "copy", chunk_queue, reply_queue)
+    future.set_result(None)
+
+    assert len(list(loader._QueuedChunks(chunk_queue, future))) == 1
+
+
+@pytest.mark.integration
+def test_load_json_files_is_incremental(monkeypatch, tmp_path):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration loader test.")
+
+    conn = psycopg2.connect(test_database_url)
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+    conn.commit()
+
+    def write_export(name, count, ms_played):
+        records = [
+            {"ts": f"2025-02-0{index % 9 + 1}T10:00:00Z", "master_metadata_track_name": "Song", "ms_played": ms_played}
+            for index in range(count)
+        ]
+        (tmp_path / name).write_text(json.dumps(records), encoding="utf-8")
+
+    def counts():
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*), COALESCE(SUM(ms_played), 0) FROM PRS.SPOTIFY_EVENTS")
+            processed = cur.fetchone()
+            cur.execute("SELECT file_path, row_count, status FROM RAW.SPOTIFY_LOAD_MANIFEST ORDER BY file_path")
+            manifest = cur.fetchall()
+        conn.commit()
+        return processed, manifest
+
+    def track_rollup():
+        with conn.cursor() as cur:
+            cur.execute("SELECT track_name, plays, ms_played, short_plays FROM PRS.SPOTIFY_ROLLUP_TRACKS")
+            rows = cur.fetchall()
+        conn.commit()
+        return rows
+
+    monkeypatch.setattr(loader, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(loader, "get_db_connection", lambda: psycopg2.connect(test_database_url))
+    refreshed_years = []
+    monkeypatch.setattr(loader, "refresh_summaries", refreshed_years.append)
+    monkeypatch.setattr(loader, "BATCH_SIZE", 2)
+    monkeypatch.setattr(loader, "COMMIT_CHUNKS", 1)
+
+    try:
+        write_export("Streaming_History_0.json", 5, 1000)
+        loader.load_json_files()
+        assert counts() == ((5, 5000), [("Streaming_History_0.json", 5, "processed")])
+        assert refreshed_years == [2025]
+        assert track_rollup() == [("Song", 5, 5000, 5)]
+
+        loader.load_json_files()
+        assert refreshed_years == [2025]
+
+        write_export("Streaming_History_1.json", 3, 2000)
+        loader.load_json_files()
+        assert counts() == (
+            (8, 11000),
+            [("Streaming_History_0.json", 5, "processed"), ("Streaming_History_1.json", 3, "processed")],
+        )
+
+        write_export("Streaming_History_0.json", 4, 1000)
+        loader.load_json_files(mode="insert")
+        assert counts() == (
+            (7, 10000),
+            [("Streaming_History_0.json", 4, "processed"), ("Streaming_History_1.json", 3, "processed")],
+        )
+        # The replaced file's old rows are subtracted from the rollups before its new rows are added.
+        assert track_rollup() == [("Song", 7, 10000, 7)]
+
+        loader.rebuild_year(conn, 2025)
+        assert track_rollup() == [("Song", 7, 10000, 7)]
+
+        loader.write_events_snapshot(conn, str(tmp_path / "snapshot"))
+        snapshot = open_snapshot(str(tmp_path / "snapshot"))
+        assert int(snapshot.ms_played.sum()) == 10000
+        assert list(snapshot.values["track_name"]) == ["Song"]
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                TRUNCATE TABLE RAW.SPOTIFY_EVENTS, PRS.SPOTIFY_EVENTS, RAW.SPOTIFY_LOAD_MANIFEST,
+                    PRS.SPOTIFY_ROLLUP_HOURLY, PRS.SPOTIFY_ROLLUP_TRACKS,
+                    PRS.SPOTIFY_ROLLUP_ARTISTS, PRS.SPOTIFY_ROLLUP_EPISODES
+                """
+            )
+        conn.commit()
+        conn.close()
+
+
+@pytest.mark.integration
+def test_copy_and_insert_modes_load_float_fields_alike(monkeypatch, tmp_path):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration loader test.")
+
+    conn = psycopg2.connect(test_database_url)
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+    conn.commit()
+
+    records = [
+        {"ts": "2025-02-01T10:00:00Z", "master_metadata_track_name": "Song", "ms_played": 1500.0},
+        {"ts": "2025-02-02T10:00:00Z", "master_metadata_track_name": "Song", "ms_played": 2500.5},
+        {"ts": "2025-02-03T10:00:00Z", "ms_played": 12.25, "offline_timestamp": 1740830400000.0},
+    ]
+    (tmp_path / "Streaming_History_0.json").write_text(json.dumps(records), encoding="utf-8")
+
+    monkeypatch.setattr(loader, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(loader, "get_db_connection", lambda: psycopg2.connect(test_database_url))
+    monkeypatch.setattr(loader, "refresh_summaries", lambda _year: None)
+
+    loaded = {}
+    try:
+        for mode in ("insert", "copy"):
+            loader.load_json_files(full=True, mode=mode)
+            with conn.cursor() as cur:
+                cur.execute("SELECT ms_played, offline_timestamp FROM RAW.SPOTIFY_EVENTS ORDER BY end_time")
+                loaded[mode] = cur.fetchall()
+                cur.execute("SELECT status FROM RAW.SPOTIFY_LOAD_MANIFEST")
+                assert cur.fetchall() == [("processed",)]
+            conn.commit()
+        assert loaded["copy"] == loaded["insert"] == [(1500, None), (2501, None), (12, "1740830400000.0")]
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                TRUNCATE TABLE RAW.SPOTIFY_EVENTS, PRS.SPOTIFY_EVENTS, RAW.SPOTIFY_LOAD_MANIFEST,
+                    PRS.SPOTIFY_ROLLUP_HOURLY, PRS.SPOTIFY_ROLLUP_TRACKS,
+                    PRS.SPOTIFY_ROLLUP_ARTISTS, PRS.SPOTIFY_ROLLUP_EPISODES
+                """
+            )
+        conn.commit()
+        conn.close()
+
+
+@pytest.mark.integration
+def test_parallel_load_parses_more_files_than_writers(monkeypatch, tmp_path, capsys):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration loader test.")
+
+    conn = psycopg2.connect(test_database_url)
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+    conn.commit()
+
+    def write_export(index, count):
+        records = [
+            {"ts": f"2025-04-0{index + 1}T10:{minute:02d}:00Z", "master_metadata_track_name": "Song", "ms_played": 1000}
+            for minute in range(count)
+        ]
+        (tmp_path / f"Streaming_History_{index}.json").write_text(json.dumps(records), encoding="utf-8")
+
+    def manifest():
+        with conn.cursor() as cur:
+            cur.execute("SELECT file_path, row_count, status FROM RAW.SPOTIFY_LOAD_MANIFEST ORDER BY file_path")
+            rows = cur.fetchall()
+        conn.commit()
+        return rows
+
+    monkeypatch.setattr(loader, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(loader, "get_db_connection", lambda: psycopg2.connect(test_database_url))
+    monkeypatch.setattr(loader, "refresh_summaries", lambda _year: None)
+
+    try:
+        for index in range(4):
+            write_export(index, index + 1)
+        (tmp_path / "Streaming_History_9.json").write_text("[{", encoding="utf-8")
+        loader.load_json_files(workers=3, writers=1)
+        assert manifest() == [
+            ("Streaming_History_0.json", 1, "processed"),
+            ("Streaming_History_1.json", 2, "processed"),
+            ("Streaming_History_2.json", 3, "processed"),
+            ("Streaming_History_3.json", 4, "processed"),
+            ("Streaming_History_9.json", 0, "failed"),
+        ]
+
+        write_export(1, 5)
+        capsys.readouterr()
+        loader.load_json_files(workers=3, writers=2)
+        output = capsys.readouterr().out
+        assert "Skipping" in output and "Streaming_History_0.json: unchanged" in output
+        assert ("Streaming_History_1.json", 5, "processed") in manifest()
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                TRUNCATE TABLE RAW.SPOTIFY_EVENTS, PRS.SPOTIFY_EVENTS, RAW.SPOTIFY_LOAD_MANIFEST,
+                    PRS.SPOTIFY_ROLLUP_HOURLY, PRS.SPOTIFY_ROLLUP_TRACKS,
+                    PRS.SPOTIFY_ROLLUP_ARTISTS, PRS.SPOTIFY_ROLLUP_EPISODES
+                """
+            )
+        conn.commit()
+        conn.close()
+
+
+@pytest.mark.integration
+def test_parallel_writers_load_overlapping_files_without_deadlocks(monkeypatch, tmp_path):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration loader test.")
+
+    conn = psycopg2.connect(test_database_url)
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+    conn.commit()
+
+    plays = [
+        {"ts": f"2025-05-01T00:{second // 60:02d}:{second % 60:02d}Z", "master_metadata_track_name": "Song", "ms_played": 1000}
+        for second in range(3600)
+    ]
+    # Every file holds the same plays in a different order.
+    for index in range(4):
+        records = plays[index * 900 :] + plays[: index * 900]
+        if index % 2:
+            records.reverse()
+        (tmp_path / f"Streaming_History_{index}.json").write_text(json.dumps(records), encoding="utf-8")
+
+    def fetch(sql):
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+        conn.commit()
+        return rows
+
+    monkeypatch.setattr(loader, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(loader, "get_db_connection", lambda: psycopg2.connect(test_database_url))
+    monkeypatch.setattr(loader, "refresh_summaries", lambda _year: None)
+
+    try:
+        loader.load_json_files(workers=4, writers=4)
+        assert fetch("SELECT DISTINCT status FROM RAW.SPOTIFY_LOAD_MANIFEST") == [("processed",)]
+        assert fetch("SELECT COUNT(*), SUM(ms_played) FROM RAW.SPOTIFY_EVENTS") == [(3600, 3600000)]
+        assert fetch("SELECT COUNT(*), SUM(ms_played) FROM PRS.SPOTIFY_EVENTS") == [(3600, 3600000)]
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                TRUNCATE TABLE RAW.SPOTIFY_EVENTS, RAW.SPOTIFY_EVENT_FILES, PRS.SPOTIFY_EVENTS, RAW.SPOTIFY_LOAD_MANIFEST,
+                    PRS.SPOTIFY_ROLLUP_HOURLY, PRS.SPOTIFY_ROLLUP_TRACKS,
+                    PRS.SPOTIFY_ROLLUP_ARTISTS, PRS.SPOTIFY_ROLLUP_EPISODES
+                """
+            )
+        conn.commit()
+        conn.close()
+
+
+@pytest.mark.integration
+def test_overlapping_exports_are_deduplicated_at_ingest(monkeypatch, tmp_path):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration loader test.")
+
+    conn = psycopg2.connect(test_database_url)
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+    conn.commit()
+
+    def play(day, user="user_a", ms_played=1000):
+        return {
+            "ts": f"2025-03-0{day}T10:00:00Z",
+            "master_metadata_track_name": "Song",
+            "spotify_track_uri": "spotify:track:1",
+            "ms_played": ms_played,
+            "username": user,
+        }
+
+    def write_export(name, records):
+        (tmp_path / name).write_text(json.dumps(records), encoding="utf-8")
+
+    monkeypatch.setattr(loader, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(loader, "get_db_connection", lambda: psycopg2.connect(test_database_url))
+    monkeypatch.setattr(loader, "refresh_summaries", lambda _year: None)
+    monkeypatch.setattr(loader, "BATCH_SIZE", 2)
+    monkeypatch.setattr(loader, "COMMIT_CHUNKS", 1)
+
+    try:
+        # The second export repeats two plays of the first and one of its own;
+        # same timestamp with another user or duration is a different play.
+        write_export("Streaming_History_0.json", [play(1), play(2), play(3)])
+        write_export(
+            "Streaming_History_1.json",
+            [play(2), play(3), play(4), play(4), play(3, user="user_b"), play(3, ms_played=2000)],
+        )
+        loader.load_json_files(mode="insert")
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT file_path, row_count, duplicate_count FROM RAW.SPOTIFY_LOAD_MANIFEST ORDER BY file_path")
+            assert cur.fetchall() == [("Streaming_History_0.json", 3, 0), ("Streaming_History_1.json", 6, 3)]
+            cur.execute("SELECT COUNT(*), SUM(ms_played) FROM PRS.SPOTIFY_EVENTS")
+            assert cur.fetchone() == (6, 7000)
+            cur.execute("SELECT SUM(plays) FROM PRS.SPOTIFY_ROLLUP_TRACKS")
+            assert cur.fetchone() == (6,)
+        conn.commit()
+
+        # History members of a ZIP export are loaded without extracting it.
+        member = "Spotify Extended Streaming History/Streaming_History_Audio_2025.json"
+        with zipfile.ZipFile(tmp_path / "my_spotify_data.zip", "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(member, json.dumps([play(4), play(5)]))
+            archive.writestr("Spotify Extended Streaming History/ReadMeFirst.pdf", b"")
+        loader.load_json_files(mode="insert")
+        with conn.cursor() as cur:
+            cur.execute("SELECT row_count, duplicate_count FROM RAW.SPOTIFY_LOAD_MANIFEST WHERE file_path = %s", (f"my_spotify_data.zip/{member}",))
+            assert cur.fetchone() == (2, 1)
+        conn.commit()
+
+        def events():
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*), SUM(ms_played) FROM PRS.SPOTIFY_EVENTS")
+                processed = cur.fetchone()
+                cur.execute("SELECT SUM(plays), SUM(ms_played) FROM PRS.SPOTIFY_ROLLUP_HOURLY")
+                assert cur.fetchone() == processed
+            conn.commit()
+            return processed
+
+        # Editing the first export drops plays 2 and 3 from it; the second
+        # export still has them, so they are kept under its file_id.
+        assert events() == (7, 8000)
+        write_export("Streaming_History_0.json", [play(1)])
+        loader.load_json_files(mode="insert")
+        assert events() == (7, 8000)
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT m.file_path, COUNT(*)
+                FROM PRS.SPOTIFY_EVENTS AS e
+                JOIN RAW.SPOTIFY_LOAD_MANIFEST AS m USING (file_id)
+                GROUP BY m.file_path
+                """
+            )
+            assert dict(cur.fetchall()) == {
+                "Streaming_History_0.json": 1,
+                "Streaming_History_1.json": 5,
+                f"my_spotify_data.zip/{member}": 1,
+            }
+        conn.commit()
+
+        # A full reload in COPY mode drops the same plays.
+        loader.load_json_files(full=True)
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM RAW.SPOTIFY_EVENTS")
+            assert cur.fetchone() == (7,)
+        conn.commit()
+
+        # When the second export fails, play 4 moves to the archive, which also
+        # has it; the plays only the second export had are gone.
+        (tmp_path / "Streaming_History_1.json").write_text("[{", encoding="utf-8")
+        loader.load_json_files()
+        assert events() == (3, 3000)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                TRUNCATE TABLE RAW.SPOTIFY_EVENTS, PRS.SPOTIFY_EVENTS, RAW.SPOTIFY_LOAD_MANIFEST,
+                    PRS.SPOTIFY_ROLLUP_HOURLY, PRS.SPOTIFY_ROLLUP_TRACKS,
+                    PRS.SPOTIFY_ROLLUP_ARTISTS, PRS.SPOTIFY_ROLLUP_EPISODES
+                """
+            )
+        conn.commit()
+        conn.close()
+
+
+@pytest.mark.integration
+def test_full_reload_builds_shadow_tables_and_swaps_them_in(monkeypatch, tmp_path):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration loader test.")
+
+    conn = psycopg2.connect(test_database_url)
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+    conn.commit()
+
+    def write_export(name, year, count):
+        records = [
+            {"ts": f"{year}-04-0{index + 1}T10:00:00Z", "master_metadata_track_name": "Song", "ms_played": 1000}
+            for index in range(count)
+        ]
+        (tmp_path / name).write_text(json.dumps(records), encoding="utf-8")
+
+    def fetch(sql):
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+        conn.commit()
+        return rows
+
+    monkeypatch.setattr(loader, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(loader, "get_db_connection", lambda: psycopg2.connect(test_database_url))
+    monkeypatch.setattr(loader, "refresh_summaries", lambda _year: None)
+
+    seen_before_swap = {}
+    swap_shadow_tables = loader.swap_shadow_tables
+
+    def checked_swap(swap_conn, before_commit=None):
+        # Everything is built, nothing is live yet.
+        seen_before_swap["live"] = fetch("SELECT COUNT(*) FROM PRS.SPOTIFY_EVENTS")[0][0]
+        seen_before_swap["shadow"] = fetch("SELECT COUNT(*) FROM PRS.SPOTIFY_EVENTS_SHADOW")[0][0]
+        seen_before_swap["unlogged"] = fetch(
+            "SELECT COUNT(*) FROM pg_class WHERE relname LIKE 'spotify%\\_shadow%' AND relpersistence = 'u'"
+        )[0][0]
+        swap_shadow_tables(swap_conn, before_commit)
+
+    monkeypatch.setattr(loader, "swap_shadow_tables", checked_swap)
+
+    try:
+        write_export("Streaming_History_0.json", 2025, 5)
+        loader.load_json_files()
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO PRS.SPOTIFY_WRAPPED_SUMMARY (year, payload) VALUES (2025, '{}')")
+        conn.commit()
+
+        (tmp_path / "Streaming_History_0.json").unlink()
+        write_export("Streaming_History_1.json", 2024, 3)
+        loader.load_json_files(full=True)
+
+        assert seen_before_swap == {"live": 5, "shadow": 3, "unlogged": 0}
+        assert fetch("SELECT COUNT(*), MIN(EXTRACT(YEAR FROM end_time)) FROM PRS.SPOTIFY_EVENTS") == [(3, 2024)]
+        assert fetch("SELECT file_path, status FROM RAW.SPOTIFY_LOAD_MANIFEST") == [("Streaming_History_1.json", "processed")]
+        assert fetch("SELECT plays FROM PRS.SPOTIFY_ROLLUP_TRACKS") == [(3,)]
+        # The 2025 summary no longer has data behind it.
+        assert fetch("SELECT year FROM PRS.SPOTIFY_WRAPPED_SUMMARY") == []
+        assert fetch("SELECT relname FROM pg_class WHERE relname LIKE 'spotify%\\_shadow%'") == []
+        assert fetch("SELECT indexname FROM pg_indexes WHERE tablename = 'spotify_events_2024' ORDER BY 1")[0] == (
+            "spotify_events_2024_artist_name_idx",
+        )
+        # The btree and BRIN indexes on end_time both come through the swap.
+        assert fetch(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'spotify_events_2024' AND indexdef LIKE '%(end_time)%' ORDER BY 1"
+        ) == [("spotify_events_2024_end_time_idx",), ("spotify_events_2024_end_time_idx1",)]
+
+        # Later incremental loads keep working on the swapped-in tables.
+        write_export("Streaming_History_2.json", 2024, 2)
+        loader.load_json_files()
+        assert fetch("SELECT COUNT(*) FROM PRS.SPOTIFY_EVENTS") == [(3,)]
+        assert fetch("SELECT COUNT(*) FROM RAW.SPOTIFY_LOAD_MANIFEST") == [(2,)]
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                TRUNCATE TABLE RAW.SPOTIFY_EVENTS, PRS.SPOTIFY_EVENTS, RAW.SPOTIFY_LOAD_MANIFEST,
+                    PRS.SPOTIFY_ROLLUP_HOURLY, PRS.SPOTIFY_ROLLUP_TRACKS,
+                    PRS.SPOTIFY_ROLLUP_ARTISTS, PRS.SPOTIFY_ROLLUP_EPISODES, PRS.SPOTIFY_WRAPPED_SUMMARY
+                """
+            )
+        conn.commit()
+        conn.close()
+
+
+@pytest.mark.integration
+def test_swap_gives_up_while_readers_hold_the_tables(monkeypatch):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration loader test.")
+
+    conn = psycopg2.connect(test_database_url)
+    reader = psycopg2.connect(test_database_url)
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+        shadow_tables.create_shadow_tables(cur)
+    conn.commit()
+    monkeypatch.setattr(shadow_tables, "SWAP_LOCK_TIMEOUT", "50ms")
+    monkeypatch.setattr(shadow_tables, "SWAP_ATTEMPTS", 2)
+    monkeypatch.setattr(shadow_tables, "SWAP_RETRY_SECONDS", 0)
+
+    try:
+        with reader.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM PRS.SPOTIFY_ROLLUP_TRACKS")
+        with pytest.raises(psycopg2.errors.LockNotAvailable):
+            shadow_tables.swap_shadow_tables(conn)
+        reader.rollback()
+
+        # Nothing was swapped; the next attempt goes through.
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('PRS.SPOTIFY_ROLLUP_TRACKS_SHADOW') IS NOT NULL")
+            assert cur.fetchone() == (True,)
+        conn.commit()
+        shadow_tables.swap_shadow_tables(conn)
+    finally:
+        reader.close()
+        conn.close()
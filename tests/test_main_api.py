@@ -3,8 +3,26 @@ from fastapi.testclient import TestClient
 import main
 
 
+def _async(load):
+    async def wrapper(*args):
+        return load(*args)
+
+    return wrapper
+
+
+def _sections_of(load):
+    # A get_wrapped_summary_sections_async stand-in that projects load(year).
+    def load_sections(year, sections):
+        summary = load(year)
+        if summary is None:
+            return None
+        return {"year": summary["year"], "generated_at": summary["generated_at"], **{s: summary[s] for s in sections}}
+
+    return _async(load_sections)
+
+
 def test_v2_wrapped_contract(monkeypatch, sample_summary):
-    monkeypatch.setattr(main, "get_wrapped_summary", lambda year: sample_summary)
+    monkeypatch.setattr(main, "get_wrapped_summary_async", _async(lambda year: sample_summary))
 
     with TestClient(main.app) as client:
         main.app.state.db_pool_error = None
@@ -26,7 +44,7 @@ def test_v2_wrapped_contract(monkeypatch, sample_summary):
 
 
 def test_legacy_endpoints_project_from_v2(monkeypatch, sample_summary):
-    monkeypatch.setattr(main, "get_wrapped_summary", lambda year: sample_summary)
+    monkeypatch.setattr(main, "get_wrapped_summary_async", _async(lambda year: sample_summary))
 
     with TestClient(main.app) as client:
         main.app.state.db_pool_error = None
@@ -46,7 +64,7 @@ def test_legacy_endpoints_project_from_v2(monkeypatch, sample_summary):
 
 
 def test_missing_summary_returns_503(monkeypatch):
-    monkeypatch.setattr(main, "get_wrapped_summary", lambda year: None)
+    monkeypatch.setattr(main, "get_wrapped_summary_async", _async(lambda year: None))
 
     with TestClient(main.app) as client:
         main.app.state.db_pool_error = None
@@ -60,7 +78,7 @@ def test_database_error_returns_503(monkeypatch):
     def raise_db_error(_year):
         raise RuntimeError("Database down")
 
-    monkeypatch.setattr(main, "get_wrapped_summary", raise_db_error)
+    monkeypatch.setattr(main, "get_wrapped_summary_async", _async(raise_db_error))
 
     with TestClient(main.app) as client:
         main.app.state.db_pool_error = None
@@ -68,3 +86,173 @@ def test_database_error_returns_503(monkeypatch):
 
     assert response.status_code == 503
     assert "Database unavailable" in response.json()["detail"]
+
+
+def test_summary_is_cached_between_requests(monkeypatch, sample_summary):
+    calls = []
+
+    def load_summary(year):
+        calls.append(year)
+        return sample_summary
+
+    monkeypatch.setattr(main, "get_wrapped_summary_async", _async(load_summary))
+
+    with TestClient(main.app) as client:
+        main.app.state.db_pool_error = None
+        for path in ("/api/v2/wrapped", "/api/stats/top-tracks", "/api/stats/skips"):
+            assert client.get(path).status_code == 200
+
+    assert calls == [2025]
+
+
+def test_fields_return_only_requested_sections(monkeypatch, sample_summary):
+    calls = []
+
+    def load_summary(year):
+        calls.append(year)
+        return sample_summary
+
+    monkeypatch.setattr(main, "get_wrapped_summary_async", _async(load_summary))
+    section_calls = []
+
+    async def load_sections(year, sections):
+        section_calls.append(tuple(sections))
+        return await _sections_of(lambda year: sample_summary)(year, sections)
+
+    monkeypatch.setattr(main, "get_wrapped_summary_sections_async", load_sections)
+
+    with TestClient(main.app) as client:
+        main.app.state.db_pool_error = None
+        partial = client.get("/api/v2/wrapped", params={"fields": "skips, top_tracks"})
+        again = client.get("/api/v2/wrapped", params={"fields": "top_tracks,skips"})
+        legacy = client.get("/api/stats/skips")
+        unknown = client.get("/api/v2/wrapped", params={"fields": "top_tracks,nope"})
+
+    assert partial.status_code == 200
+    assert partial.json() == {
+        "year": 2025,
+        "generated_at": sample_summary["generated_at"],
+        "top_tracks": sample_summary["top_tracks"],
+        "skips": sample_summary["skips"],
+    }
+    assert again.headers["etag"] == partial.headers["etag"]
+    assert legacy.json() == sample_summary["skips"]
+    # Each section is loaded once, on its own; the full summary never is.
+    assert sorted(section_calls) == [("skips",), ("top_tracks",)]
+    assert calls == []
+    assert unknown.status_code == 422
+    assert "nope" in unknown.json()["detail"]
+
+
+def test_fields_on_user_summary(monkeypatch, sample_summary):
+    user_summary = {**sample_summary, "user_id": "user_101"}
+    monkeypatch.setattr(main, "get_user_wrapped_summary_async", _async(lambda user_id, year: user_summary))
+
+    with TestClient(main.app) as client:
+        main.app.state.db_pool_error = None
+        response = client.get("/api/v2/wrapped/user_101", params={"fields": "top_artist"})
+
+    assert response.json() == {
+        "user_id": "user_101",
+        "year": 2025,
+        "generated_at": sample_summary["generated_at"],
+        "top_artist": sample_summary["top_artist"],
+    }
+
+
+def test_wrapped_supports_etag_revalidation_and_compression(monkeypatch, sample_summary):
+    monkeypatch.setattr(main, "get_wrapped_summary_async", _async(lambda year: sample_summary))
+
+    with TestClient(main.app) as client:
+        main.app.state.db_pool_error = None
+        plain = client.get("/api/v2/wrapped", headers={"Accept-Encoding": "identity"})
+        compressed = client.get("/api/v2/wrapped", headers={"Accept-Encoding": "gzip"})
+        revalidated = client.get("/api/v2/wrapped", headers={"If-None-Match": plain.headers["etag"]})
+
+    assert plain.status_code == 200
+    assert "content-encoding" not in plain.headers
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.json() == plain.json() == sample_summary
+    assert compressed.headers["etag"] != plain.headers["etag"]
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+
+
+def test_etag_changes_with_summary_version(monkeypatch, sample_summary):
+    monkeypatch.setattr(main, "get_wrapped_summary_sections_async", _sections_of(lambda year: sample_summary))
+    with TestClient(main.app) as client:
+        main.app.state.db_pool_error = None
+        first_etag = client.get("/api/stats/top-tracks").headers["etag"]
+
+    refreshed = {**sample_summary, "generated_at": "2026-02-13T12:00:00"}
+    monkeypatch.setattr(main, "get_wrapped_summary_sections_async", _sections_of(lambda year: refreshed))
+    with TestClient(main.app) as client:
+        main.app.state.db_pool_error = None
+        response = client.get("/api/stats/top-tracks", headers={"If-None-Match": first_etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != first_etag
+
+
+def test_user_wrapped_returns_user_summary(monkeypatch, sample_summary):
+    user_summary = {**sample_summary, "user_id": "user_101"}
+    summaries = {("user_101", 2025): user_summary}
+    monkeypatch.setattr(main, "get_user_wrapped_summary_async", _async(lambda user_id, year: summaries.get((user_id, year))))
+
+    with TestClient(main.app) as client:
+        main.app.state.db_pool_error = None
+        found = client.get("/api/v2/wrapped/user_101")
+        missing = client.get("/api/v2/wrapped/user_999")
+
+    assert found.status_code == 200
+    assert found.json() == user_summary
+    assert missing.status_code == 404
+    assert "user_999" in missing.json()["detail"]
+
+
+def test_live_stats_endpoint(monkeypatch, sample_summary):
+    live = {"year": 2025, "updated_at": "2026-02-12T12:00:00", "event_count": 10, "loading": True, **sample_summary}
+    monkeypatch.setattr(main, "get_live_stats_async", _async(lambda year: live if year == 2025 else None))
+
+    with TestClient(main.app) as client:
+        main.app.state.db_pool_error = None
+        found = client.get("/api/v2/live")
+        missing = client.get("/api/v2/live", params={"year": 2024})
+
+    assert found.json() == live
+    assert missing.status_code == 404
+
+
+def test_year_query_selects_summary(monkeypatch, sample_summary):
+    summaries = {2024: {**sample_summary, "year": 2024}, 2025: sample_summary}
+    monkeypatch.setattr(main, "get_wrapped_summary_async", _async(lambda year: summaries.get(year)))
+
+    with TestClient(main.app) as client:
+        main.app.state.db_pool_error = None
+        assert client.get("/api/v2/wrapped", params={"year": 2024}).json()["year"] == 2024
+        assert client.get("/api/stats/total-time", params={"year": 2024}).json() == {
+            "total_hours_played_2024": sample_summary["total_time"]["hours"]
+        }
+        missing = client.get("/api/v2/wrapped", params={"year": 2023})
+
+    assert missing.status_code == 503
+    assert "summary for 2023 is missing" in missing.json()["detail"]
+
+
+def test_metrics_report_latency_cache_and_summary_age(monkeypatch, sample_summary):
+    monkeypatch.setattr(main, "get_wrapped_summary_async", _async(lambda year: sample_summary))
+
+    with TestClient(main.app) as client:
+        main.app.state.db_pool_error = None
+        main.summary_cache.clear()
+        client.get("/api/v2/wrapped")
+        client.get("/api/v2/wrapped")
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'wrapped_http_request_duration_seconds_count{method="GET",route="/api/v2/wrapped",status="200"}' in body
+    assert 'wrapped_summary_cache_requests_total{cache="summary",result="miss"}' in body
+    assert 'wrapped_summary_cache_requests_total{cache="summary",result="hit"}' in body
+    assert 'wrapped_summary_age_seconds{year="2025"}' in body
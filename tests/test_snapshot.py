@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import numpy as np
+
+import wrapped_engine
+from snapshot import encode_events, open_snapshot, write_snapshot
+
+ROWS = [
+    (datetime(2025, 1, 1, 8, 10), 180000, "Artist A", "Song 1", None, None, "user_a"),
+    (datetime(2025, 1, 1, 8, 40), 120000, "Artist A", "Song 1", None, None, "user_a"),
+    ("2025-01-01T09:00:00", 3000, "Artist Ç", "Song\t2", None, None, None),
+    (datetime(2025, 1, 1, 14, 20), 240000, None, None, "Episode", "Show", "user_b"),
+]
+
+
+def test_encode_events_dictionary_encodes_text_columns():
+    events = encode_events(ROWS)
+
+    assert len(events) == 4
+    assert events.end_time[2] - events.end_time[0] == 50 * 60
+    assert events.codes["artist_name"].tolist() == [0, 0, 1, -1]
+    assert events.values["artist_name"] == ["Artist A", "Artist Ç"]
+    assert events.codes["user_id"].tolist() == [0, 0, -1, 1]
+
+
+def test_snapshot_round_trips_through_memory_mapped_files(tmp_path):
+    path = str(tmp_path / "events")
+    events = encode_events(ROWS)
+    write_snapshot(path, encode_events(ROWS[:1]))
+    # A second write replaces the first snapshot as a whole.
+    write_snapshot(path, events)
+
+    snapshot = open_snapshot(path)
+
+    assert isinstance(snapshot.end_time, np.memmap)
+    assert snapshot.end_time.tolist() == events.end_time.tolist()
+    assert snapshot.ms_played.tolist() == [180000, 120000, 3000, 240000]
+    for column, codes in events.codes.items():
+        assert snapshot.codes[column].tolist() == codes.tolist()
+        assert list(snapshot.values[column]) == events.values[column]
+    assert snapshot.values["track_name"][1] == "Song\t2"
+
+    assert wrapped_engine.compute_summary_payload(snapshot, 2025) == wrapped_engine.compute_summary_payload(events, 2025)
+
+
+def test_empty_snapshot_can_be_opened(tmp_path):
+    path = str(tmp_path / "events")
+    write_snapshot(path, encode_events([]))
+
+    snapshot = open_snapshot(path)
+
+    assert len(snapshot) == 0
+    assert len(snapshot.values["track_name"]) == 0
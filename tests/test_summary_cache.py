@@ -0,0 +1,174 @@
+import asyncio
+
+from summary_cache import AsyncSummaryCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _make_cache(summaries, versions, clock, ttl_seconds=10):
+    calls = {"summary": 0, "version": 0}
+
+    async def load_summary(year):
+        calls["summary"] += 1
+        return summaries.get(year)
+
+    async def load_version(year):
+        calls["version"] += 1
+        return versions.get(year)
+
+    cache = AsyncSummaryCache(load_summary, load_version, ttl_seconds=ttl_seconds, clock=clock)
+    return cache, calls
+
+
+def _get(cache, key):
+    # Runs one lookup plus any revalidation task it started.
+    async def scenario():
+        summary = await cache.get(key)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return summary
+
+    return asyncio.run(scenario())
+
+
+def test_fresh_entries_are_served_without_queries():
+    clock = FakeClock()
+    summaries = {2025: {"year": 2025, "generated_at": "v1"}}
+    cache, calls = _make_cache(summaries, {2025: "v1"}, clock)
+
+    for _ in range(5):
+        assert _get(cache, 2025)["generated_at"] == "v1"
+
+    assert calls == {"summary": 1, "version": 0}
+
+
+def test_expired_entry_checks_version_before_reloading():
+    clock = FakeClock()
+    summaries = {2025: {"year": 2025, "generated_at": "v1"}}
+    versions = {2025: "v1"}
+    cache, calls = _make_cache(summaries, versions, clock)
+    _get(cache, 2025)
+
+    clock.now = 11
+    assert _get(cache, 2025)["generated_at"] == "v1"
+    assert calls == {"summary": 1, "version": 1}
+
+    summaries[2025] = {"year": 2025, "generated_at": "v2"}
+    versions[2025] = "v2"
+    clock.now = 22
+    # The stale entry is served while revalidation swaps in the new version.
+    assert _get(cache, 2025)["generated_at"] == "v1"
+    assert _get(cache, 2025)["generated_at"] == "v2"
+    assert calls == {"summary": 2, "version": 2}
+
+
+def test_failed_revalidation_keeps_serving_stale_entry():
+    async def load_summary(year):
+        return {"year": year, "generated_at": "v1"}
+
+    async def raise_db_error(_year):
+        raise RuntimeError("Database down")
+
+    clock = FakeClock()
+    cache = AsyncSummaryCache(load_summary, raise_db_error, ttl_seconds=10, clock=clock)
+    _get(cache, 2025)
+
+    clock.now = 11
+    assert _get(cache, 2025)["generated_at"] == "v1"
+    assert _get(cache, 2025)["generated_at"] == "v1"
+
+
+def test_missing_summary_is_not_cached():
+    clock = FakeClock()
+    summaries = {}
+    cache, calls = _make_cache(summaries, {}, clock)
+
+    assert _get(cache, 2025) is None
+    summaries[2025] = {"year": 2025, "generated_at": "v1"}
+    assert _get(cache, 2025)["generated_at"] == "v1"
+    assert calls["summary"] == 2
+
+
+def test_max_entries_evicts_least_recently_used():
+    clock = FakeClock()
+    cache, calls = _make_cache({key: {"generated_at": "v1"} for key in "abc"}, {}, clock)
+    cache.max_entries = 2
+
+    for key in "abaca":
+        _get(cache, key)
+    assert calls["summary"] == 3
+
+    _get(cache, "b")
+    assert calls["summary"] == 4
+
+
+def test_async_cache_revalidates_in_background_task():
+    clock = FakeClock()
+    summaries = {2025: {"year": 2025, "generated_at": "v1"}}
+    versions = {2025: "v1"}
+    calls = {"summary": 0, "version": 0}
+
+    async def load_summary(year):
+        calls["summary"] += 1
+        return summaries.get(year)
+
+    async def load_version(year):
+        calls["version"] += 1
+        return versions.get(year)
+
+    async def scenario():
+        cache = AsyncSummaryCache(load_summary, load_version, ttl_seconds=10, clock=clock)
+        assert (await cache.get(2025))["generated_at"] == "v1"
+
+        summaries[2025] = {"year": 2025, "generated_at": "v2"}
+        versions[2025] = "v2"
+        clock.now = 11
+        assert (await cache.get(2025))["generated_at"] == "v1"
+        # Let the revalidation task run.
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert (await cache.get(2025))["generated_at"] == "v2"
+
+    asyncio.run(scenario())
+    assert calls == {"summary": 2, "version": 1}
+
+
+def test_async_cache_coalesces_concurrent_misses():
+    calls = {"summary": 0}
+    release = None
+
+    async def load_summary(year):
+        calls["summary"] += 1
+        await release.wait()
+        return {"year": year, "generated_at": "v1"}
+
+    async def load_version(year):
+        return "v1"
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        cache = AsyncSummaryCache(load_summary, load_version, ttl_seconds=10, clock=FakeClock())
+        waiting = [asyncio.create_task(cache.get(2025)) for _ in range(5)]
+        await asyncio.sleep(0)
+        # A cancelled caller leaves the shared load running for the others.
+        waiting.pop().cancel()
+        release.set()
+        results = await asyncio.gather(*waiting)
+
+        assert [summary["generated_at"] for summary in results] == ["v1"] * 4
+        assert (await cache.get(2025))["generated_at"] == "v1"
+        assert calls["summary"] == 1
+
+        # Each miss after the load finished starts a new one.
+        cache.clear()
+        assert (await cache.get(2025))["generated_at"] == "v1"
+        assert calls["summary"] == 2
+
+    asyncio.run(scenario())
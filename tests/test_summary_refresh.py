@@ -0,0 +1,143 @@
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+import psycopg2
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+from summary_refresh import SUMMARY_CHANNEL, SummaryRefreshWorker
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / "schema.sql"
+
+
+def test_worker_batches_requested_years():
+    refreshed = []
+
+    async def refresh(year):
+        refreshed.append(year)
+
+    async def scenario():
+        worker = SummaryRefreshWorker(refresh, interval_seconds=0, years=(2025,))
+        for year in (2024, 2025, 2024):
+            worker.request(year)
+        await worker.run_pending()
+        await worker.run_pending()
+
+    asyncio.run(scenario())
+    assert refreshed == [2024, 2025]
+
+
+def test_worker_refreshes_configured_years_on_schedule():
+    refreshed = []
+
+    async def refresh(year):
+        if year == 2024:
+            raise RuntimeError("Database down")
+        refreshed.append(year)
+
+    async def scenario():
+        worker = SummaryRefreshWorker(refresh, interval_seconds=0.01, years=(2024, 2025))
+        task = asyncio.create_task(worker.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(scenario())
+    # A failing year does not stop the others or the schedule.
+    assert len(refreshed) >= 2 and set(refreshed) == {2025}
+
+
+def test_summary_change_reloads_cached_summary(monkeypatch, sample_summary):
+    versions = iter(["v1", "v2"])
+
+    async def load_summary(year):
+        return {**sample_summary, "year": year, "generated_at": next(versions)}
+
+    monkeypatch.setattr(main, "get_wrapped_summary_async", load_summary)
+
+    async def scenario():
+        main.summary_cache.clear()
+        main.user_summary_cache.clear()
+        assert (await main.summary_cache.get(2025))["generated_at"] == "v1"
+        main.user_summary_cache._store(("user_a", 2025), sample_summary)
+        main.user_summary_cache._store(("user_a", 2024), sample_summary)
+
+        await main._apply_summary_change({"scope": "summary", "year": 2025})
+        await main._apply_summary_change({"scope": "user_summary", "year": 2025})
+
+        assert [key for key, _summary in main.summary_cache.items()] == [2025]
+        assert (await main.summary_cache.get(2025))["generated_at"] == "v2"
+        assert [key for key, _summary in main.user_summary_cache.items()] == [("user_a", 2024)]
+
+    asyncio.run(scenario())
+
+
+def test_refresh_endpoint_schedules_background_refresh(monkeypatch):
+    refreshed = []
+
+    async def refresh(year):
+        refreshed.append(year)
+
+    monkeypatch.setattr(main, "refresh_year", refresh)
+
+    with TestClient(main.app) as client:
+        response = client.post("/api/v2/wrapped/refresh?year=2024")
+        deadline = time.monotonic() + 2
+        while not refreshed and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert response.status_code == 202
+    assert response.json() == {"status": "scheduled", "year": 2024}
+    assert refreshed == [2024]
+
+
+@pytest.mark.integration
+def test_summary_writes_are_announced(monkeypatch):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration notification test.")
+
+    with psycopg2.connect(test_database_url) as conn, conn.cursor() as cur:
+        cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+    monkeypatch.setattr(database, "DATABASE_URL", test_database_url)
+
+    def write_summaries():
+        with psycopg2.connect(test_database_url) as conn, conn.cursor() as cur:
+            cur.execute("INSERT INTO PRS.SPOTIFY_WRAPPED_SUMMARY (year, payload) VALUES (2025, '{}')")
+            cur.execute(
+                """
+                INSERT INTO PRS.SPOTIFY_WRAPPED_USER_SUMMARY (user_id, year, payload)
+                VALUES ('user_a', 2024, '{}'), ('user_b', 2024, '{}')
+                """
+            )
+        with psycopg2.connect(test_database_url) as conn, conn.cursor() as cur:
+            cur.execute("TRUNCATE PRS.SPOTIFY_WRAPPED_SUMMARY")
+
+    async def scenario():
+        changes = []
+        listening = asyncio.Event()
+
+        async def on_listen():
+            listening.set()
+
+        async def collect():
+            async for payload in database.listen_async(SUMMARY_CHANNEL, on_listen):
+                changes.append(json.loads(payload))
+                if len(changes) == 3:
+                    return
+
+        task = asyncio.create_task(collect())
+        await listening.wait()
+        await asyncio.to_thread(write_summaries)
+        await asyncio.wait_for(task, timeout=5)
+        return changes
+
+    assert asyncio.run(scenario()) == [
+        {"scope": "summary", "year": 2025},
+        {"scope": "user_summary", "year": 2024},
+        {"scope": "summary", "year": None},
+    ]
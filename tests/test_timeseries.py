@@ -0,0 +1,103 @@
+import asyncio
+import os
+from datetime import datetime
+from pathlib import Path
+
+import psycopg2
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+import timeseries
+from rollups import insert_events_with_rollups
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / "schema.sql"
+
+
+def test_partial_hours_at_the_edges_are_read_from_events():
+    params = timeseries._timeseries_params(datetime(2025, 3, 1, 10, 17), datetime(2025, 3, 5, 3, 41), "day", None)
+    assert (params["rollup_start"], params["rollup_end"]) == (datetime(2025, 3, 1, 11), datetime(2025, 3, 5, 3))
+
+    within_an_hour = timeseries._timeseries_params(datetime(2025, 3, 1, 10, 17), datetime(2025, 3, 1, 10, 41), "hour", None)
+    assert within_an_hour["rollup_start"] == within_an_hour["rollup_end"] == datetime(2025, 3, 1, 10, 41)
+
+    minutes = timeseries._timeseries_params(datetime(2025, 3, 1), datetime(2025, 3, 2), "minute", None)
+    assert minutes["rollup_start"] == minutes["rollup_end"] == datetime(2025, 3, 2)
+
+
+def test_timeseries_endpoint_validates_and_defaults_to_the_year(monkeypatch):
+    calls = []
+
+    async def load(start, end, bucket, user_id):
+        calls.append((start, end, bucket, user_id))
+        return [{"start": "2025-01-01T00:00:00", "total_minutes_played": 1.5, "plays": 2}]
+
+    monkeypatch.setattr(main, "get_listening_timeseries_async", load)
+
+    with TestClient(main.app) as client:
+        main.app.state.db_pool_error = None
+        response = client.get("/api/stats/timeseries", params={"bucket": "month", "user_id": "user_a"})
+        aware = client.get("/api/stats/timeseries", params={"from": "2025-01-01T01:00:00+01:00", "to": "2025-01-02T00:00:00Z"})
+        unknown = client.get("/api/stats/timeseries", params={"bucket": "decade"})
+        reversed_range = client.get("/api/stats/timeseries", params={"from": "2025-02-01", "to": "2025-01-01"})
+        too_many = client.get("/api/stats/timeseries", params={"bucket": "minute"})
+
+    assert response.status_code == 200
+    assert response.json()["points"][0]["plays"] == 2
+    assert calls[0] == (datetime(2025, 1, 1), datetime(2026, 1, 1), "month", "user_a")
+    assert aware.status_code == 200
+    assert calls[1][:2] == (datetime(2025, 1, 1), datetime(2025, 1, 2))
+    assert unknown.status_code == 422
+    assert reversed_range.status_code == 422
+    assert too_many.status_code == 422
+    assert "minute" in too_many.json()["detail"]
+
+
+@pytest.mark.integration
+def test_timeseries_combines_rollups_and_edge_events(monkeypatch):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration timeseries test.")
+
+    conn = psycopg2.connect(test_database_url)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+            insert_events_with_rollups(
+                cur,
+                """
+                SELECT end_time, 'Artist', 'Song', ms_played, NULL, NULL, user_id, NULL::integer
+                FROM (VALUES
+                    (TIMESTAMP '2025-03-01 10:10:00', 60000, 'user_a'),
+                    (TIMESTAMP '2025-03-01 10:50:00', 120000, 'user_a'),
+                    (TIMESTAMP '2025-03-01 13:00:00', 180000, 'user_b'),
+                    (TIMESTAMP '2025-03-02 09:30:00', 240000, 'user_a'),
+                    (TIMESTAMP '2025-03-02 09:45:00', 300000, 'user_b')
+                ) AS events (end_time, ms_played, user_id)
+                """,
+                (),
+            )
+        conn.commit()
+        monkeypatch.setattr(database, "DATABASE_URL", test_database_url)
+
+        def load(*args):
+            return asyncio.run(timeseries.get_listening_timeseries_async(*args))
+
+        days = load(datetime(2025, 3, 1, 10, 30), datetime(2025, 3, 2, 9, 40), "day", None)
+        assert [(point["start"], point["total_minutes_played"], point["plays"]) for point in days] == [
+            ("2025-03-01T00:00:00", 5.0, 2),
+            ("2025-03-02T00:00:00", 4.0, 1),
+        ]
+
+        hours = load(datetime(2025, 3, 1, 10), datetime(2025, 3, 1, 14), "hour", "user_a")
+        assert [point["plays"] for point in hours] == [2, 0, 0, 0]
+
+        minutes = load(datetime(2025, 3, 2, 9, 30), datetime(2025, 3, 2, 9, 46), "minute", None)
+        assert len(minutes) == 16
+        assert [point["start"] for point in minutes if point["plays"]] == ["2025-03-02T09:30:00", "2025-03-02T09:45:00"]
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE TABLE PRS.SPOTIFY_EVENTS, PRS.SPOTIFY_ROLLUP_HOURLY, PRS.SPOTIFY_ROLLUP_TRACKS, PRS.SPOTIFY_ROLLUP_ARTISTS")
+        conn.commit()
+        conn.close()
@@ -0,0 +1,177 @@
+import json
+import os
+from pathlib import Path
+
+import psycopg2
+import pytest
+
+import loader
+import wrapped_engine
+import wrapped_summary
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / "schema.sql"
+
+
+def _write_export(path, records):
+    path.write_text(json.dumps(records), encoding="utf-8")
+    return str(path)
+
+
+def _track(ts, artist, track, ms_played):
+    return {
+        "ts": ts,
+        "master_metadata_album_artist_name": artist,
+        "master_metadata_track_name": track,
+        "ms_played": ms_played,
+    }
+
+
+def test_compute_wrapped_summary_matches_sql_payload(tmp_path):
+    files = [
+        _write_export(
+            tmp_path / "Streaming_History_0.json",
+            [
+                _track("2025-01-01T08:10:00Z", "Artist A", "Song 1", 180000),
+                _track("2025-01-01T08:40:00Z", "Artist A", "Song 1", 120000),
+                _track("2025-01-01T09:00:00Z", "Artist C", "Song Skip", 3000),
+                _track("2025-01-01T10:00:00Z", "Artist C", "Song Skip", 0),
+            ],
+        ),
+        _write_export(
+            tmp_path / "Streaming_History_1.json",
+            [
+                {
+                    "ts": "2025-01-01T14:20:00Z",
+                    "episode_name": "Podcast Episode",
+                    "episode_show_name": "Podcast Show",
+                    "ms_played": 240000,
+                },
+                _track("2025-01-01T20:00:00Z", "Artist B", "Song 2", 60000),
+                _track("2024-12-31T23:59:59Z", "Artist Z", "Song Z", 9000000),
+            ],
+        ),
+    ]
+
+    summary = wrapped_engine.compute_wrapped_summary(files, 2025)
+
+    assert summary["year"] == 2025
+    assert summary["total_time"] == {"hours": 0.17}
+    assert summary["top_artist"] == {"artist_name": "Artist A", "total_hours_played": 0.08}
+    assert summary["active_hour"] == {"hour": 8, "total_minutes_played": 5}
+    assert summary["top_tracks"][0] == {
+        "artist_name": "Artist A",
+        "track_name": "Song 1",
+        "total_minutes_played": 5,
+        "total_hours_played": 0.08,
+    }
+    assert summary["top_podcasts"] == [
+        {
+            "episode_show_name": "Podcast Show",
+            "episode_name": "Podcast Episode",
+            "total_minutes_played": 4,
+            "total_hours_played": 0.07,
+        }
+    ]
+    assert summary["listening_periods"] == [
+        {"period": "Morning", "total_minutes_played": 5.05},
+        {"period": "Afternoon", "total_minutes_played": 4},
+        {"period": "Evening", "total_minutes_played": 1},
+    ]
+    assert summary["top_days"] == [
+        {"day": "2025-01-01", "day_of_week": "Wednesday", "month": "January", "total_minutes_played": 10.05}
+    ]
+    assert summary["most_played"] == {"track_name": "Song 1", "play_count": 2}
+    assert summary["skips"] == [{"track_name": "Song Skip", "skips": 1}]
+    # Keys come out in jsonb order, so the serialized payload matches the API's.
+    assert list(summary["top_tracks"][0]) == ["track_name", "artist_name", "total_hours_played", "total_minutes_played"]
+
+    previous_year = wrapped_engine.compute_wrapped_summary(files, 2024)
+    assert previous_year["total_time"] == {"hours": 2.5}
+    assert previous_year["skips"] == []
+
+
+def test_overlapping_exports_and_rows_without_timestamps_are_skipped(tmp_path):
+    play = dict(_track("2025-01-01T08:10:00Z", "Artist A", "Song 1", 180000), spotify_track_uri="spotify:track:1")
+    files = [
+        _write_export(tmp_path / "Streaming_History_0.json", [play, _track(None, "Artist A", "Song 1", 60000)]),
+        # A later export repeats the play; another user's copy is a different play.
+        _write_export(
+            tmp_path / "Streaming_History_1.json",
+            [play, dict(play, username="user_b"), dict(play, ts="2025-01-01T08:10:00Z", ms_played=None)],
+        ),
+    ]
+
+    summary = wrapped_engine.compute_wrapped_summary(files, 2025)
+
+    assert summary["most_played"] == {"track_name": "Song 1", "play_count": 2}
+    assert summary["total_time"] == {"hours": 0.1}
+
+
+def test_round_ratio_rounds_half_away_from_zero():
+    assert wrapped_engine._round_ratio(7500, wrapped_engine.MS_PER_MINUTE) == 0.13
+    assert wrapped_engine._round_ratio(60000, wrapped_engine.MS_PER_MINUTE) == 1
+    assert isinstance(wrapped_engine._round_ratio(60000, wrapped_engine.MS_PER_MINUTE), int)
+
+
+@pytest.mark.integration
+def test_tied_rankings_match_the_summary_sql(monkeypatch, tmp_path):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration engine test.")
+
+    # Every ranked section ties; records come in the reverse of the expected
+    # order and the names sort differently bytewise than in most locales.
+    records = [
+        _track("2025-03-06T23:00:00Z", "Zed", "Zulu", 60000),
+        _track("2025-03-05T20:00:00Z", "alpha", "alpha", 60000),
+        _track("2025-03-04T06:00:00Z", "\u00c9mile", "\u00d6lig", 60000),
+        _track("2025-03-03T23:00:00Z", None, "Solo", 60000),
+        _track("2025-03-02T20:00:00Z", "Delta", "Song", 60000),
+        _track("2025-03-01T06:00:00Z", "Beta", "Beta", 60000),
+        _track("2025-03-07T13:00:00Z", None, "skip b", 2000),
+        _track("2025-03-07T13:30:00Z", None, "Skip A", 2000),
+        {"ts": "2025-03-08T13:00:00Z", "episode_name": "Ep 2", "episode_show_name": "Show", "ms_played": 56000},
+        {"ts": "2025-03-09T13:00:00Z", "episode_name": "Ep 1", "episode_show_name": "Show", "ms_played": 56000},
+    ]
+    files = [_write_export(tmp_path / "Streaming_History_0.json", records)]
+
+    conn = psycopg2.connect(test_database_url)
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+    conn.commit()
+    monkeypatch.setattr(loader, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(loader, "get_db_connection", lambda: psycopg2.connect(test_database_url))
+    monkeypatch.setattr(loader, "refresh_summaries", lambda _year: None)
+
+    try:
+        loader.load_json_files()
+        with conn.cursor() as cur:
+            cur.execute(wrapped_summary.REFRESH_WRAPPED_SUMMARY_SQL, wrapped_summary._year_params(2025))
+            query_payload = cur.fetchone()[2]
+            cur.execute("SELECT PRS.refresh_spotify_wrapped_summary(2025::smallint)")
+            cur.execute("SELECT payload FROM PRS.SPOTIFY_WRAPPED_SUMMARY WHERE year = 2025")
+            function_payload = cur.fetchone()[0]
+        conn.commit()
+
+        engine_payload = wrapped_engine.compute_summary_payload(wrapped_engine.read_events(files), 2025)
+
+        assert engine_payload == query_payload == function_payload
+        assert engine_payload["top_artist"]["artist_name"] == "Beta"
+        assert [track["artist_name"] for track in engine_payload["top_tracks"]] == ["Beta", "Delta", "Zed", "alpha", "\u00c9mile"]
+        assert engine_payload["active_hour"]["hour"] == 6
+        assert [period["period"] for period in engine_payload["listening_periods"]][:3] == ["Evening", "Morning", "Night"]
+        assert [day["day"] for day in engine_payload["top_days"]][:2] == ["2025-03-01", "2025-03-02"]
+        assert engine_payload["most_played"] == {"track_name": "Beta", "play_count": 1}
+        assert [skip["track_name"] for skip in engine_payload["skips"]] == ["Skip A", "skip b"]
+        assert [episode["episode_name"] for episode in engine_payload["top_podcasts"]] == ["Ep 1", "Ep 2"]
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                TRUNCATE TABLE RAW.SPOTIFY_EVENTS, PRS.SPOTIFY_EVENTS, RAW.SPOTIFY_LOAD_MANIFEST,
+                    PRS.SPOTIFY_ROLLUP_HOURLY, PRS.SPOTIFY_ROLLUP_TRACKS,
+                    PRS.SPOTIFY_ROLLUP_ARTISTS, PRS.SPOTIFY_ROLLUP_EPISODES, PRS.SPOTIFY_WRAPPED_SUMMARY
+                """
+            )
+        conn.commit()
+        conn.close()
@@ -1,11 +1,34 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
 
 import psycopg2
 import pytest
 from psycopg2.extras import RealDictCursor
 
+import database
 import wrapped_summary
+from rollups import PROCESSED_COLUMNS, insert_events_with_rollups
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / "schema.sql"
+EVENT_COLUMNS = "end_time, artist_name, track_name, ms_played, episode_name, episode_show_name, user_id"
+
+
+def _insert_events(cur, values_sql):
+    # Goes through the loader's insert path so the rollups the summaries read are filled too.
+    cur.execute("DROP TABLE IF EXISTS seed_events")
+    cur.execute(
+        """
+        CREATE TEMP TABLE seed_events (
+            end_time TIMESTAMP, artist_name TEXT, track_name TEXT, ms_played INTEGER,
+            episode_name TEXT, episode_show_name TEXT, user_id TEXT, file_id INTEGER
+        )
+        """
+    )
+    cur.execute(f"INSERT INTO seed_events ({EVENT_COLUMNS}) VALUES {values_sql}")
+    insert_events_with_rollups(cur, f"SELECT {PROCESSED_COLUMNS} FROM seed_events", None)
 
 
 def test_get_wrapped_summary_normalizes_payload(monkeypatch):
@@ -25,7 +48,7 @@ def test_get_wrapped_summary_normalizes_payload(monkeypatch):
 
 
 def test_refresh_wrapped_summary_returns_none_when_query_returns_none(monkeypatch):
-    monkeypatch.setattr(wrapped_summary, "execute_query", lambda *_args, **_kwargs: None)
+    monkeypatch.setattr(wrapped_summary, "execute_single_flight", lambda *_args, **_kwargs: None)
     result = wrapped_summary.refresh_wrapped_summary(2025)
     assert result is None
 
@@ -40,45 +63,22 @@ def test_refresh_wrapped_summary_generates_expected_payload(monkeypatch):
 
     try:
         with conn.cursor() as cur:
-            cur.execute("CREATE SCHEMA IF NOT EXISTS PRS")
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS PRS.SPOTIFY_EVENTS_2025 (
-                    id SERIAL PRIMARY KEY,
-                    end_time TIMESTAMP NOT NULL,
-                    artist_name TEXT,
-                    track_name TEXT,
-                    ms_played INTEGER,
-                    episode_name TEXT,
-                    episode_show_name TEXT
-                )
-                """
-            )
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS PRS.SPOTIFY_WRAPPED_2025_SUMMARY (
-                    year SMALLINT PRIMARY KEY,
-                    generated_at TIMESTAMP NOT NULL DEFAULT NOW(),
-                    payload JSONB NOT NULL
-                )
-                """
-            )
-            cur.execute("TRUNCATE TABLE PRS.SPOTIFY_EVENTS_2025")
-            cur.execute("TRUNCATE TABLE PRS.SPOTIFY_WRAPPED_2025_SUMMARY")
-            cur.execute(
-                """
-                INSERT INTO PRS.SPOTIFY_EVENTS_2025 (end_time, artist_name, track_name, ms_played, episode_name, episode_show_name)
-                VALUES
-                    ('2025-01-01 08:10:00', 'Artist A', 'Song 1', 180000, NULL, NULL),
-                    ('2025-01-01 08:40:00', 'Artist A', 'Song 1', 120000, NULL, NULL),
-                    ('2025-01-01 09:00:00', 'Artist C', 'Song Skip', 3000, NULL, NULL),
-                    ('2025-01-01 14:20:00', NULL, NULL, 240000, 'Podcast Episode', 'Podcast Show'),
-                    ('2025-01-01 20:00:00', 'Artist B', 'Song 2', 60000, NULL, NULL)
+            cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+            cur.execute("SELECT PRS.ensure_spotify_events_partition(2024)")
+            _insert_events(
+                cur,
                 """
+                ('2025-01-01 08:10:00', 'Artist A', 'Song 1', 180000, NULL, NULL, NULL),
+                ('2025-01-01 08:40:00', 'Artist A', 'Song 1', 120000, NULL, NULL, NULL),
+                ('2025-01-01 09:00:00', 'Artist C', 'Song Skip', 3000, NULL, NULL, NULL),
+                ('2025-01-01 14:20:00', NULL, NULL, 240000, 'Podcast Episode', 'Podcast Show', NULL),
+                ('2025-01-01 20:00:00', 'Artist B', 'Song 2', 60000, NULL, NULL, NULL),
+                ('2024-12-31 23:59:59', 'Artist Z', 'Song Z', 9000000, NULL, NULL, NULL)
+                """,
             )
         conn.commit()
 
-        def run_query(query, params=None, fetch=False):
+        def run_query(query, params=None, fetch=False, name="query"):
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, params)
                 result = None
@@ -89,6 +89,8 @@ def test_refresh_wrapped_summary_generates_expected_payload(monkeypatch):
                 conn.commit()
                 return result
 
+        # Refreshes take the advisory lock on their own connection.
+        monkeypatch.setattr(database, "DATABASE_URL", test_database_url)
         monkeypatch.setattr(wrapped_summary, "execute_query", run_query)
         summary = wrapped_summary.refresh_wrapped_summary(2025)
 
@@ -99,9 +101,146 @@ def test_refresh_wrapped_summary_generates_expected_payload(monkeypatch):
         assert summary["most_played"]["play_count"] == 2
         assert summary["active_hour"]["hour"] == 8
         assert summary["skips"][0]["track_name"] == "Song Skip"
+
+        previous_year = wrapped_summary.refresh_wrapped_summary(2024)
+        assert previous_year["year"] == 2024
+        assert previous_year["top_artist"]["artist_name"] == "Artist Z"
+        assert previous_year["total_time"]["hours"] == pytest.approx(2.5)
+
+        sections = wrapped_summary.get_wrapped_summary_sections(2025, ["skips", "top_artist"])
+        assert sections == {
+            "year": 2025,
+            "generated_at": summary["generated_at"],
+            "skips": summary["skips"],
+            "top_artist": summary["top_artist"],
+        }
+        assert wrapped_summary.get_wrapped_summary_sections(2023, ["skips"]) is None
     finally:
         with conn.cursor() as cur:
-            cur.execute("TRUNCATE TABLE PRS.SPOTIFY_EVENTS_2025")
-            cur.execute("TRUNCATE TABLE PRS.SPOTIFY_WRAPPED_2025_SUMMARY")
+            cur.execute(
+                """
+                TRUNCATE TABLE PRS.SPOTIFY_EVENTS, PRS.SPOTIFY_ROLLUP_HOURLY, PRS.SPOTIFY_ROLLUP_TRACKS,
+                    PRS.SPOTIFY_ROLLUP_ARTISTS, PRS.SPOTIFY_ROLLUP_EPISODES, PRS.SPOTIFY_WRAPPED_SUMMARY
+                """
+            )
+        conn.commit()
+        conn.close()
+
+
+@pytest.mark.integration
+def test_refresh_user_wrapped_summaries_groups_by_user(monkeypatch):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration summary test.")
+
+    conn = psycopg2.connect(test_database_url)
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+            _insert_events(
+                cur,
+                """
+                ('2025-01-01 08:10:00', 'Artist A', 'Song 1', 180000, NULL, NULL, 'user_a'),
+                ('2025-01-01 08:40:00', 'Artist A', 'Song 1', 120000, NULL, NULL, 'user_a'),
+                ('2025-01-01 09:00:00', 'Artist C', 'Song Skip', 3000, NULL, NULL, 'user_a'),
+                ('2025-01-02 14:20:00', NULL, NULL, 240000, 'Podcast Episode', 'Podcast Show', 'user_b'),
+                ('2025-01-02 20:00:00', 'Artist B', 'Song 2', 60000, NULL, NULL, 'user_b'),
+                ('2025-01-03 20:00:00', 'Artist B', 'Song 2', 60000, NULL, NULL, NULL)
+                """,
+            )
+        conn.commit()
+
+        def run_query(query, params=None, fetch=False, name="query"):
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(query, params)
+                result = None
+                if fetch == "one":
+                    result = cur.fetchone()
+                elif fetch:
+                    result = cur.fetchall()
+                conn.commit()
+                return result
+
+        monkeypatch.setattr(database, "DATABASE_URL", test_database_url)
+        monkeypatch.setattr(wrapped_summary, "execute_query", run_query)
+        assert wrapped_summary.refresh_user_wrapped_summaries(2025) == 2
+
+        user_a = wrapped_summary.get_user_wrapped_summary("user_a", 2025)
+        user_b = wrapped_summary.get_user_wrapped_summary("user_b", 2025)
+
+        assert user_a["user_id"] == "user_a"
+        assert user_a["total_time"]["hours"] == pytest.approx(0.08, abs=0.01)
+        assert user_a["top_artist"]["artist_name"] == "Artist A"
+        assert user_a["most_played"] == {"track_name": "Song 1", "play_count": 2}
+        assert user_a["active_hour"]["hour"] == 8
+        assert user_a["skips"] == [{"track_name": "Song Skip", "skips": 1}]
+        assert user_a["top_podcasts"] == []
+
+        assert user_b["top_artist"]["artist_name"] == "Artist B"
+        assert user_b["top_podcasts"][0]["episode_name"] == "Podcast Episode"
+        assert [day["day"] for day in user_b["top_days"]] == ["2025-01-02"]
+        assert user_b["skips"] == []
+        assert wrapped_summary.get_user_wrapped_summary("user_c", 2025) is None
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                TRUNCATE TABLE PRS.SPOTIFY_EVENTS, PRS.SPOTIFY_ROLLUP_HOURLY, PRS.SPOTIFY_ROLLUP_TRACKS,
+                    PRS.SPOTIFY_ROLLUP_ARTISTS, PRS.SPOTIFY_ROLLUP_EPISODES, PRS.SPOTIFY_WRAPPED_USER_SUMMARY
+                """
+            )
+        conn.commit()
+        conn.close()
+
+
+@pytest.mark.integration
+def test_refresh_waiting_on_a_refresh_in_flight_reuses_its_result(monkeypatch):
+    test_database_url = os.getenv("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("Set TEST_DATABASE_URL to run integration summary test.")
+
+    monkeypatch.setattr(database, "DATABASE_URL", test_database_url)
+    conn = psycopg2.connect(test_database_url)
+    holder = psycopg2.connect(test_database_url)
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+            _insert_events(cur, "('2025-01-01 08:10:00', 'Artist A', 'Song 1', 180000, NULL, NULL, NULL)")
+        conn.commit()
+
+        def refresh_in_flight():
+            # Stands in for another process: holds the lock, refreshes and commits late.
+            with holder.cursor() as cur:
+                cur.execute(database.ADVISORY_LOCK_SQL, (wrapped_summary.SUMMARY_REFRESH_LOCK_ID, 2025))
+                cur.execute(wrapped_summary.REFRESH_WRAPPED_SUMMARY_SQL, wrapped_summary._year_params(2025))
+                cur.execute("SELECT generated_at FROM PRS.SPOTIFY_WRAPPED_SUMMARY WHERE year = 2025")
+                return cur.fetchone()[0]
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            expected = refresh_in_flight()
+            waiting = pool.submit(wrapped_summary.refresh_wrapped_summary, 2025)
+            time.sleep(0.2)
+            assert not waiting.done()
+            holder.commit()
+            summary = waiting.result(timeout=10)
+
+        assert summary["generated_at"] == expected.isoformat()
+        assert summary["top_artist"]["artist_name"] == "Artist A"
+
+        # Callers with new data of their own always run the refresh.
+        fresh = wrapped_summary.refresh_wrapped_summary(2025, reuse_in_flight=False)
+        assert fresh["generated_at"] > summary["generated_at"]
+    finally:
+        holder.rollback()
+        holder.close()
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                TRUNCATE TABLE PRS.SPOTIFY_EVENTS, PRS.SPOTIFY_ROLLUP_HOURLY, PRS.SPOTIFY_ROLLUP_TRACKS,
+                    PRS.SPOTIFY_ROLLUP_ARTISTS, PRS.SPOTIFY_ROLLUP_EPISODES, PRS.SPOTIFY_WRAPPED_SUMMARY
+                """
+            )
         conn.commit()
         conn.close()